@@ -1,14 +1,14 @@
 import streamlit as st
 import pandas as pd
-import re
 from datetime import datetime, timedelta
 import hashlib
-import json
-import os
 from pathlib import Path
-import time
-from io import BytesIO
-import pickle
+
+from teleapo_core import (
+    AITeleapoManager, JobHistoryManager, BackgroundJobQueue, StageProfiler,
+    EXPORT_BACKENDS, ANALYSIS_MEMORY_CACHE_ENTRIES, STAT_ROLLUP_MEASURES,
+    ARCHIVE_QUERY_DIMENSIONS, CALL_ARCHIVE_REQUIRES
+)
 
 # ページ設定
 st.set_page_config(
@@ -247,6 +247,24 @@ st.markdown("""
         border: 1px solid #f59e0b;
     }
     
+    .status-analyzing {
+        background-color: #fef3c7;
+        color: #d97706;
+        border: 1px solid #f59e0b;
+    }
+    
+    .status-analyzed {
+        background-color: #dbeafe;
+        color: #1d4ed8;
+        border: 1px solid #3b82f6;
+    }
+    
+    .status-failed {
+        background-color: #fee2e2;
+        color: #b91c1c;
+        border: 1px solid #ef4444;
+    }
+    
     .status-completed {
         background-color: #dbeafe;
         color: #1d4ed8;
@@ -377,437 +395,88 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# ファイルベースのジョブ履歴管理
-class JobHistoryManager:
-    def __init__(self):
-        self.history_file = Path("job_history.json")
-        self.download_cache_dir = Path("download_cache")
-        self.download_cache_dir.mkdir(exist_ok=True)
-    
-    def save_jobs(self, jobs):
-        """ジョブ履歴をファイルに保存"""
-        try:
-            # datetime オブジェクトを文字列に変換
-            serializable_jobs = []
-            for job in jobs:
-                job_copy = job.copy()
-                if isinstance(job_copy.get('created_at'), datetime):
-                    job_copy['created_at'] = job_copy['created_at'].isoformat()
-                serializable_jobs.append(job_copy)
-            
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump(serializable_jobs, f, ensure_ascii=False, indent=2)
-            return True
-        except Exception as e:
-            st.error(f"ジョブ履歴保存エラー: {str(e)}")
-            return False
-    
-    def load_jobs(self):
-        """ジョブ履歴をファイルから読み込み"""
-        try:
-            if self.history_file.exists():
-                with open(self.history_file, 'r', encoding='utf-8') as f:
-                    jobs = json.load(f)
-                
-                # 文字列をdatetimeオブジェクトに変換
-                for job in jobs:
-                    if isinstance(job.get('created_at'), str):
-                        try:
-                            job['created_at'] = datetime.fromisoformat(job['created_at'])
-                        except:
-                            job['created_at'] = datetime.now()
-                
-                return jobs
-            return []
-        except Exception as e:
-            st.error(f"ジョブ履歴読み込みエラー: {str(e)}")
-            return []
-    
-    def clear_jobs(self):
-        """ジョブ履歴をクリア"""
-        try:
-            if self.history_file.exists():
-                self.history_file.unlink()
-            return True
-        except Exception as e:
-            st.error(f"ジョブ履歴クリアエラー: {str(e)}")
-            return False
-    
-    def save_download_file(self, file_id, data, filename):
-        """ダウンロード用ファイルをキャッシュに保存"""
-        try:
-            cache_file = self.download_cache_dir / f"{file_id}.pkl"
-            cache_data = {
-                'data': data,
-                'filename': filename,
-                'created_at': datetime.now().isoformat()
-            }
-            with open(cache_file, 'wb') as f:
-                pickle.dump(cache_data, f)
-            return True
-        except Exception as e:
-            st.error(f"ダウンロードファイル保存エラー: {str(e)}")
-            return False
-    
-    def get_download_file(self, file_id):
-        """ダウンロード用ファイルをキャッシュから取得"""
-        try:
-            cache_file = self.download_cache_dir / f"{file_id}.pkl"
-            if cache_file.exists():
-                with open(cache_file, 'rb') as f:
-                    cache_data = pickle.load(f)
-                return cache_data
-            return None
-        except Exception as e:
-            st.error(f"ダウンロードファイル取得エラー: {str(e)}")
-            return None
-
 # セッション状態の初期化
 def initialize_session_state():
     """セッション状態を初期化"""
+    if 'history_manager' not in st.session_state:
+        st.session_state.history_manager = get_history_manager()
+    
     if 'jobs' not in st.session_state:
         # ファイルからジョブ履歴を読み込み
-        history_manager = JobHistoryManager()
-        st.session_state.jobs = history_manager.load_jobs()
+        st.session_state.jobs = st.session_state.history_manager.load_jobs()
     
     if 'current_job' not in st.session_state:
         st.session_state.current_job = None
-    
-    if 'history_manager' not in st.session_state:
-        st.session_state.history_manager = JobHistoryManager()
 
-class AITeleapoManager:
-    def __init__(self):
-        self.base_dir = Path("teleapo_jobs")
-        self.base_dir.mkdir(exist_ok=True)
-        
-    def generate_job_id(self):
-        """ジョブIDを生成"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M")
-        random_suffix = hashlib.md5(str(time.time()).encode()).hexdigest()[:5].upper()
-        return f"{timestamp}_{random_suffix}"
-    
-    def normalize_phone(self, phone_str):
-        """電話番号を正規化（+81形式を0始まりに変換）"""
-        if pd.isna(phone_str):
-            return ""
-        phone_str = str(phone_str).replace("+81", "0").replace(" ", "").replace("-", "")
-        return re.sub(r'\D', '', phone_str)
-    
-    def normalize_text(self, text):
-        """テキストを正規化"""
-        if pd.isna(text):
-            return ""
-        return str(text).strip()
-    
-    def create_row_key(self, company, phone):
-        """行指紋を作成（社名ベース）"""
-        # 社名を正規化してキーとして使用
-        normalized_company = self.normalize_text(company)
-        normalized_phone = self.normalize_phone(phone)
-        base = f"{normalized_company}|{normalized_phone}"
-        return hashlib.sha256(base.encode('utf-8')).hexdigest()[:16]
-    
-    def process_filemaker_data(self, df, job_id, output_filename):
-        """FileMakerデータを処理"""
-        job_dir = self.base_dir / job_id
-        job_dir.mkdir(exist_ok=True)
-        
-        # 元データを保存
-        original_path = job_dir / "fm_export.xlsx"
-        df.to_excel(original_path, index=False)
-        
-        # AIテレアポ用にデータを変換
-        upload_df = df.copy()
-        if '顧客名' in upload_df.columns:
-            upload_df = upload_df.rename(columns={'顧客名': '社名'})
-        
-        # 必要な列のみ抽出（AIテレアポ用）
-        required_columns = ['社名', '電話番号', '住所統合']
-        available_columns = [col for col in required_columns if col in upload_df.columns]
-        
-        if available_columns:
-            upload_df = upload_df[available_columns].copy()
-        
-        # 社名を50文字でカット
-        if '社名' in upload_df.columns:
-            upload_df['社名'] = upload_df['社名'].astype(str).str[:50]
-        
-        # 行指紋を作成してrowmapを生成(社名ベース)
-        rowmap_data = []
-        for idx, row in df.iterrows():
-            company = row.get('顧客名', '') if '顧客名' in df.columns else row.get('社名', '')
-            phone = row.get('電話番号', '')
-            row_key = self.create_row_key(company, phone)
-            
-            rowmap_data.append({
-                'row_key': row_key,
-                'company': company,
-                'company_normalized': self.normalize_text(company),
-                'phone': phone,
-                'fm_id': row.get('IDの頭にID', ''),
-                'index_in_fm': idx
-            })
-        
-        rowmap_df = pd.DataFrame(rowmap_data)
-        rowmap_path = job_dir / "rowmap.csv"
-        rowmap_df.to_csv(rowmap_path, index=False)
-        
-        # アップロード用CSVを保存（UTF-8 with BOM）
-        upload_path = job_dir / f"{output_filename}.csv"
-        try:
-            # まずShift-JISを試す
-            upload_df.to_csv(upload_path, index=False, encoding='shift_jis')
-        except UnicodeEncodeError:
-            # Shift-JISで保存できない場合はUTF-8 with BOMを使用
-            upload_df.to_csv(upload_path, index=False, encoding='utf-8-sig')
-        
-        # マニフェストを作成
-        manifest = {
-            'job_id': job_id,
-            'created_at': datetime.now().isoformat(),
-            'original_filename': output_filename,
-            'total_rows': len(df),
-            'files': {
-                'fm_export': 'fm_export.xlsx',
-                'upload': f'{output_filename}.csv',
-                'rowmap': 'rowmap.csv'
-            }
-        }
-        
-        manifest_path = job_dir / "manifest.json"
-        with open(manifest_path, 'w', encoding='utf-8') as f:
-            json.dump(manifest, f, ensure_ascii=False, indent=2)
-        
-        return {
-            'job_id': job_id,
-            'upload_path': upload_path,
-            'total_rows': len(df),
-            'manifest': manifest
-        }
-    
-    def analyze_call_results(self, df):
-        """通話結果を分析"""
-        # 電話番号を正規化
-        df["電話番号"] = df["電話番号"].astype(str).str.replace(r'^\+81\s*', '0', regex=True)
-        df["電話番号"] = df["電話番号"].str.replace(" ", "")
-        
-        # 通話時間を数値化（mm:ss形式を秒数に変換）
-        def parse_duration_to_seconds(val):
-            if pd.isna(val):
-                return 0
-            val = str(val).strip()
-            if val in ["", "-", "nan"]:
-                return 0
-            parts = val.split(":")
-            try:
-                if len(parts) == 3:  # hh:mm:ss
-                    h, m, s = map(int, parts)
-                    return h*3600 + m*60 + s
-                elif len(parts) == 2:  # mm:ss
-                    m, s = map(int, parts)
-                    return m*60 + s
-                else:
-                    return int(val)  # 秒数
-            except:
-                return 0
-        
-        df["通話時間_num"] = df["通話時間"].apply(parse_duration_to_seconds)
-        
-        # 断り・終了系ワード
-        ng_words = [
-            "断り", "不要", "必要ない", "結構です", "結構",
-            "電話が終了", "電話を切った", "切断", "応答なし", "応答無し",
-            "切られ", "切られる", "切った", "通話が終了", "会話が終了",
-            "進展しない", "通話を終了", "進まなかった", "切りました", "断念",
-            "終了", "成立しなかった", "切", "進展はありま"
-        ]
-        
-        # ステータス分類
-        for idx, row in df.iterrows():
-            status = str(row["ステータス"])
-            result = str(row["架電結果"]) if pd.notna(row["架電結果"]) else ""
-            summary = str(row["要約"]) if pd.notna(row["要約"]) else ""
-            duration = row["通話時間_num"]
-            
-            # 既に結果が入っている場合はスキップ
-            if result.strip() != "" and result.strip() != "nan":
-                continue
-            
-            # 留守番電話 → 留守電
-            if status.strip() == "留守番電話":
-                df.at[idx, "架電結果"] = "留守電"
-                continue
-            
-            # 応答なし → 留守
-            if status.strip() in ["応答なし", "応答無し"]:
-                df.at[idx, "架電結果"] = "留守"
-                continue
-            
-            # 獲得 → AI電話APO
-            if status.strip() == "獲得":
-                df.at[idx, "架電結果"] = "AI電話APO"
-                continue
-            
-            # 要約に断りワードが含まれる → NG
-            if any(word in summary for word in ng_words):
-                df.at[idx, "架電結果"] = "NG"
-                continue
-            
-            # 通話時間が0またはNaN → 留守
-            if pd.isna(duration) or duration == 0:
-                df.at[idx, "架電結果"] = "留守"
-                continue
-            
-            # ステータスが自動音声 → 留守電
-            if status.strip() == "自動音声":
-                df.at[idx, "架電結果"] = "留守電"
-                continue
-            
-            # 要約に「応答なし」 → 留守
-            if any(x in summary for x in ["応答なし", "応答無し"]):
-                df.at[idx, "架電結果"] = "留守"
-                continue
-            
-            # 要約に「転送」や「了承しました」など → 電話APO
-            if any(x in summary for x in ["転送された", "了承しました", "転送されました"]):
-                df.at[idx, "架電結果"] = "AI電話APO"
-                continue
-            
-            # 通話時間あり & 転送でない → NG
-            if pd.notna(duration) and duration > 0 and not any(x in summary for x in ["転送"]):
-                df.at[idx, "架電結果"] = "NG"
-        
-        return df
-    
-    def merge_with_original(self, call_results_df, job_id):
-        """元データとマージ（社名ベース）"""
-        job_dir = self.base_dir / job_id
-        
-        # マニフェストを読み込み
-        manifest_path = job_dir / "manifest.json"
-        with open(manifest_path, 'r', encoding='utf-8') as f:
-            manifest = json.load(f)
-        
-        # rowmapを読み込み
-        rowmap_path = job_dir / "rowmap.csv"
-        rowmap_df = pd.read_csv(rowmap_path)
-        
-        # 元データを読み込み
-        original_path = job_dir / "fm_export.xlsx"
-        original_df = pd.read_excel(original_path)
-        
-        # 通話結果の社名を正規化
-        call_results_df['社名_正規化'] = call_results_df['社名'].apply(self.normalize_text)
-        
-        # 架電時刻列を保持（存在する場合）
-        has_call_time = '架電時刻' in call_results_df.columns
-        
-        # 架電時刻を日付と時間に分割
-        if has_call_time:
-            try:
-                # 架電時刻を日時型に変換
-                call_results_df['架電時刻_dt'] = pd.to_datetime(call_results_df['架電時刻'], errors='coerce')
-                # 日付列を作成（YYYY/MM/DD形式）
-                call_results_df['架電日'] = call_results_df['架電時刻_dt'].dt.strftime('%Y/%m/%d')
-                # 時間列を作成（HH:MM:SS形式）
-                call_results_df['架電時間'] = call_results_df['架電時刻_dt'].dt.strftime('%H:%M:%S')
-                # 一時列を削除
-                call_results_df = call_results_df.drop('架電時刻_dt', axis=1)
-            except Exception as e:
-                # エラーが発生した場合は元の架電時刻をそのまま使用
-                pass
-        
-        # 社名ベースでマージ
-        merged_df = pd.merge(
-            call_results_df, 
-            rowmap_df[['company_normalized', 'fm_id', 'company']], 
-            left_on='社名_正規化', 
-            right_on='company_normalized', 
-            how='left'
-        )
-        
-        # 元データの他の列も結合（IDをキーに）
-        if 'fm_id' in merged_df.columns and 'IDの頭にID' in original_df.columns:
-            # FileMakerのIDでさらに詳細情報を結合
-            original_subset = original_df[['IDの頭にID', '住所統合', '最終トーク判定', '最終有効無効', '最終決済担当']].copy()
-            original_subset = original_subset.rename(columns={'IDの頭にID': 'fm_id'})
-            merged_df = pd.merge(merged_df, original_subset, on='fm_id', how='left')
-        
-        # 通話結果に行指紋を追加
-        merged_df['row_key'] = merged_df.apply(
-            lambda row: self.create_row_key(row.get('社名', ''), row.get('電話番号', '')), 
-            axis=1
-        )
-        
-        # 列の順序を整理（架電日・架電時間を含める）
-        if has_call_time and '架電日' in merged_df.columns and '架電時間' in merged_df.columns:
-            column_order = ['fm_id', '社名', '電話番号', '架電日', '架電時間', 'ステータス', '架電結果', '要約', '通話時間', 
-                           '住所統合', '最終トーク判定', '最終有効無効', '最終決済担当', 'row_key']
-        elif has_call_time:
-            # 分割できなかった場合は元の架電時刻を使用
-            column_order = ['fm_id', '社名', '電話番号', '架電時刻', 'ステータス', '架電結果', '要約', '通話時間', 
-                           '住所統合', '最終トーク判定', '最終有効無効', '最終決済担当', 'row_key']
-        else:
-            column_order = ['fm_id', '社名', '電話番号', 'ステータス', '架電結果', '要約', '通話時間', 
-                           '住所統合', '最終トーク判定', '最終有効無効', '最終決済担弰', 'row_key']
-        
-        # 存在する列のみを選択
-        available_columns = [col for col in column_order if col in merged_df.columns]
-        merged_df = merged_df[available_columns]
-        
-        return merged_df
-    
-    def calculate_statistics(self, df):
-        """統計を計算"""
-        def parse_duration(val):
-            if pd.isna(val):
-                return 0
-            val = str(val).strip()
-            if val in ["", "-", "nan"]:
-                return 0
-            parts = val.split(":")
-            try:
-                if len(parts) == 3:  # hh:mm:ss
-                    h, m, s = map(int, parts)
-                    return h*3600 + m*60 + s
-                elif len(parts) == 2:  # mm:ss
-                    m, s = map(int, parts)
-                    return m*60 + s
-                else:
-                    return int(val)  # 秒数
-            except:
-                return 0
-        
-        # 通話時間を秒に変換
-        df["通話時間_sec"] = df["通話時間"].apply(parse_duration)
-        
-        # 統計計算
-        total_calls = len(df)
-        result_counts = df["架電結果"].value_counts()
-        valid_calls = df[~df["架電結果"].isin(["留守", "留守番電話"])].shape[0]
-        total_time_sec = int(df["通話時間_sec"].sum())
-        total_time_str = str(timedelta(seconds=total_time_sec))
-        transfer_calls = df[df["架電結果"].str.contains("APO", na=False)].shape[0]
-        
-        # 無効番号
-        df["電話番号_str"] = df["電話番号"].astype(str).str.replace(r"\D", "", regex=True)
-        invalid_numbers = df[~df["電話番号_str"].str.match(r"^0\d{9,10}$", na=False)].shape[0]
-        
-        # エラー件数
-        error_calls = df[df[["ステータス", "要約"]].astype(str).apply(
-            lambda x: any("エラー" in v for v in x), axis=1
-        )].shape[0]
-        
-        return {
-            'total_calls': total_calls,
-            'valid_calls': valid_calls,
-            'total_time': total_time_str,
-            'transfer_calls': transfer_calls,
-            'invalid_numbers': invalid_numbers,
-            'error_calls': error_calls,
-            'result_counts': result_counts.to_dict()
-        }
+@st.cache_resource(show_spinner=False)
+def get_manager():
+    """セッション・再実行をまたいで共有する AITeleapoManager（作成時のディレクトリ・索引DBの準備を1回だけにする）"""
+    return AITeleapoManager()
+
+@st.cache_resource(show_spinner=False)
+def get_history_manager():
+    """セッションをまたいで共有するジョブ履歴（ジャーナルの読み込み済み位置も共有）"""
+    return JobHistoryManager()
+
+def uploaded_file_digest(uploaded_file):
+    """アップロードファイルのSHA-256（同じアップロードは再実行のたびに計算し直さない）"""
+    digests = st.session_state.setdefault('upload_digests', {})
+    if uploaded_file.file_id not in digests:
+        digests[uploaded_file.file_id] = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+    return digests[uploaded_file.file_id]
+
+def uploaded_file_encoding(manager, uploaded_file):
+    """アップロードファイルの文字コード（ファイル全体を確認するため、同じアップロードは再実行のたびに判定し直さない）"""
+    encodings = st.session_state.setdefault('upload_encodings', {})
+    if uploaded_file.file_id not in encodings:
+        encodings[uploaded_file.file_id] = manager.detect_encoding(uploaded_file)
+    return encodings[uploaded_file.file_id]
+
+# 進捗を表示するジョブの状態（処理中・分析中）
+ACTIVE_JOB_STATUSES = ('processing', 'analyzing')
+
+@st.cache_resource
+def get_job_queue():
+    """セッションをまたいで共有するバックグラウンドワーカー"""
+    return BackgroundJobQueue()
+
+@st.fragment(run_every=2)
+def poll_job_progress(job_id):
+    """ジョブ作成の進捗を表示し、終わったら画面全体を更新"""
+    history_manager = st.session_state.history_manager
+    job = history_manager.get_job(job_id)
+    if job is not None and job['status'] == 'processing' and not get_job_queue().is_running(job_id):
+        # サーバー再起動などでワーカーが失われたジョブは再開しない
+        history_manager.update_job(job_id, status='failed', error="処理が中断されました。もう一度ジョブを作成してください")
+        st.rerun()
+    if job is None or job['status'] != 'processing':
+        st.rerun()
+    st.progress(float(job.get('progress') or 0.0), text=f"⏳ {job.get('progress_message') or '処理中'}")
+
+@st.fragment(run_every=2)
+def poll_analysis_progress(analysis_key, manager):
+    """結果分析の進捗を表示し、終わったら画面全体を更新"""
+    job_queue = get_job_queue()
+    task = job_queue.get_task(analysis_key)
+    if manager.has_cached_analysis(analysis_key):
+        st.rerun()
+    if task is None:
+        st.warning("⚠️ 分析が中断されました。もう一度「結果を分析」を押してください")
+        return
+    if task['error']:
+        st.error(f"❌ 結果分析エラー: {task['error']}")
+        return
+    st.progress(float(task['progress']), text=f"⏳ {task['message']}")
+
+@st.fragment(run_every=2)
+def poll_job_history():
+    """ジョブ一覧を表示し、処理中・分析中のジョブの進捗を更新（なくなったら画面全体を更新して終了）"""
+    jobs = st.session_state.history_manager.load_jobs()
+    st.session_state.jobs = jobs
+    for job in reversed(jobs):
+        display_job_card(job)
+    if not any(job.get('status') in ACTIVE_JOB_STATUSES for job in jobs):
+        st.rerun()
 
 # 改良されたジョブカード表示関数
 def display_job_card(job):
@@ -853,6 +522,11 @@ def display_job_card(job):
         </div>
     </div>
     """, unsafe_allow_html=True)
+    
+    if job.get('status') in ACTIVE_JOB_STATUSES:
+        st.progress(float(job.get('progress') or 0.0), text=job.get('progress_message') or "処理中")
+    elif job.get('status') == 'failed':
+        st.error(f"処理に失敗しました: {job.get('error', '')}")
 
 # 統計メトリクス表示関数
 def display_metrics(stats):
@@ -900,6 +574,55 @@ def display_metrics(stats):
         </div>
         """, unsafe_allow_html=True)
 
+# 集計軸別の内訳で切り替えられる軸と、件数の表示名
+ROLLUP_AXES = ['架電日', '時間帯', 'ステータス', 'レーン']
+ROLLUP_COLUMN_LABELS = {
+    'total_calls': '架電数', 'valid_calls': '有効通話', 'transfer_calls': 'APO獲得',
+    'total_time_sec': '通話時間(秒)', 'invalid_numbers': '無効番号', 'error_calls': 'エラー件数'
+}
+
+def rollup_table(rollup, axis):
+    """分析時の軸別集計を1つの軸でまとめ直した表（APO率つき、再集計は軸の組の数だけ）"""
+    table = rollup.groupby(axis, dropna=False)[list(ROLLUP_COLUMN_LABELS)].sum().reset_index()
+    table['APO率(%)'] = (table['transfer_calls'] / table['valid_calls'].where(table['valid_calls'] > 0) * 100).round(1)
+    table[axis] = table[axis].astype(object).where(table[axis].notna(), "不明")
+    return table.rename(columns=ROLLUP_COLUMN_LABELS)
+
+# 横断分析の期間（日数）と集計軸（先頭が既定）
+ARCHIVE_PERIOD_DAYS = [7, 30, 90, 180, 365]
+ARCHIVE_AXES = ['最終決済担当'] + [axis for axis in ARCHIVE_QUERY_DIMENSIONS if axis != '最終決済担当']
+ARCHIVE_AXIS_LABELS = {'job_id': 'ジョブ'}
+
+# 処理時間内訳の表示名
+METRICS_COLUMN_LABELS = {
+    'stage': '段階', 'seconds': '秒', 'rows': '件数', 'calls': '回数', 'rows_per_sec': '件/秒',
+    'peak_rss_mb': 'ピークRSS(MB)', 'rss_growth_mb': 'RSS増加(MB)', 'traced_peak_mb': 'tracemallocピーク(MB)'
+}
+
+# 結果分析で全ジョブから自動振り分けする場合の選択肢
+AUTO_ROUTE_JOB_ID = "🔀 自動判定"
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def read_filemaker_cached(upload_digest, _manager, _uploaded_file):
+    """FileMakerファイルの読み込み結果をアップロード内容のハッシュでキャッシュ"""
+    return _manager.read_filemaker_file(_uploaded_file)
+
+@st.cache_data(max_entries=ANALYSIS_MEMORY_CACHE_ENTRIES, show_spinner=False)
+def run_cached_analysis(analysis_key, _manager, _results_file, _job_id):
+    """分析〜マージを実行（プロセス内LRUとディスクの2段キャッシュ、キーは analysis_key のみ）"""
+    cached = _manager.load_cached_analysis(analysis_key)
+    if cached is not None:
+        return cached
+    
+    analysis = _manager.run_analysis(_results_file, _job_id)
+    _manager.save_cached_analysis(analysis_key, analysis)
+    return analysis
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def query_archive_cached(archive_version, dimensions, start_date, end_date, _manager):
+    """蓄積した日別集計の問い合わせ結果をキャッシュ（蓄積が更新されると版が変わり読み直す）"""
+    return _manager.query_call_archive(list(dimensions), start_date, end_date)
+
 # メインアプリケーション
 def main():
     # セッション状態の初期化
@@ -907,8 +630,10 @@ def main():
     
     st.markdown('<h1 class="main-header">📞 AIテレアポ管理システム</h1>', unsafe_allow_html=True)
     
-    manager = AITeleapoManager()
+    manager = get_manager()
     history_manager = st.session_state.history_manager
+    # バックグラウンド処理の状態を反映
+    st.session_state.jobs = history_manager.load_jobs()
     
     # サイドバー
     st.sidebar.title("🎛️ 操作メニュー")
@@ -926,7 +651,7 @@ def main():
     
     menu = st.sidebar.selectbox(
         "機能を選択",
-        ["📤 新規ジョブ作成", "📥 結果分析", "📊 ジョブ履歴", "⚙️ 設定"]
+        ["📤 新規ジョブ作成", "📥 結果分析", "📊 ジョブ履歴", "📈 横断分析", "⚙️ 設定"]
     )
     
     if menu == "📤 新規ジョブ作成":
@@ -944,7 +669,9 @@ def main():
             
             if uploaded_file:
                 try:
-                    df = pd.read_excel(uploaded_file)
+                    # 必要な列だけを読み込み（同じファイルは再実行時にキャッシュから取得）
+                    upload_digest = uploaded_file_digest(uploaded_file)
+                    df = read_filemaker_cached(upload_digest, manager, uploaded_file)
                     st.markdown(f"""
                     <div class="success-box">
                         <h4>✅ ファイル読み込み完了</h4>
@@ -981,41 +708,58 @@ def main():
                     )
                     
                     if st.button("🚀 ジョブを作成", type="primary"):
-                        with st.spinner("ジョブを作成中..."):
-                            job_id = manager.generate_job_id()
-                            result = manager.process_filemaker_data(df, job_id, output_name)
-                            
-                            # セッション状態に保存
-                            job_info = {
-                                'job_id': job_id,
-                                'created_at': datetime.now(),
-                                'filename': uploaded_file.name,
-                                'output_name': output_name,
-                                'robot_count': robot_count,
-                                'total_rows': result['total_rows'],
-                                'status': 'created'
-                            }
-                            st.session_state.jobs.append(job_info)
-                            
-                            # ファイルに保存
-                            history_manager.save_jobs(st.session_state.jobs)
-                            
-                            st.markdown(f"""
-                            <div class="success-box">
-                                <h4>✅ ジョブ作成完了</h4>
-                                <p><strong>ジョブID:</strong> {job_id}</p>
-                                <p><strong>処理件数:</strong> {result['total_rows']:,} 件</p>
-                                <p><strong>アップロード用ファイル:</strong> {result['upload_path']}</p>
-                            </div>
-                            """, unsafe_allow_html=True)
-                            
-                            # ダウンロードボタン
-                            with open(result['upload_path'], 'rb') as f:
+                        job_info = {
+                            'job_id': manager.generate_job_id(),
+                            'created_at': datetime.now(),
+                            'filename': uploaded_file.name,
+                            'output_name': output_name,
+                            'robot_count': robot_count,
+                            'total_rows': len(df),
+                            'status': 'processing',
+                            'progress': 0.0
+                        }
+                        # 履歴に登録してからバックグラウンドで処理
+                        if history_manager.add_job(job_info):
+                            get_job_queue().submit_job_creation(
+                                manager, history_manager, job_info, df,
+                                uploaded_file.getvalue(), Path(uploaded_file.name).suffix.lower()
+                            )
+                            st.session_state.current_job = job_info['job_id']
+                        else:
+                            st.error("❌ ジョブ履歴を保存できませんでした（詳細はログを確認してください）")
+                    
+                    current_job = history_manager.get_job(st.session_state.current_job) if st.session_state.current_job else None
+                    if current_job and current_job['status'] == 'processing':
+                        poll_job_progress(current_job['job_id'])
+                    elif current_job and current_job['status'] == 'failed':
+                        st.error(f"❌ ジョブ作成エラー: {current_job.get('error', '')}")
+                    elif current_job:
+                        upload_paths = manager.get_upload_paths(current_job['job_id'])
+                        st.markdown(f"""
+                        <div class="success-box">
+                            <h4>✅ ジョブ作成完了</h4>
+                            <p><strong>ジョブID:</strong> {current_job['job_id']}</p>
+                            <p><strong>処理件数:</strong> {current_job['total_rows']:,} 件</p>
+                            <p><strong>アップロード用ファイル:</strong> {len(upload_paths)} レーン</p>
+                        </div>
+                        """, unsafe_allow_html=True)
+
+                        # アップロード用CSVの文字コードで表せず置き換えた文字
+                        encoding_changes = manager.get_encoding_changes(current_job['job_id'])
+                        if len(encoding_changes) > 0:
+                            st.warning(f"⚠️ AIテレアポ用CSVの文字コードで表せない文字を {encoding_changes['行'].nunique():,} 行で置き換えました")
+                            with st.expander("置き換えた行を確認"):
+                                st.dataframe(encoding_changes, use_container_width=True)
+
+                        # ダウンロードボタン（レーンごと）
+                        for upload_path in upload_paths:
+                            with open(upload_path, 'rb') as f:
                                 st.download_button(
-                                    label="📤 AIテレアポ用CSVをダウンロード",
+                                    label=f"📤 AIテレアポ用CSVをダウンロード ({upload_path.name})",
                                     data=f.read(),
-                                    file_name=f"{output_name}.csv",
+                                    file_name=upload_path.name,
                                     mime="text/csv",
+                                    key=f"upload_download_{upload_path.name}",
                                     type="primary"
                                 )
                 
@@ -1044,8 +788,12 @@ def main():
             st.subheader("📊 通話結果の分析")
             
             # ジョブ選択
-            if st.session_state.jobs:
-                job_options = [f"{job['job_id']} - {job['output_name']}" for job in st.session_state.jobs]
+            # 作成中・失敗したジョブは分析対象にしない
+            ready_jobs = [job for job in st.session_state.jobs if job.get('status') not in ('processing', 'failed')]
+            if ready_jobs:
+                # 先頭は複数ジョブが混在した結果CSV向けの自動振り分け
+                job_options = [f"{AUTO_ROUTE_JOB_ID} - 全ジョブから振り分け"]
+                job_options += [f"{job['job_id']} - {job['output_name']}" for job in ready_jobs]
                 selected_job_str = st.selectbox("分析対象のジョブを選択", job_options)
                 selected_job_id = selected_job_str.split(" - ")[0]
             else:
@@ -1066,30 +814,44 @@ def main():
             
             if results_file and selected_job_id:
                 try:
-                    # CSVファイルを読み込み（エンコーディング自動判定）
-                    try:
-                        df = pd.read_csv(results_file, encoding='utf-8')
-                    except UnicodeDecodeError:
-                        try:
-                            df = pd.read_csv(results_file, encoding='shift_jis')
-                        except UnicodeDecodeError:
-                            df = pd.read_csv(results_file, encoding='cp932')
+                    # 文字コードはアップロードごとに一度だけ判定し、プレビューは先頭行のみ読み込む
+                    encoding = uploaded_file_encoding(manager, results_file)
+                    preview_df = pd.read_csv(results_file, encoding=encoding, nrows=10)
+                    results_file.seek(0)
                     
-                    st.success(f"✅ ファイル読み込み完了: {results_file.name} ({len(df):,} 件)")
+                    st.success(f"✅ ファイル読み込み完了: {results_file.name} ({results_file.size / 1024 / 1024:.1f} MB, {encoding})")
                     
                     # データプレビュー
                     with st.expander("📋 結果データプレビュー"):
-                        st.dataframe(df.head(10), use_container_width=True)
+                        st.dataframe(preview_df, use_container_width=True)
+                    
+                    # 結果ファイルの内容・ジョブ・分類ルールが同じなら分析結果を再利用
+                    merge_job_id = None if selected_job_id == AUTO_ROUTE_JOB_ID else selected_job_id
+                    results_digest = uploaded_file_digest(results_file)
+                    analysis_key = manager.analysis_cache_key(results_digest, merge_job_id)
                     
                     if st.button("🔍 結果を分析", type="primary"):
+                        st.session_state.analysis_key = analysis_key
+                        # 未分析ならバックグラウンドで実行（同じ内容の分析は二重に投入しない）
+                        job_queue = get_job_queue()
+                        if not manager.has_cached_analysis(analysis_key) and not job_queue.is_running(analysis_key):
+                            job_queue.submit_analysis(
+                                manager, history_manager, analysis_key, results_file.getvalue(), merge_job_id
+                            )
+                    
+                    # 分析済みであれば再実行（ウィジェット操作など）でも結果を表示し続ける
+                    if st.session_state.get('analysis_key') == analysis_key and not manager.has_cached_analysis(analysis_key):
+                        poll_analysis_progress(analysis_key, manager)
+                    elif st.session_state.get('analysis_key') == analysis_key:
                         with st.spinner("結果を分析中..."):
-                            # 通話結果を分析
-                            analyzed_df = manager.analyze_call_results(df)
-                            
-                            # 統計を計算
-                            stats = manager.calculate_statistics(analyzed_df)
+                            # 通話結果を分析して元データとマージ（キャッシュ済みなら即時に返る）
+                            analysis = run_cached_analysis(analysis_key, manager, results_file, merge_job_id)
+                            stats = analysis['stats']
+                            merged_df = analysis['merged_df']
                             
                             st.subheader("📊 分析結果")
+                            if 'analyzed_rows' in analysis:
+                                st.caption(f"🔁 前回の分析から新規・変更のあった {analysis['analyzed_rows']:,} 件のみ分析しました")
                             
                             # 改良されたメトリクス表示
                             display_metrics(stats)
@@ -1132,22 +894,42 @@ def main():
                                                    columns=['結果', '件数'])
                             st.dataframe(result_df, use_container_width=True)
                             
-                            # 元データとマージ（社名ベース）
-                            merged_df = manager.merge_with_original(analyzed_df, selected_job_id)
+                            # 集計軸別の内訳（分析時に集計済みのため、軸を切り替えても分析し直さない）
+                            if 'rollup' in stats:
+                                st.subheader("🧭 集計軸別の内訳")
+                                rollup_axis = st.selectbox("集計軸", ROLLUP_AXES, key="rollup_axis")
+                                st.dataframe(rollup_table(stats['rollup'], rollup_axis), use_container_width=True)
                             
                             # マージ結果の確認
                             st.subheader("🔗 マージ結果")
                             matched_count = merged_df['fm_id'].notna().sum()
                             match_rate = (matched_count / len(merged_df) * 100) if len(merged_df) > 0 else 0
+                            # 照合方法ごとの件数（表記ゆれ・あいまい一致は信頼度を確認）
+                            method_summary = ""
+                            if 'マッチ方法' in merged_df.columns:
+                                method_counts = merged_df['マッチ方法'].value_counts()
+                                method_summary = " / ".join(f"{method} {count:,} 件" for method, count in method_counts.items() if count > 0)
                             
                             st.markdown(f"""
                             <div class="info-box">
                                 <h4><span class="small-icon">📊</span> マッチング結果</h4>
                                 <p><strong>マッチした件数:</strong> {matched_count:,} / {len(merged_df):,} 件</p>
                                 <p><strong>マッチ率:</strong> {match_rate:.1f}%</p>
+                                {f"<p><strong>照合方法:</strong> {method_summary}</p>" if method_summary else ""}
                             </div>
                             """, unsafe_allow_html=True)
-                            
+
+                            # 結合先が複数あって決められなかった社名（行は増やさず未結合）
+                            if 'マッチ方法' in merged_df.columns:
+                                ambiguous_companies = merged_df.loc[merged_df['マッチ方法'] == '候補複数', '社名'].value_counts()
+                                ambiguous_companies = ambiguous_companies[ambiguous_companies > 0]
+                                if len(ambiguous_companies) > 0:
+                                    st.warning(f"⚠️ 元データに同じ社名が複数あり、電話番号でも1件に決められない通話が {ambiguous_companies.sum():,} 件あります（未結合のまま出力します）")
+                                    st.dataframe(
+                                        ambiguous_companies.rename_axis('社名').reset_index(name='件数'),
+                                        use_container_width=True
+                                    )
+
                             # 出力ファイル名の指定（自動生成）
                             st.subheader("💾 結果保存")
                             # 選択されたジョブの元ファイル名を取得
@@ -1156,6 +938,8 @@ def main():
                                 base_filename = selected_job['filename'].rsplit('.', 1)[0]
                                 date_str = datetime.now().strftime("%Y%m%d")
                                 output_filename = f"{base_filename}_{date_str}_結果"
+                            elif selected_job_id == AUTO_ROUTE_JOB_ID:
+                                output_filename = f"全ジョブ_{datetime.now().strftime('%Y%m%d')}_結果"
                             else:
                                 output_filename = f"結果_{selected_job_id}"
                             
@@ -1167,24 +951,41 @@ def main():
                             )
                             
                             # 修正版：結果を保存ボタンをクリックしたら即座に自動ダウンロード
-                            final_filename = f"{output_filename}.xlsx"
+                            # 出力形式の選択（インストール済みのもののみ）
+                            available_backends = manager.available_export_backends()
+                            export_backend = st.selectbox(
+                                "出力形式",
+                                available_backends,
+                                format_func=lambda backend: EXPORT_BACKENDS[backend]['label'],
+                                help="大量データの場合はCSVやParquetの方が高速です"
+                            )
+                            backend_info = EXPORT_BACKENDS[export_backend]
+                            final_filename = f"{output_filename}{backend_info['extension']}"
+                            
+                            # ファイルはボタンが押された時に作る（再実行のたびにファイルの内容をメモリへ複製しない）。
+                            # 同じ分析結果・出力形式で作成済みのファイルはキャッシュから読み込む
+                            download_id = f"{analysis_key}:{export_backend}"
                             
-                            # メモリ上でExcelファイルを作成
-                            buffer = BytesIO()
-                            with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                                merged_df.to_excel(writer, index=False, sheet_name='分析結果')
-                            buffer.seek(0)
-                            excel_data = buffer.getvalue()
+                            def export_download(download_id=download_id, merged_df=merged_df, export_backend=export_backend,
+                                                merge_job_id=merge_job_id, final_filename=final_filename):
+                                export_data = history_manager.read_download_file(download_id)
+                                if export_data is None:
+                                    profiler = StageProfiler()
+                                    export_data = manager.export_results(merged_df, export_backend)
+                                    profiler.lap(f"export:{export_backend}", len(merged_df))
+                                    manager.write_metrics(merge_job_id, 'export', profiler.finish())
+                                    history_manager.save_download_file(download_id, export_data, final_filename)
+                                return export_data
                             
                             # 自動ダウンロード機能付きボタン
                             st.download_button(
                                 label="💾 結果を保存",
-                                data=excel_data,
+                                data=export_download,
                                 file_name=final_filename,
-                                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                                mime=backend_info['mime'],
                                 key=f"auto_download_{selected_job_id}",
                                 type="primary",
-                                help="クリックすると即座にExcelファイルがダウンロードされます"
+                                help="クリックすると即座にファイルがダウンロードされます"
                             )
                             
 
@@ -1192,6 +993,20 @@ def main():
                             # データプレビュー
                             with st.expander("📋 分析済みデータプレビュー"):
                                 st.dataframe(merged_df.head(20), use_container_width=True)
+                            
+                            # 処理段階ごとの時間・メモリ（分析実行時と直近の出力の計測）
+                            if analysis.get('metrics'):
+                                with st.expander("⏱️ 処理時間内訳"):
+                                    metrics = analysis['metrics']
+                                    stage_rows = list(metrics['stages'])
+                                    latest_export = next((m for m in manager.read_metrics(merge_job_id) if m['run'] == 'export'), None)
+                                    if latest_export:
+                                        stage_rows += latest_export['stages']
+                                    st.caption(f"分析実行: {metrics['started_at'][:19]}（合計 {metrics['total_seconds']:.2f} 秒）")
+                                    st.dataframe(
+                                        pd.DataFrame(stage_rows).rename(columns=METRICS_COLUMN_LABELS),
+                                        use_container_width=True
+                                    )
                 
                 except Exception as e:
                     st.error(f"❌ 結果分析エラー: {str(e)}")
@@ -1206,14 +1021,17 @@ def main():
             st.markdown(f"""
             <div class="info-box">
                 <h4><span class="small-icon">💾</span> ファイルベース履歴管理</h4>
-                <p>ジョブ履歴は job_history.json ファイルに保存されており、アプリケーション再起動時に自動で復元されます。</p>
+                <p>ジョブ履歴は {history_manager.history_file.name} ファイルに追記保存されており、アプリケーション再起動時に自動で復元されます。</p>
                 <p><strong>保存済みジョブ数:</strong> {len(st.session_state.jobs)} 件</p>
             </div>
             """, unsafe_allow_html=True)
             
-            # ジョブを新しい順に表示
-            for job in reversed(st.session_state.jobs):
-                display_job_card(job)
+            # ジョブを新しい順に表示（処理中・分析中のジョブがある間は進捗を定期的に更新）
+            if any(job.get('status') in ACTIVE_JOB_STATUSES for job in st.session_state.jobs):
+                poll_job_history()
+            else:
+                for job in reversed(st.session_state.jobs):
+                    display_job_card(job)
         else:
             st.markdown("""
             <div class="info-box">
@@ -1223,6 +1041,51 @@ def main():
             </div>
             """, unsafe_allow_html=True)
     
+    elif menu == "📈 横断分析":
+        st.markdown('<h2 class="section-header"><span class="small-icon">📈</span> 横断分析</h2>', unsafe_allow_html=True)
+        
+        if not manager.call_archive.available():
+            st.markdown(f"""
+            <div class="warning-box">
+                <h4>⚠️ 横断分析を利用できません</h4>
+                <p>分析済み通話の蓄積には {CALL_ARCHIVE_REQUIRES} が必要です。インストール後に結果分析を行うと、以降の分析結果が蓄積されます。</p>
+            </div>
+            """, unsafe_allow_html=True)
+        else:
+            col1, col2 = st.columns(2)
+            with col1:
+                period_days = st.selectbox("期間", ARCHIVE_PERIOD_DAYS, index=2, format_func=lambda days: f"直近 {days} 日")
+            with col2:
+                archive_axis = st.selectbox(
+                    "集計軸", ARCHIVE_AXES, key="archive_axis",
+                    format_func=lambda axis: ARCHIVE_AXIS_LABELS.get(axis, axis)
+                )
+            end_date = datetime.now().date()
+            start_date = end_date - timedelta(days=period_days - 1)
+            
+            # 期間内の日付・必要な列だけを日別集計から読み込む（分析結果のファイルは読み直さない）
+            archive_version = manager.call_archive.version()
+            table = query_archive_cached(archive_version, (archive_axis,), start_date.isoformat(), end_date.isoformat(), manager)
+            if table.empty:
+                st.markdown("""
+                <div class="info-box">
+                    <h4><span class="small-icon">📝</span> 蓄積データがありません</h4>
+                    <p>この期間に架電した分析済みの通話がありません。「📥 結果分析」で分析した通話は自動で蓄積されます。</p>
+                </div>
+                """, unsafe_allow_html=True)
+            else:
+                st.caption(f"{start_date:%Y/%m/%d} 〜 {end_date:%Y/%m/%d} に架電した分析済みの通話（結果分析のたびに蓄積）")
+                display_metrics({key: int(table[key].sum()) for key in STAT_ROLLUP_MEASURES})
+                
+                st.subheader(f"🧭 {ARCHIVE_AXIS_LABELS.get(archive_axis, archive_axis)}別の内訳")
+                st.dataframe(rollup_table(table, archive_axis), use_container_width=True)
+                
+                st.subheader("📈 日別のAPO率")
+                daily = rollup_table(
+                    query_archive_cached(archive_version, ('架電日',), start_date.isoformat(), end_date.isoformat(), manager), '架電日'
+                )
+                st.line_chart(daily.set_index('架電日')['APO率(%)'])
+    
     elif menu == "⚙️ 設定":
         st.markdown('<h2 class="section-header"><span class="small-icon">⚙️</span> 設定</h2>', unsafe_allow_html=True)
         
@@ -1243,7 +1106,7 @@ def main():
         
         st.subheader("ℹ️ システム情報")
         history_file_exists = history_manager.history_file.exists()
-        cache_files = len(list(history_manager.download_cache_dir.glob("*.pkl")))
+        cache_usage = history_manager.download_cache.usage()
         
         st.markdown(f"""
         <div class="info-box">
@@ -1251,8 +1114,12 @@ def main():
             <p><strong>ジョブ保存場所:</strong> {manager.base_dir.absolute()}</p>
             <p><strong>履歴ファイル:</strong> {history_manager.history_file.absolute()}</p>
             <p><strong>履歴ファイル存在:</strong> {'✅ あり' if history_file_exists else '❌ なし'}</p>
-            <p><strong>キャッシュファイル数:</strong> {cache_files} 個</p>
+            <p><strong>ダウンロードキャッシュ:</strong> {cache_usage['entries']} 件 / {cache_usage['total_bytes'] / 1024 / 1024:.1f} MB (上限 {cache_usage['max_bytes'] / 1024 / 1024:.0f} MB)</p>
+            <p><strong>キャッシュ ヒット / ミス / 削除:</strong> {cache_usage['hits']} / {cache_usage['misses']} / {cache_usage['evictions']}</p>
             <p><strong>作成済みジョブ数:</strong> {len(st.session_state.jobs)}</p>
+            <p><strong>分類ルール:</strong> {manager.rules_path.name} (v{manager.get_call_rules().version})</p>
+            <p><strong>横断分析の蓄積:</strong> {manager.call_archive.root.absolute()}{'' if manager.call_archive.available() else f'（{CALL_ARCHIVE_REQUIRES} 未インストールのため蓄積しません）'}</p>
+            <p><strong>CSV文字コード:</strong> {manager.get_upload_charmap().encoding}（置き換え表 {manager.charmap_path.name} v{manager.get_upload_charmap().version}）</p>
             <p><strong>バージョン:</strong> 8.0.0 (5レーン対応版)</p>
         </div>
         """, unsafe_allow_html=True)
@@ -0,0 +1,66 @@
+"""結果出力形式（xlsx/CSV/Parquet）ごとの書き出し時間とサイズを比較するベンチマーク
+
+使い方: python benchmarks/bench_export.py --rows 10000 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from teleapo_core import AITeleapoManager
+
+
+def make_merged_df(rows, seed=0):
+    """merge_with_original の出力と同じ列構成の合成データ"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'fm_id': [f"ID{i:07d}" for i in range(rows)],
+        '社名': [f"株式会社サンプル{i % 5000}" for i in range(rows)],
+        '電話番号': [f"0{rng.integers(100000000, 999999999)}" for _ in range(rows)],
+        '架電日': '2026/10/01',
+        '架電時間': [f"{h:02d}:{m:02d}:00" for h, m in zip(rng.integers(9, 19, rows), rng.integers(0, 60, rows))],
+        'ステータス': rng.choice(['通話完了', '留守番電話', '応答なし', '獲得'], rows),
+        '架電結果': rng.choice(['NG', '留守', '留守電', 'AI電話APO'], rows),
+        '要約': rng.choice(['担当者不在のため断られました。', '資料送付を了承しました。', ''], rows),
+        '通話時間': [f"{m}:{s:02d}" for m, s in zip(rng.integers(0, 5, rows), rng.integers(0, 60, rows))],
+        '住所統合': [f"東京都千代田区{i % 100}-{i % 50}" for i in range(rows)],
+        '最終トーク判定': rng.choice(['A', 'B', 'C', None], rows),
+        '最終有効無効': rng.choice(['有効', '無効'], rows),
+        '最終決済担当': rng.choice(['山田', '佐藤', '鈴木'], rows),
+        'row_key': [f"{i:016x}" for i in range(rows)],
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10_000, 100_000])
+    args = parser.parse_args()
+    
+    # ジョブや分析キャッシュのディレクトリは一時ディレクトリに作り、作業ディレクトリに残さない
+    with tempfile.TemporaryDirectory(prefix="teleapo_export_") as work_dir:
+        cwd = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            manager = AITeleapoManager()
+            backends = manager.available_export_backends()
+            print(f"{'rows':>10}  {'backend':<18}{'seconds':>10}{'MB':>10}")
+            for rows in args.rows:
+                merged_df = make_merged_df(rows)
+                for backend in backends:
+                    start = time.perf_counter()
+                    data = manager.export_results(merged_df, backend)
+                    elapsed = time.perf_counter() - start
+                    print(f"{rows:>10,}  {backend:<18}{elapsed:>10.2f}{len(data) / 1024 / 1024:>10.1f}")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""結果分析1回あたりのピークメモリを計測するベンチマーク（計測ごとに新しいプロセスで実行）
+
+使い方: python benchmarks/bench_memory.py --rows 100000 1000000
+        python benchmarks/bench_memory.py --rows 1000000 --modes full
+
+ピークは Linux の /proc/self/status の VmHWM で計測する（分析直前にリセットし、分析前からの増加分を表示）。
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+MODES = {
+    'full': "analyze_results_file + merge_with_original（全件分析）",
+    'job': "run_analysis（ジョブ指定・初回の差分分析）",
+}
+
+
+def memory_status_mb():
+    """現在の常駐メモリと最大常駐メモリ（MB）"""
+    status = {}
+    with open('/proc/self/status', encoding='ascii') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            status[key] = value.strip()
+    return int(status['VmRSS'].split()[0]) / 1024, int(status['VmHWM'].split()[0]) / 1024
+
+
+def reset_peak_rss():
+    """最大常駐メモリを現在値にリセット（Linux のみ）"""
+    with open('/proc/self/clear_refs', 'w', encoding='ascii') as f:
+        f.write('5')
+
+
+def measure(mode, rows, seed):
+    """子プロセス側: データを用意してから1回分析し、ピークメモリの増加分を返す"""
+    from teleapo_core import AITeleapoManager
+    from synthetic import make_call_results_csv, make_call_results_df, make_filemaker_df
+
+    manager = AITeleapoManager()
+    filemaker_df = make_filemaker_df(rows, seed)
+    manager.process_filemaker_data(filemaker_df, "BENCH", "bench", 3, original_bytes=b"")
+    results_bytes = make_call_results_csv(make_call_results_df(filemaker_df, rows, seed + 1))
+    del filemaker_df
+    gc.collect()
+
+    reset_peak_rss()
+    rss_before, _ = memory_status_mb()
+    start = time.perf_counter()
+    if mode == 'full':
+        analyzed_df = manager.analyze_results_file(BytesIO(results_bytes))
+        merged_df = manager.merge_with_original(analyzed_df, "BENCH")
+        del analyzed_df
+    else:
+        merged_df = manager.run_analysis(BytesIO(results_bytes), "BENCH")['merged_df']
+    elapsed = time.perf_counter() - start
+    rss_after, peak = memory_status_mb()
+    return {
+        'mode': mode, 'rows': rows, 'seconds': round(elapsed, 2),
+        'peak_growth_mb': round(peak - rss_before, 1),
+        'retained_mb': round(rss_after - rss_before, 1),
+        'result_mb': round(merged_df.memory_usage(deep=True).sum() / 1024 / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--child', choices=list(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.rows[0], args.seed)))
+        return 0
+
+    print(f"{'mode':<6}{'rows':>12}{'seconds':>10}{'peak増加MB':>12}{'残存MB':>10}{'結果MB':>10}")
+    for rows in args.rows:
+        for mode in args.modes:
+            # ジョブ・キャッシュが作業ツリーに作られないよう一時ディレクトリで実行
+            with tempfile.TemporaryDirectory(prefix="teleapo_memory_") as work_dir:
+                completed = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), '--child', mode, '--rows', str(rows), '--seed', str(args.seed)],
+                    cwd=work_dir, capture_output=True, text=True,
+                    env={**os.environ, 'PYTHONPATH': str(Path(__file__).resolve().parent)}
+                )
+            if completed.returncode != 0:
+                print(completed.stderr, file=sys.stderr)
+                return 1
+            r = json.loads(completed.stdout.strip().splitlines()[-1])
+            print(f"{r['mode']:<6}{r['rows']:>12,}{r['seconds']:>10.2f}{r['peak_growth_mb']:>12.1f}{r['retained_mb']:>10.1f}{r['result_mb']:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
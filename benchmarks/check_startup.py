@@ -0,0 +1,100 @@
+"""起動時間の予算チェック（コア部分の読み込み・アプリの初回実行・再実行の時間を計測し、予算超過で終了コード1）
+
+使い方: python benchmarks/check_startup.py
+        python benchmarks/check_startup.py --repeat 5 --rerun-budget 0.5
+
+CI では tests/test_startup.py が緩い予算で同じ点（重いモジュールを読み込まないこと・各ページの表示）を確認します。
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 予算（秒）。CI など遅い環境では引数で緩める
+CORE_IMPORT_BUDGET_SEC = 1.5
+APP_FIRST_RUN_BUDGET_SEC = 4.0
+APP_RERUN_BUDGET_SEC = 0.3
+# コア部分の読み込み時には読み込まれてはいけないモジュール（使う時に読み込む）
+LAZY_MODULES = ['streamlit', 'openpyxl', 'xlsxwriter']
+PAGES = ["📤 新規ジョブ作成", "📥 結果分析", "📊 ジョブ履歴", "📈 横断分析", "⚙️ 設定"]
+
+# 新しいプロセスでコア部分を読み込み、時間と読み込まれたモジュールを返す
+CORE_IMPORT_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import teleapo_core
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+# 新しいプロセスでアプリを初回実行し、各ページの再実行時間を返す
+APP_RUN_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+app = AppTest.from_file({app!r}, default_timeout=60).run()
+first_run = time.perf_counter() - start
+reruns = {{}}
+for page in {pages!r}:
+    app.sidebar.selectbox[0].select(page).run()
+    start = time.perf_counter()
+    for _ in range({repeat}):
+        app.run()
+    reruns[page] = (time.perf_counter() - start) / {repeat}
+errors = [str(e.value) for e in app.exception]
+print(json.dumps({{'first_run': first_run, 'reruns': reruns, 'errors': errors}}))
+"""
+
+
+def run_python(script, work_dir):
+    """作業ディレクトリでスクリプトを実行し、最終行のJSONを返す"""
+    completed = subprocess.run(
+        [sys.executable, '-c', script], cwd=work_dir, capture_output=True, text=True, check=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help="ページごとの再実行回数（平均を採用）")
+    parser.add_argument('--import-budget', type=float, default=CORE_IMPORT_BUDGET_SEC)
+    parser.add_argument('--first-run-budget', type=float, default=APP_FIRST_RUN_BUDGET_SEC)
+    parser.add_argument('--rerun-budget', type=float, default=APP_RERUN_BUDGET_SEC)
+    args = parser.parse_args()
+
+    failures = []
+    # ジョブ・キャッシュが作業ツリーに作られないよう一時ディレクトリで実行
+    with tempfile.TemporaryDirectory(prefix="teleapo_startup_") as work_dir:
+        core = run_python(CORE_IMPORT_SCRIPT.format(root=str(ROOT), lazy=LAZY_MODULES), work_dir)
+        print(f"{'teleapo_core の読み込み':<28}{core['seconds']:>8.3f} 秒（予算 {args.import_budget} 秒）")
+        if core['seconds'] > args.import_budget:
+            failures.append("teleapo_core の読み込みが予算超過")
+        if core['loaded']:
+            failures.append(f"teleapo_core の読み込み時に {', '.join(core['loaded'])} が読み込まれています")
+
+        app = run_python(APP_RUN_SCRIPT.format(
+            root=str(ROOT), app=str(ROOT / "ai_teleapo_app.py"), pages=PAGES, repeat=args.repeat
+        ), work_dir)
+        print(f"{'アプリの初回実行':<28}{app['first_run']:>8.3f} 秒（予算 {args.first_run_budget} 秒）")
+        if app['first_run'] > args.first_run_budget:
+            failures.append("アプリの初回実行が予算超過")
+        for page, seconds in app['reruns'].items():
+            print(f"{'再実行: ' + page:<28}{seconds:>8.3f} 秒（予算 {args.rerun_budget} 秒）")
+            if seconds > args.rerun_budget:
+                failures.append(f"{page} の再実行が予算超過")
+        if app['errors']:
+            failures.append(f"アプリ実行時の例外: {app['errors']}")
+
+    for failure in failures:
+        print(f"✘ {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
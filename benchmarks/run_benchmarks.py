@@ -0,0 +1,155 @@
+"""処理段階ごとの実行時間を合成データで計測し、実行間で比較できるレポートを出力するベンチマーク
+
+使い方: python benchmarks/run_benchmarks.py --rows 1000 10000 100000 --output bench_report.json
+        python benchmarks/run_benchmarks.py --rows 1000000 --stages analyze_call_results merge_with_original
+        python benchmarks/run_benchmarks.py --compare bench_report.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from teleapo_core import AITeleapoManager
+from synthetic import make_call_results_csv, make_call_results_df, make_filemaker_df
+
+STAGES = ['process_filemaker_data', 'analyze_call_results', 'merge_with_original', 'calculate_statistics', 'export_xlsx']
+# xlsx の1シートに収まる行数（見出し行を除く）
+XLSX_MAX_ROWS = 1_048_575
+
+
+def best_time(fn, prepare, repeat):
+    """prepare() で入力を用意してから fn を実行し、最短時間と最後の戻り値を返す（用意の時間は含めない）"""
+    best, result = None, None
+    for _ in range(repeat):
+        args = prepare()
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run_size(manager, rows, stages, repeat, lanes, seed):
+    """1つのデータ量で各段階を計測"""
+    filemaker_df = make_filemaker_df(rows, seed)
+    results_bytes = make_call_results_csv(make_call_results_df(filemaker_df, rows, seed + 1))
+    job_id = f"BENCH_{rows}"
+    measured = {}
+
+    # 後段の入力になるため、計測対象でなくてもジョブ作成と分析は実行する
+    measured['process_filemaker_data'], _ = best_time(
+        lambda df: manager.process_filemaker_data(df, job_id, "bench", lanes, original_bytes=b""),
+        lambda: (filemaker_df.copy(),), repeat if 'process_filemaker_data' in stages else 1
+    )
+    call_results_df = pd.read_csv(BytesIO(results_bytes), encoding='cp932')
+    measured['analyze_call_results'], analyzed_df = best_time(
+        manager.analyze_call_results,
+        lambda: (call_results_df.copy(),), repeat if 'analyze_call_results' in stages else 1
+    )
+    if 'calculate_statistics' in stages:
+        measured['calculate_statistics'], _ = best_time(
+            manager.calculate_statistics, lambda: (analyzed_df.copy(),), repeat
+        )
+    if 'merge_with_original' in stages or 'export_xlsx' in stages:
+        measured['merge_with_original'], merged_df = best_time(
+            manager.merge_with_original,
+            lambda: (analyzed_df.copy(), job_id), repeat if 'merge_with_original' in stages else 1
+        )
+    if 'export_xlsx' in stages:
+        if len(merged_df) > XLSX_MAX_ROWS:
+            print(f"  {rows:,} 行: xlsx の行数上限を超えるため export_xlsx は省略", file=sys.stderr)
+        else:
+            for backend in manager.available_export_backends():
+                if backend.startswith('xlsx'):
+                    measured[f"export_xlsx:{backend}"], _ = best_time(
+                        manager.export_results, lambda: (merged_df, backend), repeat
+                    )
+
+    return [
+        {'stage': stage, 'rows': rows, 'seconds': round(seconds, 4), 'rows_per_sec': round(rows / seconds) if seconds else None}
+        for stage, seconds in measured.items()
+        if stage.split(':')[0] in stages
+    ]
+
+
+def environment_info():
+    """比較時に前提を確認するための実行環境"""
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=Path(__file__).resolve().parent, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def print_report(results, baseline=None):
+    """計測結果を表で表示（baseline があれば前回比も表示）"""
+    previous = {(r['stage'], r['rows']): r['seconds'] for r in baseline['results']} if baseline else {}
+    header = f"{'stage':<32}{'rows':>12}{'seconds':>10}{'rows/s':>12}"
+    print(header + (f"{'baseline':>10}{'change':>9}" if baseline else ""))
+    for r in results:
+        line = f"{r['stage']:<32}{r['rows']:>12,}{r['seconds']:>10.3f}{r['rows_per_sec'] or 0:>12,}"
+        base = previous.get((r['stage'], r['rows']))
+        if base:
+            line += f"{base:>10.3f}{(r['seconds'] / base - 1) * 100:>+8.1f}%"
+        elif baseline:
+            line += f"{'-':>10}{'-':>9}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--repeat', type=int, default=3, help="各段階の試行回数（最短時間を採用）")
+    parser.add_argument('--lanes', type=int, default=3, help="ジョブ作成時のロボット台数")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=Path, help="レポート（JSON）の保存先")
+    parser.add_argument('--compare', type=Path, help="比較する前回のレポート（JSON）")
+    args = parser.parse_args()
+
+    baseline = json.loads(args.compare.read_text(encoding='utf-8')) if args.compare else None
+    results = []
+    # ジョブ・キャッシュは作業ディレクトリ配下に作られるため一時ディレクトリで実行
+    with tempfile.TemporaryDirectory(prefix="teleapo_bench_") as work_dir:
+        cwd = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            manager = AITeleapoManager()
+            for rows in args.rows:
+                print(f"{rows:,} 行を計測中...", file=sys.stderr)
+                results.extend(run_size(manager, rows, args.stages, args.repeat, args.lanes, args.seed))
+        finally:
+            os.chdir(cwd)
+
+    report = {**environment_info(), 'repeat': args.repeat, 'lanes': args.lanes, 'seed': args.seed, 'results': results}
+    print_report(results, baseline)
+    if args.output:
+        args.output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"レポートを保存しました: {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""ベンチマーク用の合成データ（FileMaker出力・AIテレアポ結果CSV）"""
+import numpy as np
+import pandas as pd
+
+PREFECTURES = ['東京都', '大阪府', '神奈川県', '愛知県', '福岡県', '北海道', '埼玉県', '千葉県']
+CITIES = ['中央区', '北区', '港区', '西区', '南区', '緑区', '青葉区', '博多区']
+COMPANY_FORMS = ['株式会社{}', '{}株式会社', '有限会社{}', '（株）{}', '{}']
+COMPANY_WORDS = ['サンプル', 'テスト', '山田', '佐藤', '東洋', '日本', 'ミライ', 'グローバル', '総合', 'ＡＢＣ']
+COMPANY_SUFFIXES = ['商事', '工業', '建設', '不動産', 'システム', '物産', '製作所', 'サービス']
+
+# 結果CSVのステータスと要約（call_rules.json の各ルールに当たるように混ぜる）
+STATUSES = ['通話完了', '通話完了', '通話完了', '留守番電話', '応答なし', '応答無し', '獲得', '自動音声', 'エラー']
+SUMMARIES = [
+    '担当者に断りを入れられました。',
+    '営業電話は不要とのことで電話を切られました。',
+    '今は必要ないと言われ通話が終了しました。',
+    '担当者不在のため折り返しを依頼しました。',
+    '担当者に転送されました。',
+    '資料送付を了承しました。',
+    '応答なし',
+    'システムエラーにより通話できませんでした。',
+    '',
+]
+
+
+def make_phone_numbers(rng, rows):
+    """ハイフン区切り・+81形式・ハイフンなしが混在した電話番号"""
+    areas = rng.choice(['3', '6', '45', '52', '92', '90', '80'], rows)
+    subscribers = rng.integers(0, 10 ** 8, rows)
+    styles = rng.integers(0, 4, rows)
+    phones = []
+    for area, subscriber, style in zip(areas, subscribers, styles):
+        # 先頭の0を除いて固定電話は9桁、携帯電話は10桁
+        national = f"{area}{subscriber:08d}"[:10 if area in ('90', '80') else 9]
+        head, middle, tail = national[:len(area)], national[len(area):-4], national[-4:]
+        if style == 0:
+            phones.append(f"0{head}-{middle}-{tail}")
+        elif style == 1:
+            phones.append(f"+81 {national}")
+        elif style == 2:
+            phones.append(f"+81-{head}-{middle}-{tail}")
+        else:
+            phones.append(f"0{national}")
+    return phones
+
+
+def make_filemaker_df(rows, seed=0):
+    """FileMaker出力と同じ列構成の合成データ（顧客名・電話番号・住所統合・IDの頭にID ほか）"""
+    rng = np.random.default_rng(seed)
+    forms = rng.choice(COMPANY_FORMS, rows)
+    words = rng.choice(COMPANY_WORDS, rows)
+    suffixes = rng.choice(COMPANY_SUFFIXES, rows)
+    return pd.DataFrame({
+        '顧客名': [form.format(f"{word}{suffix}{i}") for i, (form, word, suffix) in enumerate(zip(forms, words, suffixes))],
+        '電話番号': make_phone_numbers(rng, rows),
+        '住所統合': [f"{pref}{city}{n}-{m}" for pref, city, n, m in zip(
+            rng.choice(PREFECTURES, rows), rng.choice(CITIES, rows), rng.integers(1, 30, rows), rng.integers(1, 20, rows)
+        )],
+        'IDの頭にID': [f"ID{i:07d}" for i in range(rows)],
+        '最終トーク判定': rng.choice(['A', 'B', 'C', None], rows),
+        '最終有効無効': rng.choice(['有効', '無効'], rows),
+        '最終決済担当': rng.choice(['山田', '佐藤', '鈴木', None], rows),
+    })
+
+
+def make_durations(rng, rows):
+    """mm:ss・hh:mm:ss・秒数・空欄が混在した通話時間"""
+    seconds = rng.integers(0, 400, rows)
+    seconds[rng.random(rows) < 0.2] = 0
+    styles = rng.integers(0, 10, rows)
+    durations = []
+    for sec, style in zip(seconds, styles):
+        if style < 6:
+            durations.append(f"{sec // 60}:{sec % 60:02d}")
+        elif style < 8:
+            durations.append(f"{sec // 3600}:{sec // 60 % 60:02d}:{sec % 60:02d}")
+        elif style < 9:
+            durations.append(str(sec))
+        else:
+            durations.append(None)
+    return durations
+
+
+def make_call_results_df(filemaker_df, rows=None, seed=1, match_rate=0.95):
+    """FileMaker出力の行に対応するAIテレアポ結果CSVの合成データ（一部はどの行にも当たらない社名）"""
+    rng = np.random.default_rng(seed)
+    rows = len(filemaker_df) if rows is None else rows
+    picked = filemaker_df.iloc[rng.integers(0, len(filemaker_df), rows)]
+
+    companies = picked['顧客名'].astype(str).str[:50].to_numpy(dtype=object)
+    unmatched = rng.random(rows) >= match_rate
+    companies[unmatched] = [f"未登録会社{i}" for i in range(unmatched.sum())]
+
+    call_times = pd.Timestamp('2026-10-01 09:00:00') + pd.to_timedelta(
+        rng.integers(0, 14, rows) * 86400 + rng.integers(0, 9 * 3600, rows), unit='s'
+    )
+    return pd.DataFrame({
+        '社名': companies,
+        '電話番号': picked['電話番号'].to_numpy(),
+        '架電時刻': call_times.strftime('%Y-%m-%d %H:%M:%S'),
+        'ステータス': rng.choice(STATUSES, rows),
+        '架電結果': np.where(rng.random(rows) < 0.05, '再架電', ''),
+        '要約': rng.choice(SUMMARIES, rows),
+        '通話時間': make_durations(rng, rows),
+    })
+
+
+def make_call_results_csv(call_results_df, encoding='cp932'):
+    """結果CSVのバイト列（AIテレアポからダウンロードしたものと同じ形式）"""
+    return call_results_df.to_csv(index=False).encode(encoding, errors='replace')
@@ -0,0 +1,168 @@
+"""AIテレアポ管理システムのコマンドライン版（Streamlit なしでジョブ作成・結果分析をまとめて実行）
+
+アプリと同じ作業ディレクトリで実行すると、同じ teleapo_jobs/ とジョブ履歴を使います。
+
+使い方: python teleapo_cli.py create FileMaker出力フォルダ --robots 3 --workers 4
+        python teleapo_cli.py analyze 結果CSVフォルダ --job 20261018_0930_ABCDE --format csv --output-dir 分析結果
+        python teleapo_cli.py analyze 結果CSVフォルダ --workers 4   （--job なしは全ジョブから自動振り分け）
+"""
+import argparse
+import logging
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+from teleapo_core import (
+    AITeleapoManager, JobHistoryManager, StageProfiler,
+    EXPORT_BACKENDS, DEFAULT_EXPORT_BACKEND
+)
+
+logger = logging.getLogger("teleapo_cli")
+
+FILEMAKER_PATTERNS = ['*.xlsx', '*.xls']
+RESULTS_PATTERNS = ['*.csv']
+
+
+def collect_files(paths, patterns):
+    """指定されたファイル・フォルダ（直下のみ）から対象ファイルを集める"""
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.extend(sorted(file for pattern in patterns for file in path.glob(pattern)))
+        else:
+            files.append(path)
+    return files
+
+
+def create_job(path, job_id, robot_count):
+    """FileMaker出力1件からジョブを作成して履歴に登録"""
+    manager = AITeleapoManager()
+    original_bytes = path.read_bytes()
+    with open(path, 'rb') as f:
+        df = manager.read_filemaker_file(f)
+    output_name = f"{path.stem}_{datetime.now().strftime('%Y%m%d')}_AIテレアポリスト"
+    result = manager.process_filemaker_data(
+        df, job_id, output_name, robot_count,
+        original_bytes=original_bytes, original_suffix=path.suffix.lower()
+    )
+    JobHistoryManager().add_job({
+        'job_id': job_id,
+        'created_at': datetime.now(),
+        'filename': path.name,
+        'output_name': output_name,
+        'robot_count': robot_count,
+        'total_rows': result['total_rows'],
+        'status': 'created'
+    })
+    return {'file': str(path), 'job_id': job_id, 'rows': result['total_rows'], 'outputs': [str(p) for p in result['upload_paths']]}
+
+
+def analyze_results(path, job_id, backend, output_dir):
+    """結果CSV1件を分析・マージして指定形式で書き出し"""
+    manager = AITeleapoManager()
+    with open(path, 'rb') as f:
+        analysis = manager.run_analysis(f, job_id)
+
+    profiler = StageProfiler()
+    data = manager.export_results(analysis['merged_df'], backend)
+    output_path = output_dir / f"{path.stem}_{datetime.now().strftime('%Y%m%d')}_結果{EXPORT_BACKENDS[backend]['extension']}"
+    output_path.write_bytes(data)
+    profiler.lap(f"export:{backend}", len(analysis['merged_df']))
+    manager.write_metrics(job_id, 'export', profiler.finish())
+
+    if job_id is not None:
+        JobHistoryManager().update_job(job_id, status='analyzed', progress=1.0, progress_message="分析完了")
+    stats = analysis['stats']
+    return {
+        'file': str(path), 'job_id': job_id, 'rows': stats['total_calls'],
+        'apo': stats['transfer_calls'], 'outputs': [str(output_path)]
+    }
+
+
+def run_tasks(fn, tasks, workers):
+    """タスクを並列に実行し、完了したものから結果を表示（失敗件数を返す）"""
+    failures = 0
+    if workers <= 1:
+        # 1並列ならプロセスを起こさずにそのまま実行
+        outcomes = ((task, lambda task=task: fn(*task)) for task in tasks)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        futures = {executor.submit(fn, *task): task for task in tasks}
+        outcomes = ((futures[future], future.result) for future in as_completed(futures))
+
+    for task, get_result in outcomes:
+        try:
+            result = get_result()
+        except Exception as e:
+            failures += 1
+            logger.exception("処理に失敗しました: %s", task[0])
+            print(f"✘ {task[0]}: {e}", file=sys.stderr)
+            continue
+        print(f"✔ {result['file']} → {result['job_id'] or '自動振り分け'}（{result['rows']:,} 件）: {', '.join(result['outputs'])}")
+
+    if workers > 1:
+        executor.shutdown()
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=1, help="同時に処理するファイル数")
+    parser.add_argument('--verbose', action='store_true', help="処理の詳細をログに出力")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    create_parser = subparsers.add_parser('create', help="FileMaker出力からジョブを作成")
+    create_parser.add_argument('paths', nargs='+', help="FileMaker出力のExcelファイルまたはフォルダ")
+    create_parser.add_argument('--robots', type=int, default=3, help="使用するロボット台数（レーン数）")
+
+    analyze_parser = subparsers.add_parser('analyze', help="結果CSVを分析して元データとマージ")
+    analyze_parser.add_argument('paths', nargs='+', help="AIテレアポの結果CSVファイルまたはフォルダ")
+    analyze_parser.add_argument('--job', help="マージ対象のジョブID（省略時は全ジョブから自動振り分け）")
+    analyze_parser.add_argument('--format', choices=list(EXPORT_BACKENDS), default=DEFAULT_EXPORT_BACKEND, help="出力形式")
+    analyze_parser.add_argument('--output-dir', type=Path, default=Path("analysis_output"), help="結果の出力先フォルダ")
+
+    # --workers などはサブコマンドの後ろにも書けるようにする
+    for subparser in (create_parser, analyze_parser):
+        subparser.add_argument('--workers', type=int, default=argparse.SUPPRESS, help="同時に処理するファイル数")
+        subparser.add_argument('--verbose', action='store_true', default=argparse.SUPPRESS, help="処理の詳細をログに出力")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
+
+    # 行索引などの初期化はワーカーを起動する前に一度だけ行う
+    manager = AITeleapoManager()
+
+    if args.command == 'create':
+        files = collect_files(args.paths, FILEMAKER_PATTERNS)
+        job_ids = []
+        for _ in files:
+            job_id = manager.generate_job_id()
+            while job_id in job_ids:
+                job_id = manager.generate_job_id()
+            job_ids.append(job_id)
+        tasks = [(path, job_id, args.robots) for path, job_id in zip(files, job_ids)]
+        fn = create_job
+    else:
+        if args.format not in manager.available_export_backends():
+            parser.error(f"出力形式 {args.format} に必要なライブラリ（{EXPORT_BACKENDS[args.format]['requires']}）がインストールされていません")
+        if args.job and not (manager.base_dir / args.job / "manifest.json").exists():
+            parser.error(f"ジョブ {args.job} が見つかりません")
+        args.output_dir.mkdir(parents=True, exist_ok=True)
+        files = collect_files(args.paths, RESULTS_PATTERNS)
+        tasks = [(path, args.job, args.format, args.output_dir) for path in files]
+        fn = analyze_results
+
+    if not tasks:
+        print("対象のファイルが見つかりません", file=sys.stderr)
+        return 1
+    failures = run_tasks(fn, tasks, args.workers)
+    print(f"完了: {len(tasks) - failures} 件 / 失敗: {failures} 件", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
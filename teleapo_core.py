@@ -0,0 +1,2258 @@
+"""AIテレアポ管理システムの処理本体（Streamlit に依存しない部分。UI と CLI から共通で使用）"""
+import pandas as pd
+import numpy as np
+import re
+from datetime import datetime, timedelta
+import hashlib
+import json
+import codecs
+from collections import Counter
+import os
+import sys
+from pathlib import Path
+import time
+from io import BytesIO
+import mmap
+import threading
+import unicodedata
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    import resource
+except ImportError:
+    resource = None
+import tracemalloc
+import sqlite3
+import importlib.util
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+
+from teleapo_lanes import split_lanes, write_lane_files
+
+logger = logging.getLogger(__name__)
+
+# ダウンロードキャッシュの容量上限
+DOWNLOAD_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+class DownloadCache:
+    """容量上限つきLRUのコンテンツアドレス型ダウンロードキャッシュ"""
+    _lock = threading.Lock()
+    
+    def __init__(self, cache_dir, max_bytes=DOWNLOAD_CACHE_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.objects_dir = self.cache_dir / "objects"
+        self.index_path = self.cache_dir / "index.json"
+        self.max_bytes = max_bytes
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        
+        # 旧形式（pickle）のキャッシュは容量管理の対象外なので削除
+        for legacy_file in self.cache_dir.glob("*.pkl"):
+            legacy_file.unlink(missing_ok=True)
+    
+    def _load_index(self):
+        if self.index_path.exists():
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {'entries': {}, 'stats': {'hits': 0, 'misses': 0, 'evictions': 0}}
+    
+    def _save_index(self, index):
+        tmp_path = self.index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+    
+    def _object_path(self, digest):
+        return self.objects_dir / digest
+    
+    def put(self, file_id, data, filename):
+        """バイト列を内容のハッシュで保存し、file_id から参照できるようにする"""
+        data = memoryview(data)
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            object_path = self._object_path(digest)
+            if not object_path.exists():
+                tmp_path = object_path.with_suffix('.tmp')
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, object_path)
+            
+            index = self._load_index()
+            now = time.time()
+            index['entries'][file_id] = {
+                'digest': digest,
+                'filename': filename,
+                'size': data.nbytes,
+                'created_at': datetime.now().isoformat(),
+                'last_access': now
+            }
+            self._evict(index)
+            self._save_index(index)
+    
+    @contextmanager
+    def open_entry(self, file_id):
+        """キャッシュ済みの内容をmmap経由のmemoryviewとして開く（なければNone。with を抜けるとmmapを閉じる）"""
+        with self._lock:
+            index = self._load_index()
+            entry = index['entries'].get(file_id)
+            object_path = self._object_path(entry['digest']) if entry else None
+            if entry is None or not object_path.exists():
+                index['entries'].pop(file_id, None)
+                index['stats']['misses'] += 1
+                self._save_index(index)
+                entry = None
+            else:
+                entry['last_access'] = time.time()
+                index['stats']['hits'] += 1
+                self._save_index(index)
+        
+        if entry is None:
+            yield None
+            return
+        info = {'filename': entry['filename'], 'created_at': entry['created_at']}
+        if entry['size'] == 0:
+            yield {'data': memoryview(b""), **info}
+            return
+        with open(object_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            data = memoryview(mapped)
+            try:
+                yield {'data': data, **info}
+            finally:
+                # memoryview を解放してからでないと mmap を閉じられない
+                data.release()
+    
+    def _evict(self, index):
+        """合計サイズが上限を超えた分を最終アクセスの古い順に削除"""
+        entries = index['entries']
+        sizes = {entry['digest']: entry['size'] for entry in entries.values()}
+        total_bytes = sum(sizes.values())
+        
+        for file_id in sorted(entries, key=lambda key: entries[key]['last_access']):
+            if total_bytes <= self.max_bytes:
+                break
+            digest = entries.pop(file_id)['digest']
+            index['stats']['evictions'] += 1
+            # 同じ内容を参照する別のIDが残っていれば実体は残す
+            if not any(entry['digest'] == digest for entry in entries.values()):
+                total_bytes -= sizes[digest]
+                try:
+                    self._object_path(digest).unlink(missing_ok=True)
+                except OSError:
+                    # 読み込み中（mmap中）で削除できない場合は次回に持ち越し
+                    pass
+    
+    def usage(self):
+        """キャッシュの使用状況とヒット・ミス・削除件数"""
+        with self._lock:
+            index = self._load_index()
+        digests = {entry['digest']: entry['size'] for entry in index['entries'].values()}
+        return {
+            'entries': len(index['entries']),
+            'total_bytes': sum(digests.values()),
+            'max_bytes': self.max_bytes,
+            **index['stats']
+        }
+
+# ファイルベースのジョブ履歴管理
+class JobHistoryManager:
+    """ジョブ履歴を追記専用のジャーナル（JSON Lines）で管理"""
+    # ジャーナルの行数がこの値とジョブ数の2倍を超えたら圧縮
+    COMPACT_MIN_RECORDS = 1000
+    _lock = threading.Lock()
+    
+    def __init__(self):
+        self.history_file = Path("job_history.jsonl")
+        self.legacy_history_file = Path("job_history.json")
+        self.lock_file = Path("job_history.lock")
+        self.download_cache_dir = Path("download_cache")
+        self.download_cache = DownloadCache(self.download_cache_dir)
+        
+        # ジャーナルのメモリ上の索引（job_id → ジョブ）と読み込み位置
+        self._jobs = {}
+        self._record_count = 0
+        self._offset = 0
+        self._inode = None
+    
+    @contextmanager
+    def _locked(self):
+        """プロセス内はスレッドロック、プロセス間はファイルロックで排他"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_file, 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+    
+    def _serialize(self, job):
+        job_copy = job.copy()
+        if isinstance(job_copy.get('created_at'), datetime):
+            job_copy['created_at'] = job_copy['created_at'].isoformat()
+        return job_copy
+    
+    def _deserialize(self, job):
+        # 文字列をdatetimeオブジェクトに変換
+        if isinstance(job.get('created_at'), str):
+            try:
+                job['created_at'] = datetime.fromisoformat(job['created_at'])
+            except:
+                job['created_at'] = datetime.now()
+        return job
+    
+    def _append(self, record):
+        """1レコードを1回の書き込みで追記（O_APPENDにより行単位で原子的）"""
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+        fd = os.open(self.history_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+    
+    def _write_snapshot(self, jobs):
+        """現在のジョブ一覧だけを含むジャーナルに置き換え"""
+        tmp_path = self.history_file.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for job in jobs:
+                f.write(json.dumps({'op': 'put', 'job': self._serialize(job)}, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.history_file)
+    
+    def _apply(self, record):
+        if record.get('op') == 'put':
+            job = self._deserialize(record['job'])
+            self._jobs[job['job_id']] = job
+        elif record.get('op') == 'update':
+            if record['job_id'] in self._jobs:
+                self._jobs[record['job_id']].update(record['fields'])
+        elif record.get('op') == 'clear':
+            self._jobs = {}
+        self._record_count += 1
+    
+    def _refresh(self):
+        """ジャーナルの未読部分だけを読み込んで索引に反映"""
+        if not self.history_file.exists():
+            if self.legacy_history_file.exists():
+                self._migrate_legacy()
+            else:
+                self._jobs, self._record_count, self._offset, self._inode = {}, 0, 0, None
+                return
+        
+        stat = self.history_file.stat()
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            # 圧縮などでファイルが置き換えられた場合は先頭から読み直す
+            self._jobs, self._record_count, self._offset, self._inode = {}, 0, 0, stat.st_ino
+        
+        with open(self.history_file, 'rb') as f:
+            f.seek(self._offset)
+            chunk = f.read()
+        # 書き込み途中の行は次回に回す
+        complete = chunk[:chunk.rfind(b"\n") + 1]
+        for line in complete.splitlines():
+            if line.strip():
+                self._apply(json.loads(line))
+        self._offset += len(complete)
+    
+    def _migrate_legacy(self):
+        """旧形式の job_history.json をジャーナルに変換"""
+        with open(self.legacy_history_file, 'r', encoding='utf-8') as f:
+            jobs = json.load(f)
+        self._write_snapshot(jobs)
+    
+    def _compact_if_needed(self):
+        """上書きされたレコードが増えたらジャーナルを圧縮"""
+        if self._record_count > max(self.COMPACT_MIN_RECORDS, 2 * len(self._jobs)):
+            self._write_snapshot(self._jobs.values())
+            self._refresh()
+    
+    def add_job(self, job):
+        """ジョブを1件追記（履歴の件数によらず一定コスト）"""
+        try:
+            with self._locked():
+                self._append({'op': 'put', 'job': self._serialize(job)})
+                self._refresh()
+                self._compact_if_needed()
+            return True
+        except Exception as e:
+            logger.error("ジョブ履歴保存エラー: %s", e)
+            return False
+    
+    def update_job(self, job_id, **fields):
+        """ジョブの一部の項目（状態・進捗など）を更新として追記"""
+        try:
+            with self._locked():
+                self._append({'op': 'update', 'job_id': job_id, 'fields': fields})
+                self._refresh()
+                self._compact_if_needed()
+            return True
+        except Exception as e:
+            logger.error("ジョブ履歴保存エラー: %s", e)
+            return False
+    
+    def get_job(self, job_id):
+        """最新のジョブ情報を取得（なければNone）"""
+        with self._locked():
+            self._refresh()
+            return self._jobs.get(job_id)
+    
+    def save_jobs(self, jobs):
+        """ジョブ履歴全体をファイルに保存（ジャーナルを置き換え）"""
+        try:
+            with self._locked():
+                self._write_snapshot(jobs)
+                self._refresh()
+            return True
+        except Exception as e:
+            logger.error("ジョブ履歴保存エラー: %s", e)
+            return False
+    
+    def load_jobs(self):
+        """ジョブ履歴をファイルから読み込み"""
+        try:
+            with self._locked():
+                self._refresh()
+                return list(self._jobs.values())
+        except Exception as e:
+            logger.error("ジョブ履歴読み込みエラー: %s", e)
+            return []
+    
+    def clear_jobs(self):
+        """ジョブ履歴をクリア"""
+        try:
+            with self._locked():
+                self._write_snapshot([])
+                self._refresh()
+            return True
+        except Exception as e:
+            logger.error("ジョブ履歴クリアエラー: %s", e)
+            return False
+    
+    def save_download_file(self, file_id, data, filename):
+        """ダウンロード用ファイルをキャッシュに保存"""
+        try:
+            self.download_cache.put(file_id, data, filename)
+            return True
+        except Exception as e:
+            logger.error("ダウンロードファイル保存エラー: %s", e)
+            return False
+    
+    def read_download_file(self, file_id):
+        """ダウンロード用ファイルの内容をキャッシュから読み込み（なければNone。mmap は読み込み後に閉じる）"""
+        try:
+            with self.download_cache.open_entry(file_id) as cached:
+                return None if cached is None else bytes(cached['data'])
+        except Exception as e:
+            logger.error("ダウンロードファイル取得エラー: %s", e)
+            return None
+
+# 行索引DBのロック待ち時間（秒）
+INDEX_LOCK_TIMEOUT = 60
+
+# 結果CSVの読み込み設定
+CSV_CHUNK_ROWS = 50_000
+# 文字コード判定で一度に読むバイト数（UTF-8 として読めるかをファイル全体で確認し、読めなければ cp932）
+ENCODING_CHECK_BLOCK_BYTES = 1024 * 1024
+
+# 差分分析で通話行を識別する列（行指紋の元になる社名・電話番号と架電時刻）
+CALL_KEY_COLUMNS = ['社名', '電話番号', '架電時刻']
+# 同じジョブの差分分析（前回の状態の読み込みから保存まで）を排他するロックファイル
+ANALYSIS_LOCK_NAME = "analysis_state.lock"
+# 統計の集計軸と、軸の組ごとに合計する件数（全体の数値・架電結果の分布は軸別の件数から求める）
+STAT_ROLLUP_DIMENSIONS = ['架電日', '時間帯', 'ステータス', '架電結果', 'レーン']
+STAT_ROLLUP_MEASURES = ['total_calls', 'valid_calls', 'total_time_sec', 'transfer_calls', 'invalid_numbers', 'error_calls']
+# マージ結果に処理用に残し、分析結果として返す前に除く列
+MERGED_INTERNAL_COLUMNS = ['lane', 'call_key']
+
+# 処理段階ごとの計測（tracemalloc は処理が遅くなるため環境変数で有効化）
+PROFILE_TRACE_MEMORY = os.environ.get("TELEAPO_TRACE_MEMORY") == "1"
+METRICS_LOG_NAME = "metrics.jsonl"
+# 計測ログがこのサイズを超えたら1世代だけ残して新しいファイルに切り替える
+METRICS_LOG_MAX_BYTES = 1024 * 1024
+
+# バックグラウンドワーカーの同時実行数
+BACKGROUND_WORKERS = 2
+# 終了したタスクの進捗を保持する秒数（過ぎたら破棄）
+BACKGROUND_TASK_TTL_SECONDS = 600
+
+# 分析結果キャッシュの件数上限（プロセス内 / ディスク）
+ANALYSIS_MEMORY_CACHE_ENTRIES = 8
+ANALYSIS_DISK_CACHE_FILES = 20
+# 分析結果の形式の版（マージ結果の列・分析状態の形式が変わったら上げ、前回の分析状態・キャッシュを使わない）
+ANALYSIS_FORMAT_VERSION = 5
+
+# 結果の出力形式（requires は必要なオプションのライブラリ）
+EXPORT_BACKENDS = {
+    'xlsx_xlsxwriter': {
+        'label': 'Excel (xlsxwriter・省メモリ)',
+        'extension': '.xlsx',
+        'mime': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        'requires': 'xlsxwriter'
+    },
+    'xlsx_openpyxl': {
+        'label': 'Excel (openpyxl・書き込み専用)',
+        'extension': '.xlsx',
+        'mime': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        'requires': None
+    },
+    'csv': {
+        'label': 'CSV (UTF-8 BOM付き)',
+        'extension': '.csv',
+        'mime': 'text/csv',
+        'requires': None
+    },
+    'parquet': {
+        'label': 'Parquet',
+        'extension': '.parquet',
+        'mime': 'application/vnd.apache.parquet',
+        'requires': 'pyarrow'
+    }
+}
+DEFAULT_EXPORT_BACKEND = 'xlsx_openpyxl'
+EXPORT_SHEET_NAME = '分析結果'
+
+# 分析済み通話の蓄積（架電日・ジョブごとに分けた Parquet。requires は必要なオプションのライブラリ）
+CALL_ARCHIVE_DIR = "call_archive"
+CALL_ARCHIVE_REQUIRES = 'pyarrow'
+# 蓄積する通話の列と列型（ファイルごとに型がずれないよう固定。ここにない列は文字列）
+ARCHIVE_CALL_COLUMNS = ['fm_id', '社名', '電話番号', '架電日', '架電時間', '架電時刻', 'ステータス', '架電結果', '要約', '通話時間',
+                        '住所統合', '最終トーク判定', '最終有効無効', '最終決済担当', 'マッチ方法', 'マッチ信頼度', 'レーン', 'row_key', 'call_key']
+# 蓄積した通話の識別キーの元になる列（マージ結果では架電時刻が架電日・架電時間に分かれている）
+ARCHIVE_CALL_KEY_COLUMNS = ['社名', '電話番号', '架電日', '架電時間']
+ARCHIVE_COLUMN_TYPES = {'マッチ信頼度': 'float64', 'レーン': 'int64', '時間帯': 'int64', 'call_key': 'uint64'} | {col: 'int64' for col in STAT_ROLLUP_MEASURES}
+# 日別集計の軸（統計の軸に元データの詳細列を加えたもの。ジョブ・架電日はファイルの区分）
+ARCHIVE_ROLLUP_DIMENSIONS = STAT_ROLLUP_DIMENSIONS + ['最終決済担当', '最終トーク判定', '最終有効無効', 'マッチ方法']
+ARCHIVE_QUERY_DIMENSIONS = ARCHIVE_ROLLUP_DIMENSIONS + ['job_id']
+# 架電日の分からない行・振り分け先のない行の区分名
+ARCHIVE_UNKNOWN_DATE = "unknown"
+ARCHIVE_UNROUTED_JOB_ID = "unrouted"
+
+# FileMakerデータのうち下流で使用する列（これ以外は読み込まない）
+FILEMAKER_COLUMNS = ['顧客名', '社名', '電話番号', '住所統合', 'IDの頭にID', '最終トーク判定', '最終有効無効', '最終決済担当']
+
+# マージ時に元データから引き継ぐ列
+ORIGINAL_DETAIL_COLUMNS = ['住所統合', '最終トーク判定', '最終有効無効', '最終決済担当']
+
+# 値の種類が少ないためカテゴリ型で保持する列（マージ結果・マージ用索引）
+CATEGORY_COLUMNS = ['架電日', 'ステータス', '架電結果', '最終トーク判定', '最終有効無効', '最終決済担当', 'マッチ方法']
+
+# アップロード用CSVの社名の最大文字数（超える分は切り詰める）
+UPLOAD_COMPANY_MAX_CHARS = 50
+
+# 社名の照合時に除く法人格の表記（NFKC 正規化・空白除去後の表記）
+COMPANY_FORM_WORDS = [
+    '株式会社', '有限会社', '合同会社', '合資会社', '合名会社',
+    '一般社団法人', '一般財団法人', '公益社団法人', '公益財団法人', '特定非営利活動法人', 'NPO法人',
+    '社会福祉法人', '医療法人社団', '医療法人財団', '医療法人', '学校法人', '宗教法人',
+    '(株)', '(有)', '(同)', '(資)', '(名)', '(社)', '(財)', '(医)', '(福)', '(学)'
+]
+COMPANY_FORM_PATTERN = "|".join(re.escape(word) for word in sorted(COMPANY_FORM_WORDS, key=len, reverse=True))
+# 社名の末尾で同じ会社の別拠点・別法人を区別する表記（番号・支店など・地名）。これだけが違う社名はあいまい一致させない
+COMPANY_BRANCH_WORDS = ['本社', '本店', '支社', '支店', '営業所', '出張所', '事業所', '営業部', '工場', '店']
+COMPANY_PLACE_WORDS = [
+    '北海道', '青森', '岩手', '宮城', '秋田', '山形', '福島', '茨城', '栃木', '群馬', '埼玉', '千葉', '東京', '神奈川',
+    '新潟', '富山', '石川', '福井', '山梨', '長野', '岐阜', '静岡', '愛知', '三重', '滋賀', '京都', '大阪', '兵庫',
+    '奈良', '和歌山', '鳥取', '島根', '岡山', '広島', '山口', '徳島', '香川', '愛媛', '高知', '福岡', '佐賀', '長崎',
+    '熊本', '大分', '宮崎', '鹿児島', '沖縄',
+    '札幌', '仙台', 'さいたま', '横浜', '川崎', '相模原', '名古屋', '浜松', '神戸', '堺', '北九州',
+    '東日本', '西日本', '関東', '関西', '東海', '北陸', '中部', '東北', '四国', '九州'
+]
+COMPANY_BRANCH_SUFFIX_PATTERN = "(?:[0-9]+|{}|(?:{})[都道府県市]?)+$".format(
+    "|".join(re.escape(word) for word in sorted(COMPANY_BRANCH_WORDS, key=len, reverse=True)),
+    "|".join(re.escape(word) for word in sorted(COMPANY_PLACE_WORDS, key=len, reverse=True))
+)
+
+# 完全一致しなかった社名の照合（表記ゆれ → 2-gram の類似度によるあいまい一致）
+CANONICAL_MATCH_CONFIDENCE = 0.95
+FUZZY_MATCH_THRESHOLD = 0.8
+# 1行あたりに類似度を計算する候補数と、候補の絞り込みに使わない頻出 2-gram の出現社数
+FUZZY_CANDIDATES_PER_ROW = 5
+NGRAM_MAX_POSTINGS = 200
+
+# 架電結果の分類ルールファイル
+RULES_PATH = Path(__file__).with_name("call_rules.json")
+# アップロード用CSVの文字コードで表せない文字の置き換え表と、置き換えた行の記録ファイル
+UPLOAD_CHARMAP_PATH = Path(__file__).with_name("upload_charmap.json")
+ENCODING_CHANGES_NAME = "encoding_changes.csv"
+
+@lru_cache(maxsize=1)
+def lane_worker_context():
+    """レーン別ファイルを書き出すプロセスの起動方法（Streamlit などスレッドのあるプロセスから fork するとデッドロックし得るため
+    forkserver、使えない環境は spawn。forkserver は teleapo_lanes を読み込み済みのサーバーから起動し、子ごとの読み込みを省く）"""
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['teleapo_lanes'])
+        return context
+    return multiprocessing.get_context('spawn')
+
+def unique_tmp_path(path):
+    """他のプロセス・スレッドの書き込みと重ならない一時ファイルのパス（書き終えてから os.replace で置き換える）"""
+    return path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+def read_tail_lines(path, limit, block_size=64 * 1024):
+    """ファイル末尾の limit 行（末尾から必要な分だけ読み、ファイル全体は読み込まない）"""
+    if limit <= 0:
+        return []
+    with open(path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        data = b""
+        while position > 0 and data.count(b"\n") <= limit:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            data = f.read(read_size) + data
+    lines = data.splitlines()
+    if position > 0:
+        # 先頭は途中から読んだ行なので除く
+        lines = lines[1:]
+    return [line.decode('utf-8') for line in lines[-limit:]]
+
+def parse_int_or_nan(text):
+    """int() で整数に変換（変換できなければ NaN）"""
+    try:
+        return int(text)
+    except ValueError:
+        return np.nan
+
+def compile_keywords(words):
+    """キーワード群を1本の選択正規表現にコンパイル"""
+    return re.compile("|".join(re.escape(word) for word in words))
+
+class CallRuleSet:
+    """コンパイル済みの架電結果分類ルール"""
+    RULE_KEYS = {'name', 'label', 'status_in', 'summary_contains', 'summary_excludes', 'duration'}
+    DURATION_CONDITIONS = {'zero', 'positive'}
+    
+    def __init__(self, definition, digest=""):
+        # 版数の書き換え忘れでも分析キャッシュと前回状態が無効になるよう、内容のダイジェストを付ける
+        self.version = str(definition.get('version', ''))
+        if digest:
+            self.version = f"{self.version}+{digest[:12]}"
+        self.rules = []
+        for rule in definition['rules']:
+            unknown_keys = set(rule) - self.RULE_KEYS
+            if unknown_keys:
+                raise ValueError(f"未知のルール項目: {', '.join(sorted(unknown_keys))}")
+            if 'duration' in rule and rule['duration'] not in self.DURATION_CONDITIONS:
+                raise ValueError(f"未知の通話時間条件: {rule['duration']}")
+            self.rules.append({
+                'name': rule.get('name', rule['label']),
+                'label': rule['label'],
+                'status_in': rule.get('status_in'),
+                'summary_contains': compile_keywords(rule['summary_contains']) if rule.get('summary_contains') else None,
+                'summary_excludes': compile_keywords(rule['summary_excludes']) if rule.get('summary_excludes') else None,
+                'duration': rule.get('duration'),
+            })
+    
+    def classify(self, status, summary, duration):
+        """ルールを上から順に適用し、各行のラベルを返す（該当なしは空文字）"""
+        conditions = []
+        for rule in self.rules:
+            mask = pd.Series(True, index=status.index)
+            if rule['status_in'] is not None:
+                mask &= status.isin(rule['status_in'])
+            if rule['summary_contains'] is not None:
+                mask &= summary.str.contains(rule['summary_contains'])
+            if rule['summary_excludes'] is not None:
+                mask &= ~summary.str.contains(rule['summary_excludes'])
+            if rule['duration'] == 'zero':
+                mask &= duration.isna() | (duration == 0)
+            elif rule['duration'] == 'positive':
+                mask &= duration > 0
+            conditions.append(mask)
+        
+        choices = [rule['label'] for rule in self.rules]
+        return pd.Series(np.select(conditions, choices, default=""), index=status.index)
+
+@lru_cache(maxsize=4)
+def _compile_call_rules(path_str, mtime_ns):
+    """ルールファイルを読み込んでコンパイル（パスと更新時刻ごとにキャッシュ）"""
+    content = Path(path_str).read_bytes()
+    definition = json.loads(content.decode('utf-8'))
+    return CallRuleSet(definition, hashlib.sha256(content).hexdigest())
+
+def load_call_rules(path=RULES_PATH):
+    """分類ルールを取得（ファイルが更新された場合のみ再コンパイル）"""
+    path = Path(path)
+    return _compile_call_rules(str(path), path.stat().st_mtime_ns)
+
+class UploadCharMap:
+    """アップロード用CSVの文字コードで表せない文字の置き換え"""
+    
+    def __init__(self, definition):
+        self.version = str(definition.get('version', ''))
+        self.encoding = codecs.lookup(definition.get('encoding', 'cp932')).name
+        self.replacement = definition.get('replacement', '?')
+        self.mapping = dict(definition.get('map', {}))
+        for char in self.mapping:
+            if len(char) != 1:
+                raise ValueError(f"置き換え元は1文字で指定してください: {char!r}")
+        for substitute in [self.replacement, *self.mapping.values()]:
+            if not self.is_encodable(substitute):
+                raise ValueError(f"置き換え先が {self.encoding} で表せません: {substitute!r}")
+        # 表せない文字の正規表現は列を検査する時に初めて作る
+        self.unencodable_pattern = None
+    
+    def compile_unencodable_pattern(self):
+        """表せない文字のどれかに一致する正規表現（表せる文字の範囲の否定。列の検査を1回の str.contains で行う）"""
+        ranges = []
+        start = None
+        for code in range(0x10000):
+            encodable = not 0xD800 <= code <= 0xDFFF and self.is_encodable(chr(code))
+            if encodable and start is None:
+                start = code
+            elif not encodable and start is not None:
+                ranges.append((start, code - 1))
+                start = None
+        if start is not None:
+            ranges.append((start, 0xFFFF))
+        return "[^" + "".join(
+            re.escape(chr(first)) if first == last else f"{re.escape(chr(first))}-{re.escape(chr(last))}"
+            for first, last in ranges
+        ) + "]"
+    
+    def is_encodable(self, text):
+        """文字列がこの文字コードで表せるか"""
+        try:
+            text.encode(self.encoding)
+        except UnicodeEncodeError:
+            return False
+        return True
+    
+    def substitute(self, char):
+        """表せない1文字の置き換え先（置き換え表→互換文字→アクセント記号を除いた文字→replacement の順）"""
+        if char in self.mapping:
+            return self.mapping[char]
+        decomposed = ''.join(c for c in unicodedata.normalize('NFKD', char) if not unicodedata.combining(c))
+        for candidate in (unicodedata.normalize('NFKC', char), decomposed):
+            if candidate and self.is_encodable(candidate):
+                return candidate
+        return self.replacement
+    
+    def translate(self, values):
+        """列のうち表せない文字を含む値だけを置き換え、置き換え後の列と置き換えた行のマスクを返す"""
+        if self.unencodable_pattern is None:
+            self.unencodable_pattern = self.compile_unencodable_pattern()
+        text = values.astype(str)
+        changed = text.str.contains(self.unencodable_pattern, regex=True).fillna(False).astype(bool)
+        if not changed.any():
+            return values, changed
+        # 表せない文字は該当した行からだけ洗い出し、その行だけを置き換える
+        bad_chars = {char for value in text[changed] for char in value if not self.is_encodable(char)}
+        table = str.maketrans({char: self.substitute(char) for char in bad_chars})
+        translated = text[changed].str.translate(table)
+        return values.where(~changed, translated), changed
+
+@lru_cache(maxsize=4)
+def _compile_upload_charmap(path_str, mtime_ns):
+    """置き換え表を読み込み（パスと更新時刻ごとにキャッシュ）"""
+    with open(path_str, 'r', encoding='utf-8') as f:
+        definition = json.load(f)
+    return UploadCharMap(definition)
+
+def load_upload_charmap(path=UPLOAD_CHARMAP_PATH):
+    """置き換え表を取得（ファイルがなければ置き換え表なしで cp932 を使用）"""
+    path = Path(path)
+    if not path.exists():
+        return UploadCharMap({})
+    return _compile_upload_charmap(str(path), path.stat().st_mtime_ns)
+
+def summarize_rollup(rollup):
+    """軸別集計から全体の数値と架電結果の分布を求め、calculate_statistics の形式で返す"""
+    stats = {key: int(rollup[key].sum()) for key in STAT_ROLLUP_MEASURES}
+    stats['total_time'] = str(timedelta(seconds=stats['total_time_sec']))
+    result_counts = rollup.groupby('架電結果', sort=False)['total_calls'].sum()
+    stats['result_counts'] = result_counts[result_counts > 0].sort_values(ascending=False, kind='stable').to_dict()
+    stats['rollup'] = rollup
+    return stats
+
+class StageProfiler:
+    """処理段階ごとの経過時間・件数・メモリを集計（前回の lap からの区間を段階に割り当て）"""
+    def __init__(self, trace_memory=PROFILE_TRACE_MEMORY):
+        # tracemalloc は既に他で計測中なら触らない
+        self.trace_memory = trace_memory and not tracemalloc.is_tracing()
+        if self.trace_memory:
+            tracemalloc.start()
+        self.stages = {}
+        self.started_at = datetime.now()
+        self._start = self._last = time.perf_counter()
+        self._last_rss = self.peak_rss_mb()
+    
+    @staticmethod
+    def peak_rss_mb():
+        """プロセスの最大常駐メモリ（MB、取得できない環境ではNone）"""
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux は KB、macOS はバイト単位
+        return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    
+    def lap(self, stage, rows=None):
+        """前回の lap からここまでを stage の処理として記録（同じ段階は合算）"""
+        now = time.perf_counter()
+        rss = self.peak_rss_mb()
+        record = self.stages.setdefault(stage, {
+            'stage': stage, 'seconds': 0.0, 'rows': 0, 'calls': 0,
+            'peak_rss_mb': None, 'rss_growth_mb': 0.0, 'traced_peak_mb': None
+        })
+        record['seconds'] += now - self._last
+        record['calls'] += 1
+        record['rows'] += rows or 0
+        if rss is not None:
+            record['peak_rss_mb'] = rss
+            record['rss_growth_mb'] += rss - self._last_rss
+        if self.trace_memory:
+            traced_peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+            record['traced_peak_mb'] = max(record['traced_peak_mb'] or 0.0, traced_peak)
+            tracemalloc.reset_peak()
+        self._last, self._last_rss = now, rss
+    
+    def finish(self):
+        """計測を終了し、段階ごとの集計結果を返す"""
+        if self.trace_memory:
+            tracemalloc.stop()
+            self.trace_memory = False
+        stages = []
+        for record in self.stages.values():
+            seconds = record['seconds']
+            stages.append({
+                **record,
+                'seconds': round(seconds, 4),
+                'rows_per_sec': round(record['rows'] / seconds) if record['rows'] and seconds > 0 else None,
+                'peak_rss_mb': None if record['peak_rss_mb'] is None else round(record['peak_rss_mb'], 1),
+                'rss_growth_mb': round(record['rss_growth_mb'], 1),
+                'traced_peak_mb': None if record['traced_peak_mb'] is None else round(record['traced_peak_mb'], 1),
+            })
+        return {
+            'started_at': self.started_at.isoformat(),
+            'total_seconds': round(time.perf_counter() - self._start, 4),
+            'stages': stages
+        }
+
+class JobRowIndex:
+    """全ジョブ横断の行索引（社名・電話番号 → job_id, fm_id）"""
+    COLUMNS = ['row_key', 'job_id', 'fm_id', 'company', 'company_normalized', 'phone_normalized', 'lane']
+    
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.created = not self.db_path.exists()
+        with self.connect() as conn:
+            # fm_id・company は元の型のまま保持するため型指定なし
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS row_index (
+                    row_key TEXT NOT NULL,
+                    job_id TEXT NOT NULL,
+                    fm_id,
+                    company,
+                    company_normalized TEXT,
+                    phone_normalized TEXT,
+                    lane INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS idx_row_index_company ON row_index (company_normalized);
+                CREATE INDEX IF NOT EXISTS idx_row_index_phone ON row_index (phone_normalized);
+                CREATE INDEX IF NOT EXISTS idx_row_index_row_key ON row_index (row_key);
+                CREATE INDEX IF NOT EXISTS idx_row_index_job ON row_index (job_id);
+            """)
+    
+    @contextmanager
+    def connect(self):
+        """索引DBに接続（正常終了時にコミットし、必ず閉じる）"""
+        # CLI の並列実行では複数プロセスが書き込むため、ロック解除を長めに待つ
+        conn = sqlite3.connect(self.db_path, timeout=INDEX_LOCK_TIMEOUT)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+    
+    def add_job(self, job_id, rowmap_df, phone_normalized):
+        """ジョブのrowmapを索引に登録（再登録時は置き換え）"""
+        rows = pd.DataFrame({
+            'row_key': rowmap_df['row_key'],
+            'job_id': job_id,
+            'fm_id': rowmap_df['fm_id'],
+            'company': rowmap_df['company'],
+            'company_normalized': rowmap_df['company_normalized'],
+            'phone_normalized': phone_normalized,
+            'lane': rowmap_df['lane'] if 'lane' in rowmap_df.columns else 1
+        })[self.COLUMNS]
+        # sqlite3 に渡せるようPythonの値に変換
+        rows = rows.astype(object).where(rows.notna(), None)
+        
+        with self.connect() as conn:
+            conn.execute("DELETE FROM row_index WHERE job_id = ?", (job_id,))
+            conn.executemany(
+                f"INSERT INTO row_index ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                rows.itertuples(index=False, name=None)
+            )
+    
+    def version(self):
+        """索引の版（登録のたびに増える最大rowid）"""
+        with self.connect() as conn:
+            return conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM row_index").fetchone()[0]
+    
+    def job_ids(self):
+        """登録済みのジョブID"""
+        with self.connect() as conn:
+            return {row[0] for row in conn.execute("SELECT DISTINCT job_id FROM row_index")}
+    
+    def lookup_companies(self, company_values):
+        """正規化済み社名に一致する行を全ジョブから取得（登録順）"""
+        values = [(value,) for value in company_values if isinstance(value, str) and value != ""]
+        with self.connect() as conn:
+            conn.execute("CREATE TEMP TABLE lookup_keys (company_normalized TEXT PRIMARY KEY)")
+            conn.executemany("INSERT OR IGNORE INTO lookup_keys VALUES (?)", values)
+            return pd.read_sql_query(
+                """
+                SELECT r.company_normalized, r.job_id, r.fm_id, r.company, r.phone_normalized, r.lane
+                FROM lookup_keys k
+                JOIN row_index r ON r.company_normalized = k.company_normalized
+                ORDER BY r.rowid
+                """,
+                conn
+            )
+
+class CallArchive:
+    """分析済みの通話と日別集計の蓄積（種類/date=架電日/job_id=ジョブ/part-結果ファイル.parquet。pyarrow を使う時に読み込む）"""
+    _lock = threading.Lock()
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.lock_file = self.root / ".lock"
+        self.version_file = self.root / ".version"
+
+    @contextmanager
+    def _locked(self):
+        """プロセス内はスレッドロック、プロセス間はファイルロックで排他"""
+        with self._lock:
+            self.root.mkdir(exist_ok=True)
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_file, 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def available(self):
+        """蓄積に必要なライブラリがインストール済みか"""
+        return importlib.util.find_spec(CALL_ARCHIVE_REQUIRES) is not None
+
+    def version(self):
+        """蓄積の版（書き込みのたびに変わる）"""
+        try:
+            return self.version_file.stat().st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def schema(self, columns):
+        """列の Parquet 型（区分の架電日・ジョブは文字列）"""
+        import pyarrow as pa
+        return pa.schema([(col, pa.type_for_alias(ARCHIVE_COLUMN_TYPES.get(col, 'string'))) for col in columns])
+
+    def partition_groups(self, dates, job_ids):
+        """行ごとの架電日（YYYY/MM/DD）・ジョブから、区分（date, job_id）→ 行位置"""
+        # 行は値のコードでまとめ、区分名への変換は値ごとに一度だけ（欠損のコード -1 は末尾の区分名を参照）
+        date_codes, date_values = pd.factorize(dates)
+        job_codes, job_values = pd.factorize(job_ids)
+        date_names = pd.Series(np.asarray(date_values, dtype=object)).astype(str).str.replace('/', '-', regex=False)
+        date_names = np.append(date_names.to_numpy(dtype=object), ARCHIVE_UNKNOWN_DATE)
+        job_names = np.append(np.asarray(job_values, dtype=object).astype(str).astype(object), ARCHIVE_UNROUTED_JOB_ID)
+        groups = pd.DataFrame({'date': date_codes, 'job_id': job_codes}).groupby(['date', 'job_id'], sort=False).indices
+        return {(date_names[date_code], job_names[job_code]): positions for (date_code, job_code), positions in groups.items()}
+
+    def superseded_parts(self, job_ids, file_name, call_keys):
+        """書き込んだジョブの区分にある他の結果ファイル分のうち、通話がすべて今回の通話に含まれるもの
+        （追記された結果ファイルを分析し直した場合の前回のファイル分。別レーンなど通話の重ならないファイル分は残す）"""
+        import pyarrow.parquet as pq
+        parts = {}
+        for job_id in job_ids:
+            for path in self.root.glob(f"calls/date=*/job_id={job_id}/part-*.parquet"):
+                if path.name != file_name:
+                    parts.setdefault((job_id, path.name), []).append(path)
+        superseded = []
+        for (job_id, name), paths in parts.items():
+            # 通話キーのない（この版より前に書いた）ファイル分は判定できないため残す
+            if any('call_key' not in pq.read_schema(path).names for path in paths):
+                continue
+            keys = np.concatenate([pq.read_table(path, columns=['call_key'])['call_key'].to_numpy(zero_copy_only=False) for path in paths])
+            if len(keys) and np.isin(keys, call_keys).all():
+                superseded.append((job_id, name))
+        return superseded
+
+    def write(self, frames, source_id, job_id=None, call_keys=None):
+        """種類ごとの (DataFrame, 区分 → 行位置) を区分ごとのファイルに書き出し、同じ結果ファイルの前回分を置き換え
+        （job_id 指定時はそのジョブの区分の前回分のみ。call_keys を渡すと、通話がすべてそれに含まれる他の結果ファイル分も削除）"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        # ジョブ指定の分析と全ジョブ振り分けの分析は、同じ結果ファイルでも別のファイル分として置き換える
+        file_name = f"part-{source_id}.parquet" if job_id is not None else f"part-{source_id}-routed.parquet"
+        written = set()
+        with self._locked():
+            for kind, (df, groups) in frames.items():
+                table = pa.Table.from_pandas(df, preserve_index=False).cast(self.schema(df.columns)).replace_schema_metadata(None)
+                # 区分ごとの表は切り出すだけにする（結果ファイルは通常架電時刻順で区分の行が連続しているため、
+                # 連続していない場合だけ区分ごとに行が並ぶよう一度だけ並べ替え）
+                if all(positions[-1] - positions[0] + 1 == len(positions) for positions in groups.values()):
+                    offsets = [positions[0] for positions in groups.values()]
+                else:
+                    table = table.take(np.concatenate(list(groups.values())))
+                    offsets = np.cumsum([0] + [len(positions) for positions in groups.values()])
+                for ((date, part_job_id), positions), offset in zip(groups.items(), offsets):
+                    path = self.root / kind / f"date={date}" / f"job_id={part_job_id}" / file_name
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    # 書き込み途中のファイルは読み込み対象外（先頭が「.」）
+                    tmp_path = path.with_name(f".{file_name}.tmp")
+                    pq.write_table(table.slice(offset, len(positions)), tmp_path)
+                    os.replace(tmp_path, path)
+                    written.add(path)
+
+            # 書き終えてから古いファイルを削除（途中で失敗しても蓄積が欠けない）
+            stale = set(self.root.glob(f"*/date=*/job_id={job_id if job_id is not None else '*'}/{file_name}"))
+            if call_keys is not None:
+                written_job_ids = {path.parent.name.removeprefix("job_id=") for path in written}
+                for superseded_job_id, name in self.superseded_parts(written_job_ids, file_name, call_keys):
+                    stale |= set(self.root.glob(f"*/date=*/job_id={superseded_job_id}/{name}"))
+            for path in stale - written:
+                path.unlink(missing_ok=True)
+                for directory in (path.parent, path.parent.parent):
+                    if not any(directory.iterdir()):
+                        directory.rmdir()
+            self.version_file.touch()
+        return len(written)
+
+    def read(self, kind, columns, start_date, end_date, job_ids=None):
+        """期間（YYYY-MM-DD、両端を含む）・ジョブに該当する区分のファイルから指定の列だけを読み込み"""
+        if not (self.root / kind).exists():
+            pandas_types = {'int64': 'Int64', 'float64': 'float64', 'string': 'str'}
+            return pd.DataFrame({col: pd.Series(dtype=pandas_types[ARCHIVE_COLUMN_TYPES.get(col, 'string')]) for col in columns})
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        # ファイルごとに列が欠けていても同じ列型で読めるよう、全列の型を指定
+        all_columns = ARCHIVE_CALL_COLUMNS if kind == 'calls' else ARCHIVE_ROLLUP_DIMENSIONS + STAT_ROLLUP_MEASURES
+        partitioning = ds.partitioning(self.schema(['date', 'job_id']), flavor='hive')
+        dataset = ds.dataset(
+            self.root / kind, format='parquet', partitioning=partitioning,
+            schema=self.schema(all_columns + ['date', 'job_id'])
+        )
+        # 区分の条件に合わないファイルは開かない（架電日の分からない区分は期間に含めない）
+        condition = (ds.field('date') >= start_date) & (ds.field('date') <= end_date)
+        if job_ids is not None:
+            condition &= ds.field('job_id').isin(list(job_ids))
+        # 整数の列は欠損があっても整数のまま（時間帯・レーン）
+        return dataset.to_table(columns=list(columns), filter=condition).to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+
+class AITeleapoManager:
+    # ジョブごとの差分分析のスレッドロック（job_id → Lock）
+    _analysis_locks = {}
+    _analysis_locks_guard = threading.Lock()
+    # 計測ログの追記・切り替えのスレッドロック
+    _metrics_lock = threading.Lock()
+    
+    def __init__(self, rules_path=RULES_PATH, charmap_path=UPLOAD_CHARMAP_PATH):
+        self.base_dir = Path("teleapo_jobs")
+        self.base_dir.mkdir(exist_ok=True)
+        self.rules_path = Path(rules_path)
+        self.charmap_path = Path(charmap_path)
+        self.analysis_cache_dir = Path("analysis_cache")
+        self.analysis_cache_dir.mkdir(exist_ok=True)
+        self.row_index = JobRowIndex(self.base_dir / "row_index.sqlite")
+        self.call_archive = CallArchive(CALL_ARCHIVE_DIR)
+        if self.row_index.created:
+            self.index_existing_jobs()
+    
+    def get_call_rules(self):
+        """現在の分類ルールを取得"""
+        return load_call_rules(self.rules_path)
+    
+    def get_upload_charmap(self):
+        """現在のアップロード用CSVの置き換え表を取得"""
+        return load_upload_charmap(self.charmap_path)
+        
+    def generate_job_id(self):
+        """ジョブIDを生成"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M")
+        random_suffix = hashlib.md5(str(time.time()).encode()).hexdigest()[:5].upper()
+        return f"{timestamp}_{random_suffix}"
+    
+    def normalize_phone(self, phone_str):
+        """電話番号を正規化（+81形式を0始まりに変換）"""
+        if pd.isna(phone_str):
+            return ""
+        phone_str = str(phone_str).replace("+81", "0").replace(" ", "").replace("-", "")
+        return re.sub(r'\D', '', phone_str)
+    
+    def normalize_text(self, text):
+        """テキストを正規化"""
+        if pd.isna(text):
+            return ""
+        return str(text).strip()
+    
+    def create_row_key(self, company, phone):
+        """行指紋を作成（社名ベース。列単位の create_row_keys はこれと同じ値を返す）"""
+        # 社名を正規化してキーとして使用
+        normalized_company = self.normalize_text(company)
+        normalized_phone = self.normalize_phone(phone)
+        base = f"{normalized_company}|{normalized_phone}"
+        return hashlib.sha256(base.encode('utf-8')).hexdigest()[:16]
+    
+    def column_or_blank(self, df, column):
+        """列を取得（存在しない場合は空文字の列）"""
+        if column in df.columns:
+            return df[column]
+        return pd.Series("", index=df.index, dtype=object)
+    
+    def text_series(self, values):
+        """欠損を空文字にした文字列の列（str と同じ規則で処理するためobject型のまま）"""
+        return values.astype(object).where(values.notna(), "").astype(str).astype(object)
+    
+    def normalize_text_series(self, values):
+        """テキストを列単位で正規化（normalize_text と同じ結果）"""
+        return self.text_series(values).str.strip()
+    
+    def normalize_phone_series(self, values):
+        """電話番号を列単位で正規化（normalize_phone と同じ結果）"""
+        text = self.text_series(values)
+        text = text.str.replace("+81", "0", regex=False).str.replace(" ", "", regex=False).str.replace("-", "", regex=False)
+        return text.str.replace(r'\D', '', regex=True)
+    
+    def canonical_company_series(self, values):
+        """社名を照合用に正規化（NFKC・空白と法人格の表記を除去・英字は小文字）"""
+        text = self.text_series(values).map(lambda value: unicodedata.normalize('NFKC', value))
+        text = text.str.replace(r"\s+", "", regex=True).str.replace(COMPANY_FORM_PATTERN, "", regex=True)
+        return text.str.lower()
+    
+    def company_stem_series(self, canonical_names):
+        """照合用社名から末尾の番号・支店などの拠点・地名を除いたもの（これが同じで社名の違う組は別の会社）"""
+        return pd.Series(canonical_names, dtype=object).astype(str).str.replace(COMPANY_BRANCH_SUFFIX_PATTERN, "", regex=True)
+    
+    def company_bigrams(self, name):
+        """社名の文字 2-gram の集合（1文字の社名はその文字）"""
+        return {name[i:i + 2] for i in range(len(name) - 1)} or {name}
+    
+    def company_similarity(self, name, other):
+        """照合用社名の類似度（2-gram 集合の Dice 係数、0〜1）"""
+        grams, other_grams = self.company_bigrams(name), self.company_bigrams(other)
+        return 2 * len(grams & other_grams) / (len(grams) + len(other_grams))
+    
+    def factorize_normalized(self, values, normalize):
+        """値の種類ごとに一度だけ正規化（各行のコードと、末尾に欠損用の空文字を加えた正規化済みの値）"""
+        codes, uniques = pd.factorize(values)
+        normalized = normalize(pd.Series(uniques, dtype=object)).to_numpy(dtype=object)
+        return codes, np.append(normalized, "")
+    
+    def create_row_keys(self, companies, phones):
+        """行指紋を列単位で作成（create_row_key と同じ値）"""
+        # 正規化とハッシュ計算は社名・電話番号の組ごとに一度だけ行う
+        company_codes, normalized_companies = self.factorize_normalized(companies, self.normalize_text_series)
+        phone_codes, normalized_phones = self.factorize_normalized(phones, self.normalize_phone_series)
+        width = len(normalized_phones)
+        pair_codes, pairs = pd.factorize((company_codes.astype('int64') + 1) * width + phone_codes + 1)
+        sha256 = hashlib.sha256
+        keys = np.array([
+            sha256(f"{normalized_companies[pair // width - 1]}|{normalized_phones[pair % width - 1]}".encode('utf-8')).hexdigest()[:16]
+            for pair in pairs.tolist()
+        ], dtype=object)
+        return pd.Series(keys[pair_codes], index=companies.index)
+    
+    def get_upload_paths(self, job_id):
+        """ジョブのレーン別アップロード用CSVのパス"""
+        job_dir = self.base_dir / job_id
+        with open(job_dir / "manifest.json", 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        lanes = manifest['files'].get('lanes') or [{'upload': manifest['files']['upload']}]
+        return [job_dir / lane['upload'] for lane in lanes]
+    
+    def read_filemaker_file(self, file_obj):
+        """FileMakerのExcelから下流で使う列だけを読み込み（calamineがあれば使用）"""
+        engine = 'calamine' if importlib.util.find_spec('python_calamine') is not None else None
+        file_obj.seek(0)
+        df = pd.read_excel(file_obj, engine=engine, usecols=lambda col: col in FILEMAKER_COLUMNS)
+        file_obj.seek(0)
+        return df
+    
+    def process_filemaker_data(self, df, job_id, output_filename, robot_count=1, original_bytes=None, original_suffix='.xlsx', progress=None):
+        """FileMakerデータを処理（ロボット台数分のレーンに分割、progress(割合, 内容) で進捗を通知）"""
+        if progress is None:
+            progress = lambda fraction, message: None
+        profiler = StageProfiler()
+        job_dir = self.base_dir / job_id
+        job_dir.mkdir(exist_ok=True)
+        
+        # 元データを保存（アップロードされたファイルがあれば再エンコードせずそのまま）
+        original_name = f"fm_export{original_suffix}"
+        original_path = job_dir / original_name
+        if original_bytes is not None:
+            with open(original_path, 'wb') as f:
+                f.write(original_bytes)
+        else:
+            df.to_excel(original_path, index=False)
+        profiler.lap('save_original')
+        
+        # AIテレアポ用にデータを変換（列の選択・名前の変更ではデータを複製しない）
+        upload_df = df
+        if '顧客名' in upload_df.columns:
+            upload_df = upload_df.rename(columns={'顧客名': '社名'})
+        
+        # 必要な列のみ抽出（AIテレアポ用）
+        required_columns = ['社名', '電話番号', '住所統合']
+        available_columns = [col for col in required_columns if col in upload_df.columns]
+        
+        if available_columns:
+            upload_df = upload_df[available_columns]
+        
+        # 社名を50文字でカット（マージ用索引の照合用社名も同じ文字数で作る）
+        if '社名' in upload_df.columns:
+            upload_df['社名'] = upload_df['社名'].astype(str).str[:UPLOAD_COMPANY_MAX_CHARS]
+        
+        # 文字コードで表せない文字だけを置き換え（レーン別CSVは1回で書き出せる）、置き換えた行を記録
+        charmap = self.get_upload_charmap()
+        upload_df, encoding_changes = self.encode_upload_columns(upload_df, charmap, self.column_or_blank(df, 'IDの頭にID'))
+        profiler.lap('encode_check', len(df))
+        
+        # 行指紋を作成してrowmapを生成(社名ベース)
+        progress(0.2, "行指紋を作成中")
+        companies = self.column_or_blank(df, '顧客名' if '顧客名' in df.columns else '社名')
+        phones = self.column_or_blank(df, '電話番号')
+        rowmap_df = pd.DataFrame({
+            'row_key': self.create_row_keys(companies, phones),
+            'company': companies,
+            'company_normalized': self.normalize_text_series(companies),
+            'phone': phones,
+            'fm_id': self.column_or_blank(df, 'IDの頭にID'),
+            'index_in_fm': df.index
+        })
+        
+        # レーンごとに均等に分割
+        lane_ranges = split_lanes(len(df), robot_count)
+        rowmap_df['lane'] = 0
+        lane_tasks = []
+        for lane, (start, end) in enumerate(lane_ranges, start=1):
+            rowmap_df.iloc[start:end, rowmap_df.columns.get_loc('lane')] = lane
+            if len(lane_ranges) == 1:
+                # 1レーンの場合は従来どおりのファイル名
+                upload_name, rowmap_name = f"{output_filename}.csv", "rowmap.csv"
+            else:
+                upload_name, rowmap_name = f"{output_filename}_レーン{lane}.csv", f"rowmap_lane{lane}.csv"
+            lane_tasks.append((
+                lane,
+                upload_df.iloc[start:end],
+                rowmap_df.iloc[start:end],
+                job_dir / upload_name,
+                job_dir / rowmap_name,
+                charmap.encoding
+            ))
+        
+        profiler.lap('row_keys', len(df))
+        
+        # 全ジョブ横断の行索引に登録
+        progress(0.4, "行索引に登録中")
+        self.row_index.add_job(job_id, rowmap_df, self.normalize_phone_series(phones))
+        profiler.lap('row_index', len(df))
+        
+        # 分析時にExcelを読み直さないよう、マージ用索引を列指向のpickleで保存
+        lookup_path = job_dir / "merge_lookup.pkl"
+        self.build_merge_lookup(df, rowmap_df).to_pickle(lookup_path)
+        profiler.lap('merge_lookup', len(df))
+        
+        # レーン別のアップロード用CSVとrowmapを並列に書き出し
+        progress(0.6, "レーン別ファイルを書き出し中")
+        if len(lane_tasks) == 1:
+            lanes = [write_lane_files(*lane_tasks[0])]
+        else:
+            max_workers = min(len(lane_tasks), os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=lane_worker_context()) as executor:
+                lanes = list(executor.map(write_lane_files, *zip(*lane_tasks)))
+        upload_paths = [job_dir / lane_info['upload'] for lane_info in lanes]
+        if len(encoding_changes):
+            # 置き換え前の文字も残すため UTF-8（BOM付き）で保存
+            encoding_changes.to_csv(job_dir / ENCODING_CHANGES_NAME, index=False, encoding='utf-8-sig')
+            logger.warning(
+                "ジョブ %s: %s で表せない文字を %d 行で置き換えました（%s）",
+                job_id, charmap.encoding, encoding_changes['行'].nunique(), ENCODING_CHANGES_NAME
+            )
+        profiler.lap('lane_files', len(df))
+        
+        # マニフェストを作成
+        manifest = {
+            'job_id': job_id,
+            'created_at': datetime.now().isoformat(),
+            'original_filename': output_filename,
+            'total_rows': len(df),
+            'robot_count': len(lanes),
+            'files': {
+                'fm_export': original_name,
+                'upload': lanes[0]['upload'],
+                'rowmap': lanes[0]['rowmap'],
+                'merge_lookup': 'merge_lookup.pkl',
+                'lanes': lanes,
+                'encoding_changes': ENCODING_CHANGES_NAME if len(encoding_changes) else None
+            },
+            'upload_encoding': {
+                'encoding': charmap.encoding,
+                'charmap_version': charmap.version,
+                'changed_rows': int(encoding_changes['行'].nunique()) if len(encoding_changes) else 0
+            }
+        }
+        
+        manifest_path = job_dir / "manifest.json"
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        profiler.lap('manifest')
+        self.write_metrics(job_id, 'create', profiler.finish())
+        progress(1.0, "完了")
+        
+        return {
+            'job_id': job_id,
+            'upload_path': upload_paths[0],
+            'upload_paths': upload_paths,
+            'total_rows': len(df),
+            'encoding_changes': manifest['upload_encoding']['changed_rows'],
+            'manifest': manifest
+        }
+    
+    def encode_upload_columns(self, upload_df, charmap, fm_ids):
+        """アップロード用の文字列の列で表せない文字を置き換え、置き換え後のデータと置き換えた行の一覧を返す"""
+        changes = []
+        for col in upload_df.columns:
+            values = upload_df[col]
+            if not (pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values)):
+                continue
+            translated, changed = charmap.translate(values)
+            if changed.any():
+                upload_df = upload_df.assign(**{col: translated})
+                changes.append(pd.DataFrame({
+                    '行': np.flatnonzero(changed.to_numpy()) + 1,
+                    'IDの頭にID': fm_ids[changed.to_numpy()].to_numpy(),
+                    '列': col,
+                    '置き換え前': values[changed].to_numpy(),
+                    '置き換え後': translated[changed].to_numpy(),
+                }))
+        if not changes:
+            return upload_df, pd.DataFrame(columns=['行', 'IDの頭にID', '列', '置き換え前', '置き換え後'])
+        return upload_df, pd.concat(changes, ignore_index=True).sort_values(['行', '列'], kind='stable', ignore_index=True)
+    
+    def get_encoding_changes(self, job_id):
+        """ジョブ作成時にアップロード用CSVで文字を置き換えた行の一覧（なければ空）"""
+        path = self.base_dir / job_id / ENCODING_CHANGES_NAME
+        if not path.exists():
+            return pd.DataFrame(columns=['行', 'IDの頭にID', '列', '置き換え前', '置き換え後'])
+        return pd.read_csv(path, encoding='utf-8-sig', dtype=str, keep_default_na=False)
+    
+    def detect_encoding(self, file_obj, block_size=ENCODING_CHECK_BLOCK_BYTES):
+        """文字コードを判定（ファイル全体が UTF-8 として読めれば utf-8、途中で読めなくなれば cp932）"""
+        # 先頭が ASCII だけでも後ろに ①・㈱ などがあり得るため、先頭だけでは決めない。
+        # cp932 は shift_jis の上位互換でアップロード用CSVの文字コードでもあるため、shift_jis は候補にしない
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        file_obj.seek(0)
+        try:
+            while True:
+                block = file_obj.read(block_size)
+                # ブロックの境目で途切れたマルチバイト文字は次のブロックと合わせて判定
+                decoder.decode(block, final=not block)
+                if not block:
+                    return 'utf-8'
+        except UnicodeDecodeError:
+            return 'cp932'
+        finally:
+            file_obj.seek(0)
+    
+    def iter_call_result_chunks(self, file_obj, chunksize=CSV_CHUNK_ROWS, encoding=None):
+        """結果CSVを一定行数ずつ読み込む"""
+        if encoding is None:
+            encoding = self.detect_encoding(file_obj)
+        with pd.read_csv(file_obj, encoding=encoding, chunksize=chunksize) as reader:
+            for chunk in reader:
+                yield chunk
+    
+    def analyze_results_file(self, file_obj, chunksize=CSV_CHUNK_ROWS, progress=None, profiler=None):
+        """結果CSVをチャンク単位で分析し、分析済みデータを返す（統計はレーンが分かるマージ後に calculate_statistics で集計）"""
+        if profiler is None:
+            profiler = StageProfiler(trace_memory=False)
+        file_obj.seek(0, os.SEEK_END)
+        file_size = file_obj.tell() or 1
+        file_obj.seek(0)
+        
+        analyzed_chunks = []
+        for chunk in self.iter_call_result_chunks(file_obj, chunksize):
+            profiler.lap('read_csv', len(chunk))
+            analyzed_chunk = self.analyze_call_results(chunk)
+            profiler.lap('classify', len(chunk))
+            analyzed_chunks.append(analyzed_chunk)
+            if progress:
+                # 読み込み済みのバイト数から概算
+                rows_done = sum(len(analyzed) for analyzed in analyzed_chunks)
+                progress(min(file_obj.tell() / file_size, 1.0), f"{rows_done:,} 件を分析済み")
+        profiler.lap('read_csv')
+        
+        if analyzed_chunks:
+            analyzed_df = self.concat_frames(analyzed_chunks)
+        else:
+            analyzed_df = pd.DataFrame()
+        profiler.lap('concat', len(analyzed_df))
+        return analyzed_df
+    
+    def parse_durations(self, durations):
+        """通話時間（hh:mm:ss / mm:ss / 秒数）を列単位で秒数に変換（変換できない値は0）"""
+        # 通話時間の種類は少ないため、同じ値は一度だけ変換する
+        codes, uniques = pd.factorize(durations)
+        unique_seconds = self.parse_duration_values(pd.Series(uniques, dtype=object)).to_numpy()
+        # 欠損（コード -1）は末尾の0を参照
+        return pd.Series(np.append(unique_seconds, 0)[codes], index=durations.index)
+    
+    def parse_duration_values(self, durations):
+        """parse_durations の変換本体（値ごとに変換）"""
+        text = durations.astype(object).where(durations.notna(), "").astype(str).str.strip()
+        parts = text.str.split(":", expand=True).reindex(columns=range(3))
+        part_count = text.str.count(":") + 1
+        
+        # int() と同様に、各要素は符号付き整数のみ有効とする
+        numbers = []
+        for i in range(3):
+            part = parts[i].astype(object).where(parts[i].notna(), "").astype(str).str.strip()
+            ascii_digits = part.str.fullmatch(r"[+-]?[0-9]+")
+            number = pd.to_numeric(part.where(ascii_digits), errors='coerce')
+            # 全角・他の文字体系の数字や「_」区切りなど int() が受け付ける値もあるため、それ以外は int() で判定
+            others = ~ascii_digits & (part != "")
+            if others.any():
+                number[others] = part[others].map(parse_int_or_nan).astype(float)
+            numbers.append(number)
+        h_or_m, m_or_s, s = numbers
+        
+        seconds = np.select(
+            [part_count == 1, part_count == 2, part_count == 3],
+            [h_or_m, h_or_m * 60 + m_or_s, h_or_m * 3600 + m_or_s * 60 + s],
+            default=np.nan
+        )
+        return pd.Series(seconds, index=durations.index).fillna(0).astype('int64')
+    
+    def analyze_call_results(self, df):
+        """通話結果を分析"""
+        # 電話番号を正規化
+        df["電話番号"] = df["電話番号"].astype(str).str.replace(r'^\+81\s*', '0', regex=True)
+        df["電話番号"] = df["電話番号"].str.replace(" ", "")
+        
+        # 通話時間を数値化（mm:ss形式を秒数に変換）
+        df["通話時間_num"] = self.parse_durations(df["通話時間"])
+        
+        # ステータス分類（ルールファイルの優先順位で列単位に判定）
+        status = df["ステータス"].fillna("").astype(str).str.strip()
+        result = df["架電結果"].fillna("").astype(str).str.strip()
+        summary = df["要約"].fillna("").astype(str)
+        
+        # 既に結果が入っている行は対象外
+        pending = result.isin(["", "nan"])
+        
+        labels = self.get_call_rules().classify(status, summary, df["通話時間_num"])
+        assign = pending & (labels != "")
+        df["架電結果"] = df["架電結果"].astype(object).where(~assign, labels)
+        
+        # ステータス・架電結果は種類が少ないためカテゴリ型で保持
+        return self.categorize_columns(df)
+    
+    def build_merge_lookup(self, original_df, rowmap_df):
+        """rowmapに元データの詳細列（IDをキーに）を結合したマージ用索引を作成"""
+        lookup_columns = ['company_normalized', 'fm_id', 'company']
+        if 'lane' in rowmap_df.columns:
+            lookup_columns.append('lane')
+        lookup_df = rowmap_df[lookup_columns]
+        # 空の社名はマッチ対象外
+        lookup_df = lookup_df[lookup_df['company_normalized'].notna() & (lookup_df['company_normalized'] != "")]
+        
+        # 完全一致しなかった行の照合用に、アップロード時と同じ文字数で切り詰めた照合用社名と電話番号を持たせる
+        lookup_df = lookup_df.assign(
+            company_canonical=self.canonical_company_series(
+                self.text_series(lookup_df['company']).str[:UPLOAD_COMPANY_MAX_CHARS]
+            ).astype('str'),
+            phone_normalized=self.normalize_phone_series(self.column_or_blank(rowmap_df, 'phone').loc[lookup_df.index]).astype('str')
+        )
+        
+        if 'IDの頭にID' in original_df.columns:
+            detail_columns = [col for col in ORIGINAL_DETAIL_COLUMNS if col in original_df.columns]
+            original_subset = original_df[['IDの頭にID'] + detail_columns].rename(columns={'IDの頭にID': 'fm_id'})
+            # IDが重複していても索引の行は増やさない（最初の行の詳細を使う）
+            original_subset = original_subset.drop_duplicates('fm_id')
+            lookup_df = pd.merge(lookup_df, original_subset, on='fm_id', how='left', validate='many_to_one')
+        
+        # 結合先を一意に決められるかの判定に使う件数もジョブ作成時に一度だけ数えておく
+        return self.categorize_columns(self.count_lookup_keys(lookup_df.reset_index(drop=True)))
+    
+    def count_lookup_keys(self, lookup_df):
+        """索引の各行に、同じ社名の行数（company_rows）と同じ社名・電話番号の行数（pair_rows）を付ける"""
+        keys = pd.DataFrame({
+            'company': lookup_df['company_normalized'].to_numpy(dtype=object),
+            'phone': self.column_or_blank(lookup_df, 'phone_normalized').fillna("").to_numpy(dtype=object),
+        })
+        return lookup_df.assign(
+            company_rows=keys.groupby('company', sort=False, dropna=False)['phone'].transform('size').to_numpy(),
+            pair_rows=keys.groupby(['company', 'phone'], sort=False, dropna=False)['phone'].transform('size').to_numpy()
+        )
+    
+    def shared_codes(self, lookup_values, values):
+        """索引側の値と照合する値を共通のコードに変換（索引にない値・欠損は-1）し、索引側の値の種類数とともに返す"""
+        # get_indexer より連結して一度に factorize する方が速い
+        codes, _ = pd.factorize(np.concatenate([lookup_values, values]))
+        lookup_codes, codes = codes[:len(lookup_values)], codes[len(lookup_values):]
+        count = int(lookup_codes.max()) + 1 if len(lookup_codes) else 0
+        return lookup_codes.astype('int64'), np.where(codes < count, codes, -1).astype('int64'), count
+    
+    def resolve_lookup_rows(self, company_keys, phones, lookup_df):
+        """通話結果の各行の結合先（索引の行位置、なければ-1）と、候補が複数で決められなかった行
+        
+        社名・電話番号が索引の1行だけに一致すればその行、社名が索引の1行だけならその行を使う（1行に高々1行）。
+        """
+        if 'company_rows' not in lookup_df.columns:
+            lookup_df = self.count_lookup_keys(lookup_df)
+        lookup_companies = lookup_df['company_normalized'].to_numpy(dtype=object)
+        lookup_phones = self.column_or_blank(lookup_df, 'phone_normalized').fillna("").to_numpy(dtype=object)
+        positions = np.arange(len(lookup_df))
+        
+        # 社名・電話番号はそれぞれコードにしてから組み合わせる
+        lookup_codes, call_codes, company_count = self.shared_codes(lookup_companies, company_keys)
+        lookup_phone_codes, call_phone_codes, phone_count = self.shared_codes(lookup_phones, phones)
+        lookup_pairs = lookup_codes * phone_count + lookup_phone_codes
+        call_pairs = np.where((call_codes >= 0) & (call_phone_codes >= 0), call_codes * phone_count + call_phone_codes, -1)
+        
+        # 社名・電話番号で1行に決まる行（電話番号が空の行は使わない）
+        pair_unique = (lookup_df['pair_rows'].to_numpy() == 1) & (lookup_phones != "")
+        pair_positions = pd.Index(lookup_pairs[pair_unique]).get_indexer(call_pairs)
+        right_rows = np.full(len(company_keys), -1, dtype='int64')
+        found = pair_positions >= 0
+        right_rows[found] = positions[pair_unique][pair_positions[found]]
+        
+        # 決まらなければ社名が索引の1行だけの場合に限りその行
+        company_unique = lookup_df['company_rows'].to_numpy() == 1
+        unique_company_rows = np.full(company_count, -1, dtype='int64')
+        unique_company_rows[lookup_codes[company_unique]] = positions[company_unique]
+        fallback = (right_rows < 0) & (call_codes >= 0)
+        right_rows[fallback] = unique_company_rows[call_codes[fallback]]
+        
+        ambiguous = (right_rows < 0) & (call_codes >= 0)
+        return right_rows, ambiguous
+    
+    def load_merge_lookup(self, job_dir, manifest):
+        """マージ用索引を読み込み（索引のない旧ジョブはrowmapとExcelから作成）"""
+        lookup_name = manifest.get('files', {}).get('merge_lookup')
+        if lookup_name and (job_dir / lookup_name).exists():
+            return pd.read_pickle(job_dir / lookup_name)
+        
+        rowmap_df = pd.read_csv(job_dir / "rowmap.csv")
+        original_df = pd.read_excel(job_dir / manifest.get('files', {}).get('fm_export', "fm_export.xlsx"))
+        return self.build_merge_lookup(original_df, rowmap_df)
+    
+    def prepare_call_results(self, call_results_df):
+        """マージ前に通話結果の社名を正規化し、架電時刻を日付と時間に分割（正規化した社名は列に加えず、コードと社名の配列で返す）"""
+        # 通話結果の社名を正規化（同じ社名は一度だけ）
+        company_codes, company_names = self.factorize_normalized(call_results_df['社名'], self.normalize_text_series)
+        
+        # 架電時刻列を保持（存在する場合）
+        has_call_time = '架電時刻' in call_results_df.columns
+        
+        # 架電時刻を日付と時間に分割
+        if has_call_time:
+            try:
+                # 架電時刻を日時型に変換
+                call_times = pd.to_datetime(call_results_df['架電時刻'], errors='coerce')
+                # 日付列を作成（YYYY/MM/DD形式）
+                call_results_df['架電日'] = call_times.dt.strftime('%Y/%m/%d')
+                # 時間列を作成（HH:MM:SS形式）
+                call_results_df['架電時間'] = call_times.dt.strftime('%H:%M:%S')
+            except Exception as e:
+                # エラーが発生した場合は元の架電時刻をそのまま使用
+                pass
+        
+        return call_results_df, (company_codes, company_names), has_call_time
+    
+    def match_companies(self, companies, phones, lookup_df, fuzzy=True):
+        """通話結果の社名を索引の社名に照合し、行ごとの結合用の社名・照合方法・信頼度を返す（完全一致しない行は fuzzy なら表記ゆれ・あいまい一致で照合、phones は正規化済み）"""
+        company_codes, company_names = companies
+        company_keys = company_names[company_codes]
+        exact = pd.Series(company_names, dtype=object).isin(lookup_df['company_normalized']).to_numpy()[company_codes]
+        methods = np.where(exact, '完全一致', None).astype(object)
+        confidences = np.where(exact, 1.0, np.nan)
+        
+        pending = ~exact & (company_keys != "")
+        if fuzzy and pending.any():
+            matched = self.match_companies_fuzzy(company_keys[pending], phones[pending], lookup_df)
+            found = matched['key'].notna().to_numpy()
+            rows = np.flatnonzero(pending)[found]
+            company_keys = company_keys.copy()
+            company_keys[rows] = matched['key'].to_numpy()[found]
+            methods[rows] = matched['method'].to_numpy()[found]
+            confidences[rows] = matched['confidence'].to_numpy()[found]
+        return company_keys, methods, confidences
+    
+    def match_companies_fuzzy(self, names, phones, lookup_df):
+        """完全一致しなかった社名を、照合用社名の一致（表記ゆれ）と 2-gram・電話番号で絞った候補との類似度（あいまい一致）で照合"""
+        # 同じ社名・電話番号の組は一度だけ照合
+        query_codes, queries = pd.MultiIndex.from_arrays([names, phones]).factorize()
+        query_phones = queries.get_level_values(1).to_numpy(dtype=object)
+        query_codes_canonical, canonical_names = self.factorize_normalized(queries.get_level_values(0), self.canonical_company_series)
+        query_names = canonical_names[query_codes_canonical]
+        
+        # 照合先は照合用社名ごとに最初に登録された行（旧ジョブの索引には照合用の列がないためここで作る）
+        if 'company_canonical' in lookup_df.columns:
+            canonical = lookup_df['company_canonical']
+        else:
+            canonical = self.canonical_company_series(self.text_series(lookup_df['company']).str[:UPLOAD_COMPANY_MAX_CHARS])
+        targets = pd.DataFrame({
+            'key': lookup_df['company_normalized'],
+            'canonical': canonical.astype('str'),
+            'phone': self.column_or_blank(lookup_df, 'phone_normalized'),
+        })
+        targets = targets[targets['canonical'] != ""].drop_duplicates('canonical').reset_index(drop=True)
+        target_names = targets['canonical']
+        
+        result = pd.DataFrame({
+            'key': pd.Series(None, index=range(len(queries)), dtype=object),
+            'method': pd.Series(None, index=range(len(queries)), dtype=object),
+            'confidence': np.nan,
+        })
+        
+        # 表記ゆれ: 照合用社名が一致
+        positions = pd.Index(target_names).get_indexer(query_names)
+        canonical_hit = (positions >= 0) & (query_names != "")
+        result.loc[canonical_hit, 'key'] = targets['key'].to_numpy()[positions[canonical_hit]]
+        result.loc[canonical_hit, 'method'] = '表記ゆれ'
+        result.loc[canonical_hit, 'confidence'] = CANONICAL_MATCH_CONFIDENCE
+        
+        # あいまい一致: 2-gram を多く共有する社名と同じ電話番号の社名だけを候補に類似度を計算
+        remaining = np.flatnonzero(~canonical_hit & (query_names != ""))
+        if len(remaining) and len(targets):
+            candidates = self.ngram_candidates(query_names[remaining], target_names)
+            candidates['query'] = remaining[candidates['query'].to_numpy()]
+            phone_targets = targets[targets['phone'] != ""].drop_duplicates('phone')
+            phone_positions = pd.Index(phone_targets['phone']).get_indexer(query_phones[remaining])
+            phone_hit = phone_positions >= 0
+            candidates = pd.concat([
+                candidates,
+                pd.DataFrame({'query': remaining[phone_hit], 'target': phone_targets.index[phone_positions[phone_hit]]})
+            ], ignore_index=True).drop_duplicates()
+            
+            if len(candidates):
+                query_rows = candidates['query'].to_numpy()
+                target_rows = candidates['target'].to_numpy()
+                scores = np.array([
+                    self.company_similarity(query_names[query], name)
+                    for query, name in zip(query_rows, target_names.iloc[target_rows].tolist())
+                ])
+                # 電話番号も一致すれば、社名の類似度と電話番号の一致を同じ重みで合わせる
+                target_phones = targets['phone'].iloc[target_rows].to_numpy(dtype=object)
+                same_phone = (query_phones[query_rows] == target_phones) & (query_phones[query_rows] != "")
+                scores = np.where(same_phone, (scores + 1) / 2, scores)
+                
+                # 電話番号がどちらにもあって違う候補と、末尾の番号・拠点・地名だけが違う候補は別の会社として除く
+                phone_conflict = (query_phones[query_rows] != "") & (target_phones != "") & ~same_phone
+                query_stems = self.company_stem_series(canonical_names).to_numpy(dtype=object)[query_codes_canonical]
+                target_codes, unique_targets = pd.factorize(target_rows)
+                target_stems = self.company_stem_series(target_names.iloc[unique_targets]).to_numpy(dtype=object)[target_codes]
+                branch_only = query_stems[query_rows] == target_stems
+                scores = np.where(phone_conflict | branch_only, 0.0, scores)
+                
+                best = candidates.assign(score=scores).sort_values(['query', 'score', 'target'], ascending=[True, False, True])
+                best = best.drop_duplicates('query')
+                best = best[best['score'] >= FUZZY_MATCH_THRESHOLD]
+                result.loc[best['query'].to_numpy(), 'key'] = targets['key'].to_numpy()[best['target'].to_numpy()]
+                result.loc[best['query'].to_numpy(), 'method'] = 'あいまい一致'
+                result.loc[best['query'].to_numpy(), 'confidence'] = best['score'].round(3).to_numpy()
+        
+        return result.iloc[query_codes].reset_index(drop=True)
+    
+    def ngram_candidates(self, query_names, target_names):
+        """文字 2-gram の転置索引で、各社名と 2-gram を多く共有する照合先（target_names の位置）を上位から絞り込む"""
+        query_grams = [(query, gram) for query, name in enumerate(query_names) for gram in self.company_bigrams(name)]
+        gram_codes, gram_index = pd.factorize(pd.Series([gram for _, gram in query_grams], dtype=object))
+        query_grams = pd.DataFrame({'query': [query for query, _ in query_grams], 'gram': gram_codes})
+        gram_index = pd.Index(gram_index)
+        
+        # 照合先の 2-gram は照会側に現れるものだけを、文字位置ごとに列単位で取り出す（2-gram はコードで持つ）
+        names = pd.Series(target_names, dtype='str')
+        lengths = names.str.len().to_numpy()
+        single = np.flatnonzero(lengths == 1)
+        posting_grams = [gram_index.get_indexer(names.iloc[single])]
+        posting_targets = [single]
+        active = np.flatnonzero(lengths > 1)
+        start = 0
+        while len(active):
+            grams = names.iloc[active].str.slice(start, start + 2)
+            hit = grams.isin(gram_index).to_numpy()
+            posting_grams.append(gram_index.get_indexer(grams[hit]))
+            posting_targets.append(active[hit])
+            start += 1
+            active = active[lengths[active] > start + 1]
+        postings = pd.DataFrame({'gram': np.concatenate(posting_grams), 'target': np.concatenate(posting_targets)})
+        postings = postings[postings['gram'] >= 0].drop_duplicates()
+        
+        # 多くの社名に現れる 2-gram（「商事」など）は候補を絞れないため使わない
+        posting_counts = np.bincount(postings['gram'].to_numpy(), minlength=len(gram_index))
+        postings = postings[posting_counts[postings['gram'].to_numpy()] <= NGRAM_MAX_POSTINGS]
+        
+        shared = query_grams.merge(postings, on='gram').groupby(['query', 'target']).size().rename('shared').reset_index()
+        shared = shared.sort_values(['query', 'shared', 'target'], ascending=[True, False, True])
+        return shared.groupby('query').head(FUZZY_CANDIDATES_PER_ROW)[['query', 'target']].reset_index(drop=True)
+    
+    def categorize_columns(self, df):
+        """値の種類が少ない列をカテゴリ型に変換（変換済みの列はそのまま）"""
+        for col in CATEGORY_COLUMNS:
+            if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype('category')
+        return df
+    
+    def concat_frames(self, frames, ignore_index=True):
+        """DataFrameを連結（カテゴリ型の列はカテゴリを揃えてから連結し、object型に戻さない）"""
+        # 空のフレーム（初回の分析状態など）は列の型に影響しないよう除く
+        frames = list(frames)
+        frames = [frame for frame in frames if len(frame)] or frames[:1]
+        for col in CATEGORY_COLUMNS:
+            dtypes = [frame[col].dtype for frame in frames if col in frame.columns]
+            if len(dtypes) < 2 or not all(isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes):
+                continue
+            categories = dtypes[0].categories.append([dtype.categories for dtype in dtypes[1:]]).unique()
+            frames = [
+                frame.assign(**{col: frame[col].cat.set_categories(categories)}) if col in frame.columns else frame
+                for frame in frames
+            ]
+        return pd.concat(frames, ignore_index=ignore_index)
+    
+    def link_lookup(self, call_results_df, companies, lookup_df, fuzzy=True):
+        """通話結果の各行を索引の行に対応付け、照合方法・信頼度の列を加えた通話結果と結合先の行位置を返す"""
+        phone_codes, phone_names = self.factorize_normalized(self.column_or_blank(call_results_df, '電話番号'), self.normalize_phone_series)
+        phones = phone_names[phone_codes]
+        company_keys, methods, confidences = self.match_companies(companies, phones, lookup_df, fuzzy)
+        right_rows, ambiguous = self.resolve_lookup_rows(company_keys, phones, lookup_df)
+        
+        # 索引の複数行に該当して結合先を決められない行は、行を増やさず未結合のまま報告
+        if ambiguous.any():
+            methods[ambiguous] = '候補複数'
+            confidences[ambiguous] = np.nan
+            logger.warning(
+                "結合先が複数あり決められない通話が %d 件あります（社名 %d 種類）",
+                int(ambiguous.sum()), len(pd.unique(company_keys[ambiguous]))
+            )
+        return call_results_df.assign(マッチ方法=methods, マッチ信頼度=confidences), right_rows
+    
+    def join_lookup(self, call_results_df, right_rows, lookup_df, has_call_time):
+        """通話結果の各行に索引の行（right_rows の位置、-1 は該当なし）の列を付け、マージ結果に残す列だけを組み立て（行数は通話結果と同じ）"""
+        # 両方にある列は従来どおり結果に残さない
+        shared_columns = set(call_results_df.columns) & set(lookup_df.columns)
+        keep_columns = set(self.merged_column_order(
+            (set(call_results_df.columns) | set(lookup_df.columns)) - shared_columns, has_call_time
+        ))
+        columns = {}
+        for source, rows in ((call_results_df, None), (lookup_df, right_rows)):
+            source = self.categorize_columns(
+                source[[col for col in source.columns if col in keep_columns]].reset_index(drop=True)
+            )
+            for col in source.columns:
+                # 通話結果側はそのまま、索引側は行位置で取り出す（該当なしの -1 は欠損）
+                columns[col] = source[col] if rows is None else source[col].reindex(rows).reset_index(drop=True)
+        return pd.DataFrame(columns, index=pd.RangeIndex(len(call_results_df)), copy=False)
+    
+    def merged_column_order(self, columns, has_call_time):
+        """マージ結果の列の順序（columns にある列のみ）"""
+        # 架電日・架電時間を含める
+        if has_call_time and '架電日' in columns and '架電時間' in columns:
+            column_order = ['fm_id', 'job_id', '社名', '電話番号', '架電日', '架電時間', 'ステータス', '架電結果', '要約', '通話時間', 
+                           '住所統合', '最終トーク判定', '最終有効無効', '最終決済担当', 'マッチ方法', 'マッチ信頼度', 'row_key']
+        elif has_call_time:
+            # 分割できなかった場合は元の架電時刻を使用
+            column_order = ['fm_id', 'job_id', '社名', '電話番号', '架電時刻', 'ステータス', '架電結果', '要約', '通話時間', 
+                           '住所統合', '最終トーク判定', '最終有効無効', '最終決済担当', 'マッチ方法', 'マッチ信頼度', 'row_key']
+        else:
+            column_order = ['fm_id', 'job_id', '社名', '電話番号', 'ステータス', '架電結果', '要約', '通話時間', 
+                           '住所統合', '最終トーク判定', '最終有効無効', '最終決済担当', 'マッチ方法', 'マッチ信頼度', 'row_key']
+        
+        # 存在する列のみを選択（統計のレーン別集計に使うレーンと、差分分析の識別キーは末尾に残す）
+        return [col for col in column_order + MERGED_INTERNAL_COLUMNS if col in columns]
+    
+    def finalize_merged(self, merged_df, has_call_time):
+        """マージ結果に行指紋を追加し、列の順序を整理"""
+        # 通話結果に行指紋を追加
+        merged_df['row_key'] = self.create_row_keys(
+            self.column_or_blank(merged_df, '社名'),
+            self.column_or_blank(merged_df, '電話番号')
+        )
+        return merged_df[self.merged_column_order(merged_df.columns, has_call_time)]
+    
+    def merge_with_original(self, call_results_df, job_id):
+        """元データとマージ（社名ベース）"""
+        job_dir = self.base_dir / job_id
+        
+        # マニフェストを読み込み
+        manifest_path = job_dir / "manifest.json"
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        
+        # マージ用索引を読み込み
+        lookup_df = self.load_merge_lookup(job_dir, manifest)
+        
+        call_results_df, companies, has_call_time = self.prepare_call_results(call_results_df)
+        
+        # 社名を照合（完全一致しない行は表記ゆれ・あいまい一致で照合し、照合方法と信頼度を結果に残す）し、
+        # 社名・電話番号で結合先を1行に決める
+        call_results_df, right_rows = self.link_lookup(call_results_df, companies, lookup_df)
+        
+        # 社名ベースでマージ（元データの詳細列は索引に結合済み）
+        merged_df = self.join_lookup(call_results_df, right_rows, lookup_df, has_call_time)
+        
+        return self.finalize_merged(merged_df, has_call_time)
+    
+    def merge_with_index(self, call_results_df):
+        """全ジョブ横断の行索引で振り分けてから元データとマージ（社名ベース）"""
+        call_results_df, companies, has_call_time = self.prepare_call_results(call_results_df)
+        
+        # 結果に含まれる社名だけを索引から引き、どのジョブの行かを特定
+        routed_df = self.row_index.lookup_companies(companies[1])
+        
+        # 振り分け先ジョブの詳細列をまとめて取得
+        detail_frames = []
+        for job_id in routed_df['job_id'].unique():
+            job_dir = self.base_dir / job_id
+            with open(job_dir / "manifest.json", 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            lookup_df = self.load_merge_lookup(job_dir, manifest)
+            detail_columns = [col for col in ORIGINAL_DETAIL_COLUMNS if col in lookup_df.columns]
+            if detail_columns:
+                details = lookup_df[['fm_id'] + detail_columns].drop_duplicates('fm_id')
+                detail_frames.append(details.assign(job_id=job_id))
+        if detail_frames:
+            routed_df = pd.merge(routed_df, pd.concat(detail_frames, ignore_index=True), on=['job_id', 'fm_id'], how='left')
+        
+        # 振り分けは完全一致のみ（全ジョブの社名を候補にするあいまい一致は行わない）。
+        # 複数のジョブに同じ社名がある場合も電話番号で1行に決まらなければ結合しない
+        call_results_df, right_rows = self.link_lookup(call_results_df, companies, routed_df, fuzzy=False)
+        merged_df = self.join_lookup(call_results_df, right_rows, routed_df, has_call_time)
+        
+        return self.finalize_merged(merged_df, has_call_time)
+    
+    def index_existing_jobs(self):
+        """行索引に未登録の既存ジョブをrowmapから登録"""
+        indexed_jobs = self.row_index.job_ids()
+        for manifest_path in sorted(self.base_dir.glob("*/manifest.json")):
+            job_dir = manifest_path.parent
+            if job_dir.name in indexed_jobs:
+                continue
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            lanes = manifest.get('files', {}).get('lanes') or [{'rowmap': 'rowmap.csv'}]
+            rowmap_paths = [job_dir / lane['rowmap'] for lane in lanes if (job_dir / lane['rowmap']).exists()]
+            if rowmap_paths:
+                rowmap_df = pd.concat([pd.read_csv(path) for path in rowmap_paths], ignore_index=True)
+                self.row_index.add_job(job_dir.name, rowmap_df, self.normalize_phone_series(rowmap_df['phone']))
+    
+    def run_analysis(self, results_file, job_id=None, progress=None):
+        """結果CSVの分析・統計・マージを実行（job_id が None なら全ジョブから振り分け）"""
+        profiler = StageProfiler()
+        # 横断分析用の蓄積は pyarrow がある場合のみ（ファイル名は結果ファイルの内容で決め、同じファイルの再分析は置き換え）
+        source_id = self.archive_source_id(results_file) if self.call_archive.available() else None
+        if job_id is not None:
+            # ジョブ指定の分析は前回の分析状態との差分だけを処理
+            # 同じジョブへの分析が並行しても前回の状態を読み書きするのは一度に1つ
+            with self._analysis_locked(job_id):
+                analysis = self.run_incremental_analysis(results_file, job_id, progress=progress, profiler=profiler, archive_source_id=source_id)
+        else:
+            # 統計はレーンが分かるマージ後に集計
+            analyzed_df = self.analyze_results_file(
+                results_file,
+                progress=(lambda fraction, message: progress(fraction * 0.8, message)) if progress else None,
+                profiler=profiler
+            )
+            if progress:
+                progress(0.8, "元データとマージ中")
+            merged_df = self.merge_with_index(analyzed_df)
+            profiler.lap('merge', len(analyzed_df))
+            stats = self.calculate_statistics(merged_df)
+            profiler.lap('statistics', len(merged_df))
+            if source_id is not None:
+                self.update_call_archive(merged_df, None, source_id, profiler)
+            analysis = {'stats': stats, 'merged_df': merged_df.drop(columns=MERGED_INTERNAL_COLUMNS, errors='ignore')}
+        
+        analysis['metrics'] = profiler.finish()
+        self.write_metrics(job_id, 'analysis', analysis['metrics'])
+        return analysis
+    
+    def write_metrics(self, job_id, run, metrics):
+        """処理段階ごとの計測結果を計測ログ（JSONL）に追記（ジョブ指定なしは全体のログ。上限を超えたら切り替え）"""
+        log_path = (self.base_dir / job_id if job_id else self.base_dir) / METRICS_LOG_NAME
+        record = {'run': run, 'job_id': job_id, **metrics}
+        with self._metrics_lock:
+            if log_path.exists() and log_path.stat().st_size >= METRICS_LOG_MAX_BYTES:
+                os.replace(log_path, log_path.with_name(log_path.name + ".1"))
+            with open(log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    
+    def read_metrics(self, job_id, limit=20):
+        """計測ログの新しいものから limit 件（ファイルの末尾だけを読む）"""
+        log_path = (self.base_dir / job_id if job_id else self.base_dir) / METRICS_LOG_NAME
+        lines = []
+        # 切り替え直後で足りない分は1世代前のログから補う
+        for path in (log_path, log_path.with_name(log_path.name + ".1")):
+            if len(lines) >= limit:
+                break
+            if path.exists():
+                lines = read_tail_lines(path, limit - len(lines)) + lines
+        return [json.loads(line) for line in reversed(lines) if line.strip()]
+    
+    def combine_hashes(self, hash_arrays):
+        """列ごとのハッシュを行単位のハッシュにまとめる"""
+        combined = np.full(len(hash_arrays[0]), 0x345678, dtype='uint64')
+        for hashes in hash_arrays:
+            combined = (combined * np.uint64(1000003)) ^ hashes
+        return combined
+    
+    def call_row_hashes(self, chunk, seen_counts):
+        """通話行の識別キー（社名・電話番号・架電時刻＋出現順）と行全体の内容ハッシュ"""
+        # 各列のハッシュは1回だけ計算し、キーと内容の両方に使う
+        column_hashes = {col: pd.util.hash_pandas_object(chunk[col], index=False).to_numpy() for col in chunk.columns}
+        missing = np.zeros(len(chunk), dtype='uint64')
+        base = self.combine_hashes([column_hashes.get(col, missing) for col in CALL_KEY_COLUMNS])
+        
+        # 同じ社名・電話番号・架電時刻の行が複数あってもキーが重複しないよう出現順を加える
+        base = pd.Series(base)
+        occurrence = base.groupby(base).cumcount().to_numpy()
+        if seen_counts:
+            occurrence = occurrence + base.map(dict(seen_counts)).fillna(0).to_numpy(dtype='int64')
+        seen_counts.update(base.value_counts().to_dict())
+        keys = self.combine_hashes([base.to_numpy(), occurrence.astype('uint64')])
+        return keys, self.combine_hashes(list(column_hashes.values()))
+    
+    @contextmanager
+    def _analysis_locked(self, job_id):
+        """ジョブの差分分析を排他（プロセス内はジョブごとのスレッドロック、プロセス間はジョブフォルダのファイルロック）"""
+        with self._analysis_locks_guard:
+            job_lock = self._analysis_locks.setdefault(job_id, threading.Lock())
+        with job_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.base_dir / job_id / ANALYSIS_LOCK_NAME, 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+    
+    def load_analysis_state(self, job_id):
+        """ジョブの分析状態（分析済みの行）を読み込み（なし・分類ルールや分析結果の形式の版が違う場合はNone）"""
+        state_path = self.base_dir / job_id / "analysis_state.pkl"
+        if not state_path.exists():
+            return None
+        try:
+            state = pd.read_pickle(state_path)
+        except Exception:
+            return None
+        if state.get('rules_version') != self.get_call_rules().version:
+            return None
+        if state.get('format_version') != ANALYSIS_FORMAT_VERSION:
+            return None
+        return state
+    
+    def save_analysis_state(self, job_id, state):
+        """ジョブの分析状態を保存"""
+        state_path = self.base_dir / job_id / "analysis_state.pkl"
+        tmp_path = unique_tmp_path(state_path)
+        pd.to_pickle(state, tmp_path)
+        os.replace(tmp_path, state_path)
+    
+    def run_incremental_analysis(self, results_file, job_id, chunksize=CSV_CHUNK_ROWS, progress=None, profiler=None, archive_source_id=None):
+        """ジョブの分析済みの行（レーンごとの結果ファイルをまたいで蓄えたもの）と比べて新規・変更のあった行だけを分類・マージし、
+        結果ファイルの行のマージ結果と統計を返す（統計はレーンが分かるマージ結果の行で集計）。
+        archive_source_id を指定すると、新規・変更の行があるか未蓄積の結果ファイルの場合にマージ結果を蓄積"""
+        if profiler is None:
+            profiler = StageProfiler(trace_memory=False)
+        results_file.seek(0, os.SEEK_END)
+        file_size = results_file.tell() or 1
+        results_file.seek(0)
+        
+        state = self.load_analysis_state(job_id)
+        if state is None:
+            # 行のキーは uint64 のまま連結する（空の索引が int64 だと連結で float64 になりキーが丸められる）
+            state = {
+                'row_hashes': pd.Series(dtype='uint64', index=pd.Index([], dtype='uint64')),
+                'merged_df': None,
+                'archived_sources': set()
+            }
+        known_keys = state['row_hashes'].index
+        known_hashes = state['row_hashes'].to_numpy()
+        profiler.lap('load_state', len(known_keys))
+        
+        seen_counts = Counter()
+        key_chunks, kept_chunks, changed_key_chunks, changed_hash_chunks, analyzed_chunks = [], [], [], [], []
+        analyzed_rows = 0
+        for chunk in self.iter_call_result_chunks(results_file, chunksize):
+            profiler.lap('read_csv', len(chunk))
+            # 分析で列が書き換わる前の内容でハッシュを取る
+            keys, hashes = self.call_row_hashes(chunk, seen_counts)
+            positions = known_keys.get_indexer(keys)
+            unchanged = positions >= 0
+            unchanged[unchanged] = known_hashes[positions[unchanged]] == hashes[unchanged]
+            key_chunks.append(keys)
+            kept_chunks.append(keys[unchanged])
+            profiler.lap('hash', len(chunk))
+            
+            if not unchanged.all():
+                changed_key_chunks.append(keys[~unchanged])
+                changed_hash_chunks.append(hashes[~unchanged])
+                analyzed_chunk = self.analyze_call_results(chunk[~unchanged].assign(call_key=keys[~unchanged]))
+                profiler.lap('classify', len(analyzed_chunk))
+                analyzed_chunks.append(analyzed_chunk)
+                analyzed_rows += len(analyzed_chunk)
+            if progress:
+                progress(min(results_file.tell() / file_size, 1.0) * 0.8, f"新規・変更 {analyzed_rows:,} 件を分析済み")
+        profiler.lap('read_csv')
+        
+        all_keys = pd.Index(np.concatenate(key_chunks) if key_chunks else np.array([], dtype='uint64'))
+        kept_keys = np.concatenate(kept_chunks) if kept_chunks else np.array([], dtype='uint64')
+        
+        # 今回のファイルの行は、分析済みの行のうち内容が変わっていないものと新規・変更の行（マージ結果は通話と1対1）
+        merged_frames = []
+        if state['merged_df'] is not None and len(kept_keys):
+            merged_frames.append(state['merged_df'][state['merged_df']['call_key'].isin(kept_keys)])
+        
+        if progress:
+            progress(0.8, "元データとマージ中")
+        new_merged_df = None
+        if analyzed_chunks:
+            new_merged_df = self.merge_with_original(self.concat_frames(analyzed_chunks), job_id)
+            profiler.lap('merge', analyzed_rows)
+            merged_frames.append(new_merged_df)
+        
+        if merged_frames:
+            # 結果ファイルの行順に並べ直す
+            merged_df = self.concat_frames(merged_frames)
+            order = all_keys.get_indexer(merged_df['call_key'])
+            merged_df = merged_df.iloc[np.argsort(order, kind='stable')].reset_index(drop=True)
+            # 旧形式の状態（カテゴリ型でない列）と連結した場合に備えて揃え直す
+            merged_df = self.categorize_columns(merged_df)
+        else:
+            merged_df = pd.DataFrame(columns=['call_key'])
+        profiler.lap('reorder', len(merged_df))
+        stats = self.calculate_statistics(merged_df)
+        profiler.lap('statistics', len(merged_df))
+        
+        if new_merged_df is not None:
+            # 分析済みの行は変更された行だけを置き換え、他の結果ファイル（別レーン）の行は残す
+            changed_keys = np.concatenate(changed_key_chunks)
+            row_hashes = state['row_hashes']
+            state['row_hashes'] = pd.concat([
+                row_hashes[~row_hashes.index.isin(changed_keys)],
+                pd.Series(np.concatenate(changed_hash_chunks), index=changed_keys)
+            ])
+            if state['merged_df'] is None:
+                state['merged_df'] = new_merged_df
+            else:
+                state['merged_df'] = self.concat_frames([
+                    state['merged_df'][~state['merged_df']['call_key'].isin(changed_keys)],
+                    new_merged_df
+                ])
+        
+        # 同じ内容のファイルを蓄積済みなら蓄積・状態の書き直しは不要
+        archive = archive_source_id is not None and (analyzed_rows or archive_source_id not in state['archived_sources'])
+        if archive and self.update_call_archive(merged_df, job_id, archive_source_id, profiler):
+            state['archived_sources'].add(archive_source_id)
+        if analyzed_rows or archive:
+            self.save_analysis_state(job_id, {
+                **state,
+                'rules_version': self.get_call_rules().version,
+                'format_version': ANALYSIS_FORMAT_VERSION
+            })
+            profiler.lap('save_state', len(state['row_hashes']))
+        return {
+            'stats': stats,
+            'merged_df': merged_df.drop(columns=MERGED_INTERNAL_COLUMNS, errors='ignore'),
+            'analyzed_rows': analyzed_rows
+        }
+    
+    def analysis_cache_key(self, results_digest, job_id):
+        """分析結果のキャッシュキー（結果ファイルの内容・ジョブ・分類ルールと分析結果の形式の版）"""
+        if job_id is None:
+            # 全ジョブ振り分けは索引の更新で結果が変わるため索引の版も含める
+            job_id = f"*@{self.row_index.version()}"
+        return f"{job_id}:{results_digest}:{self.get_call_rules().version}:{ANALYSIS_FORMAT_VERSION}"
+    
+    def _analysis_cache_path(self, analysis_key):
+        return self.analysis_cache_dir / f"{hashlib.sha256(analysis_key.encode('utf-8')).hexdigest()}.pkl"
+    
+    def has_cached_analysis(self, analysis_key):
+        """分析結果がディスクにキャッシュ済みか"""
+        return self._analysis_cache_path(analysis_key).exists()
+    
+    def load_cached_analysis(self, analysis_key):
+        """ディスクにキャッシュした分析結果を読み込み（なければNone）"""
+        cache_path = self._analysis_cache_path(analysis_key)
+        if not cache_path.exists():
+            return None
+        os.utime(cache_path)
+        return pd.read_pickle(cache_path)
+    
+    def save_cached_analysis(self, analysis_key, analysis):
+        """分析結果をディスクにキャッシュし、古いものから上限件数まで削除"""
+        cache_path = self._analysis_cache_path(analysis_key)
+        tmp_path = unique_tmp_path(cache_path)
+        pd.to_pickle(analysis, tmp_path)
+        os.replace(tmp_path, cache_path)
+        
+        cache_files = sorted(self.analysis_cache_dir.glob("*.pkl"), key=lambda path: path.stat().st_mtime, reverse=True)
+        for old_file in cache_files[ANALYSIS_DISK_CACHE_FILES:]:
+            old_file.unlink(missing_ok=True)
+    
+    def available_export_backends(self):
+        """利用可能な出力形式（必要なライブラリがインストール済みのもの）"""
+        return [
+            backend for backend, info in EXPORT_BACKENDS.items()
+            if info['requires'] is None or importlib.util.find_spec(info['requires']) is not None
+        ]
+    
+    def export_results(self, merged_df, backend=DEFAULT_EXPORT_BACKEND):
+        """分析結果を指定の形式でバイト列に書き出し"""
+        buffer = BytesIO()
+        if backend in ('xlsx_xlsxwriter', 'xlsx_openpyxl'):
+            header = [str(col) for col in merged_df.columns]
+            rows = merged_df.astype(object).where(merged_df.notna(), None).itertuples(index=False, name=None)
+            if backend == 'xlsx_xlsxwriter':
+                # 行を書いたそばから一時ファイルに流すためメモリ使用量が一定（行順に書く必要がある）
+                import xlsxwriter
+                workbook = xlsxwriter.Workbook(buffer, {'constant_memory': True})
+                worksheet = workbook.add_worksheet(EXPORT_SHEET_NAME)
+                worksheet.write_row(0, 0, header)
+                for row_number, row in enumerate(rows, start=1):
+                    worksheet.write_row(row_number, 0, row)
+                workbook.close()
+            else:
+                # 書き込み専用モードでセルオブジェクトを保持せずに追記（起動を軽くするため使う時に読み込む）
+                import openpyxl
+                workbook = openpyxl.Workbook(write_only=True)
+                worksheet = workbook.create_sheet(EXPORT_SHEET_NAME)
+                worksheet.append(header)
+                for row in rows:
+                    worksheet.append(row)
+                workbook.save(buffer)
+        elif backend == 'csv':
+            merged_df.to_csv(buffer, index=False, encoding='utf-8-sig')
+        elif backend == 'parquet':
+            merged_df.to_parquet(buffer, index=False)
+        else:
+            raise ValueError(f"未知の出力形式: {backend}")
+        return buffer.getvalue()
+    
+    def archive_source_id(self, results_file):
+        """蓄積のファイル名に使う結果ファイルの識別子（内容のハッシュ）"""
+        results_file.seek(0)
+        digest = hashlib.file_digest(results_file, 'sha256').hexdigest()[:16]
+        results_file.seek(0)
+        return digest
+    
+    def archive_analysis(self, merged_df, job_id, source_id):
+        """マージ結果（レーン列つき）の通話と日別集計を蓄積に書き出し、書いたファイル数を返す
+        （同じ結果ファイルの前回分と、通話がすべて今回に含まれる他の結果ファイル分を置き換え。
+        job_id が None なら行ごとの振り分け先ジョブに分ける）"""
+        if merged_df.empty:
+            # 通話がなければ前回の分を削除するだけ
+            return self.call_archive.write({}, source_id, job_id)
+        if job_id is not None:
+            merged_df = merged_df.assign(job_id=job_id)
+        elif 'job_id' not in merged_df.columns:
+            merged_df = merged_df.assign(job_id=np.nan)
+        dates, _ = self.call_time_parts(merged_df)
+        
+        calls = merged_df.drop(columns=['job_id'] + MERGED_INTERNAL_COLUMNS, errors='ignore')
+        if 'lane' in merged_df.columns:
+            calls['レーン'] = merged_df['lane'].astype('Int64')
+        # 通話キーは分析の経路（差分・全ジョブ振り分け）によらず同じになるよう、蓄積する列から付け直す
+        key_columns = calls[[col for col in ARCHIVE_CALL_KEY_COLUMNS if col in calls.columns]].astype(object).fillna("")
+        calls['call_key'], _ = self.call_row_hashes(key_columns, Counter())
+        calls = calls[[col for col in ARCHIVE_CALL_COLUMNS if col in calls.columns]]
+        
+        # 日別集計は元データの詳細列も軸にして、架電日・ジョブごとに分けて保存
+        rollup = self.calculate_statistics(merged_df, dimensions=ARCHIVE_ROLLUP_DIMENSIONS + ['job_id'])['rollup']
+        return self.call_archive.write({
+            'calls': (calls, self.call_archive.partition_groups(dates, merged_df['job_id'])),
+            'rollups': (rollup.drop(columns=['job_id']), self.call_archive.partition_groups(rollup['架電日'], rollup['job_id']))
+        }, source_id, job_id, call_keys=calls['call_key'].to_numpy())
+    
+    def update_call_archive(self, merged_df, job_id, source_id, profiler):
+        """分析結果を蓄積に反映し、蓄積できたかを返す（蓄積に失敗しても分析結果はそのまま返す）"""
+        try:
+            self.archive_analysis(merged_df, job_id, source_id)
+        except Exception as e:
+            logger.error("分析済み通話の蓄積エラー: %s", e)
+            return False
+        profiler.lap('archive', len(merged_df))
+        return True
+    
+    def query_call_archive(self, dimensions, start_date, end_date, job_ids=None):
+        """蓄積した日別集計を期間（YYYY-MM-DD、両端を含む）・ジョブで絞り、軸ごとの件数とAPO率（％）を返す
+        （読み込むのは該当する区分のファイルの、軸と件数の列のみ）"""
+        unknown = [col for col in dimensions if col not in ARCHIVE_QUERY_DIMENSIONS]
+        if unknown:
+            raise ValueError(f"集計できない軸: {', '.join(unknown)}")
+        rollup = self.call_archive.read('rollups', list(dimensions) + STAT_ROLLUP_MEASURES, start_date, end_date, job_ids)
+        table = rollup.groupby(list(dimensions), dropna=False)[STAT_ROLLUP_MEASURES].sum().reset_index()
+        table['apo_rate'] = (table['transfer_calls'] / table['valid_calls'].where(table['valid_calls'] > 0) * 100).round(1)
+        return table
+    
+    def read_archived_calls(self, columns, start_date, end_date, job_ids=None):
+        """蓄積した通話を期間（YYYY-MM-DD、両端を含む）・ジョブで絞り、指定の列だけ読み込み"""
+        return self.call_archive.read('calls', columns, start_date, end_date, job_ids)
+    
+    def call_time_parts(self, df):
+        """集計軸の架電日（YYYY/MM/DD）と時間帯（時）。マージ時に分割済みならその列を使う"""
+        if '架電日' in df.columns and '架電時間' in df.columns:
+            # 時は架電時間の先頭2文字（種類が少ないため数値への変換は値ごとに一度だけ）
+            hour_codes, hour_texts = pd.factorize(df['架電時間'].astype(str).str[:2])
+            hours = pd.to_numeric(pd.Series(hour_texts, dtype=object), errors='coerce').astype('Int64').reindex(hour_codes)
+            return df['架電日'], pd.Series(hours.array, index=df.index)
+        if '架電時刻' in df.columns:
+            # 日付の文字列化は日ごとに一度だけ（変換できない値・欠損は欠損）
+            call_times = pd.to_datetime(df['架電時刻'], errors='coerce')
+            day_codes, days = pd.factorize(call_times.dt.normalize())
+            dates = pd.Categorical.from_codes(day_codes, categories=days.strftime('%Y/%m/%d'))
+            return pd.Series(dates, index=df.index), call_times.dt.hour.astype('Int64')
+        return pd.Series(np.nan, index=df.index, dtype='str'), pd.Series(pd.NA, index=df.index, dtype='Int64')
+    
+    def text_flags(self, values, predicate):
+        """文字列の列に列単位の判定を適用（カテゴリ型はカテゴリごとに一度だけ判定して行に展開、欠損は False）"""
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # 欠損（コード -1）は末尾の False を参照
+            flags = np.append(predicate(pd.Series(values.cat.categories, dtype=object).astype(str)).fillna(False).to_numpy(dtype=bool), False)
+            return pd.Series(flags[values.cat.codes.to_numpy()], index=values.index)
+        return predicate(values).fillna(False).astype(bool)
+    
+    def calculate_statistics(self, df, dimensions=STAT_ROLLUP_DIMENSIONS):
+        """統計を計算（架電日・時間帯・ステータス・架電結果・レーンの組ごとの件数を1回の groupby で集計し、全体の数値はそこから求める。
+        dimensions に他の列を加えるとその列の値ごとにも分けて集計）"""
+        # 通話時間の秒数は分析時に計算済みであれば再利用
+        if "通話時間_num" in df.columns:
+            duration_sec = df["通話時間_num"]
+        else:
+            duration_sec = self.parse_durations(self.column_or_blank(df, "通話時間"))
+        results = self.column_or_blank(df, "架電結果")
+        status = self.column_or_blank(df, "ステータス")
+        dates, hours = self.call_time_parts(df)
+        
+        # 行ごとの判定はすべて列単位（カテゴリ型の列はカテゴリごとに判定）
+        flags = pd.DataFrame({
+            '架電日': dates,
+            '時間帯': hours,
+            'ステータス': status,
+            '架電結果': results,
+            # レーンはマージ結果の行にのみある（未結合・マージ前は欠損）
+            'レーン': df['lane'].astype('Int64') if 'lane' in df.columns else pd.Series(pd.NA, index=df.index, dtype='Int64'),
+            'total_calls': 1,
+            'valid_calls': ~results.isin(["留守", "留守番電話"]),
+            'total_time_sec': duration_sec,
+            'transfer_calls': self.text_flags(results, lambda text: text.str.contains("APO", regex=False)),
+            # 無効番号（数字だけにすると0始まりの10〜11桁にならないもの。数字以外を除かずに1回の照合で判定）
+            'invalid_numbers': ~self.column_or_blank(df, "電話番号").astype(str).str.fullmatch(r"\D*0(?:\D*\d){9,10}\D*", na=False),
+            # エラー件数（ステータスか要約に「エラー」を含む）
+            'error_calls': self.text_flags(status, lambda text: text.str.contains("エラー", regex=False))
+                           | self.text_flags(self.column_or_blank(df, "要約"), lambda text: text.str.contains("エラー", regex=False)),
+        }, index=df.index)
+        for col in dimensions:
+            if col not in flags.columns:
+                flags[col] = df[col] if col in df.columns else pd.Series(np.nan, index=df.index, dtype='str')
+        rollup = flags.groupby(list(dimensions), sort=False, dropna=False, observed=True)[STAT_ROLLUP_MEASURES].sum().reset_index()
+        # 合算しやすいよう軸の型をカテゴリ型から揃える（時間帯・レーンは整数）
+        rollup = rollup.astype({col: 'str' for col in dimensions if col not in ('時間帯', 'レーン')})
+        return summarize_rollup(rollup.astype({col: 'int64' for col in STAT_ROLLUP_MEASURES}))
+
+class BackgroundJobQueue:
+    """ジョブ作成・結果分析をバックグラウンドで実行するワーカー（状態はジョブ履歴に記録）"""
+    def __init__(self, max_workers=BACKGROUND_WORKERS, task_ttl=BACKGROUND_TASK_TTL_SECONDS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="teleapo-worker")
+        self.tasks = {}
+        self.task_ttl = task_ttl
+        self._lock = threading.Lock()
+    
+    def _prune(self):
+        """終了から task_ttl 秒を過ぎたタスクを破棄（呼び出し側でロックを取る）"""
+        now = time.monotonic()
+        expired = [task_id for task_id, task in self.tasks.items()
+                   if task['finished_at'] is not None and now - task['finished_at'] >= self.task_ttl]
+        for task_id in expired:
+            del self.tasks[task_id]
+    
+    def _submit(self, task_id, fn, *args):
+        with self._lock:
+            self._prune()
+            task = {'progress': 0.0, 'message': "待機中", 'error': None, 'finished_at': None}
+            task['future'] = self.executor.submit(self._run, task, fn, *args)
+            self.tasks[task_id] = task
+        return task
+    
+    def _run(self, task, fn, *args):
+        def report(fraction, message):
+            task['progress'], task['message'] = fraction, message
+        try:
+            return fn(report, *args)
+        except Exception as e:
+            task['error'] = str(e)
+            raise
+        finally:
+            task['finished_at'] = time.monotonic()
+    
+    def is_running(self, task_id):
+        """タスクが待機中または実行中か"""
+        task = self.tasks.get(task_id)
+        return task is not None and not task['future'].done()
+    
+    def get_task(self, task_id):
+        """タスクの進捗（progress, message, error。終了から時間が経ったタスクはNone）"""
+        with self._lock:
+            self._prune()
+            return self.tasks.get(task_id)
+    
+    def submit_job_creation(self, manager, history_manager, job_info, df, original_bytes, original_suffix):
+        """ジョブ作成を投入（完了時に状態を 'created' に更新）"""
+        def create(report):
+            job_id = job_info['job_id']
+            
+            def progress(fraction, message):
+                report(fraction, message)
+                history_manager.update_job(job_id, progress=fraction, progress_message=message)
+            
+            try:
+                result = manager.process_filemaker_data(
+                    df, job_id, job_info['output_name'], job_info['robot_count'],
+                    original_bytes=original_bytes, original_suffix=original_suffix, progress=progress
+                )
+            except Exception as e:
+                history_manager.update_job(job_id, status='failed', error=str(e))
+                raise
+            history_manager.update_job(job_id, status='created', total_rows=result['total_rows'], progress=1.0)
+            return result
+        
+        return self._submit(job_info['job_id'], create)
+    
+    def submit_analysis(self, manager, history_manager, analysis_key, results_bytes, job_id):
+        """結果分析を投入（結果はディスクキャッシュに保存し、ジョブの状態を 'analyzed' に更新）"""
+        def analyze(report):
+            previous_status = None
+            if job_id is not None:
+                job = history_manager.get_job(job_id)
+                previous_status = job.get('status') if job else None
+                history_manager.update_job(job_id, status='analyzing', progress=0.0, progress_message="分析中")
+            
+            def progress(fraction, message):
+                report(fraction, message)
+                if job_id is not None:
+                    history_manager.update_job(job_id, progress=fraction, progress_message=message)
+            
+            try:
+                analysis = manager.run_analysis(BytesIO(results_bytes), job_id, progress=progress)
+                manager.save_cached_analysis(analysis_key, analysis)
+            except Exception as e:
+                if job_id is not None:
+                    history_manager.update_job(job_id, status=previous_status or 'created', error=str(e))
+                raise
+            if job_id is not None:
+                history_manager.update_job(job_id, status='analyzed', progress=1.0, progress_message="分析完了")
+            report(1.0, "分析完了")
+        
+        return self._submit(analysis_key, analyze)
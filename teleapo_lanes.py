@@ -0,0 +1,32 @@
+"""レーン別ファイルの書き出し
+
+プロセスプールのワーカーから呼び出すため、Streamlitに依存しないモジュールに分けている
+（Streamlitが実行するスクリプトは子プロセスからimportできないため）。
+"""
+
+
+def split_lanes(total_rows, lane_count):
+    """行数をレーン数で均等に分割した (開始, 終了) の一覧を返す"""
+    lane_count = max(1, min(lane_count, total_rows)) if total_rows else 1
+    base, extra = divmod(total_rows, lane_count)
+    ranges = []
+    start = 0
+    for lane in range(lane_count):
+        end = start + base + (1 if lane < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def write_lane_files(lane, upload_df, rowmap_df, upload_path, rowmap_path, encoding='cp932'):
+    """1レーン分のアップロード用CSVとrowmapを書き出す（表せない文字は置き換え済みのため1回で書き出す）"""
+    rowmap_df.to_csv(rowmap_path, index=False)
+    upload_df.to_csv(upload_path, index=False, encoding=encoding)
+    
+    return {
+        'lane': lane,
+        'rows': len(upload_df),
+        'upload': upload_path.name,
+        'rowmap': rowmap_path.name,
+        'encoding': encoding
+    }
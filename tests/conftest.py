@@ -0,0 +1,15 @@
+"""テスト共通の設定（リポジトリ直下のモジュールを読み込めるようにし、ジョブ等は一時ディレクトリに作る）"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    """一時ディレクトリを作業ディレクトリにした AITeleapoManager"""
+    from teleapo_core import AITeleapoManager
+    monkeypatch.chdir(tmp_path)
+    return AITeleapoManager()
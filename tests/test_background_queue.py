@@ -0,0 +1,30 @@
+"""バックグラウンドワーカーのタスク管理（終了したタスクの破棄）の確認"""
+from teleapo_core import BackgroundJobQueue
+
+
+def test_finished_tasks_are_pruned_after_ttl():
+    queue = BackgroundJobQueue(max_workers=1, task_ttl=0)
+    task = queue._submit("task", lambda report: report(1.0, "完了"))
+    task['future'].result()
+    assert not queue.is_running("task")
+    assert queue.get_task("task") is None
+    assert queue.tasks == {}
+
+
+def test_tasks_are_kept_until_ttl():
+    queue = BackgroundJobQueue(max_workers=1, task_ttl=600)
+    task = queue._submit("task", lambda report: report(1.0, "完了"))
+    task['future'].result()
+    assert queue.get_task("task")['message'] == "完了"
+    queue._submit("other", lambda report: None)['future'].result()
+    assert set(queue.tasks) == {"task", "other"}
+
+
+def test_failed_task_keeps_error_until_ttl():
+    def fail(report):
+        raise ValueError("失敗")
+    
+    queue = BackgroundJobQueue(max_workers=1, task_ttl=600)
+    task = queue._submit("task", fail)
+    assert task['future'].exception() is not None
+    assert queue.get_task("task")['error'] == "失敗"
@@ -0,0 +1,88 @@
+"""分析済み通話の蓄積（結果ファイルごとの置き換え）の確認"""
+from io import BytesIO
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+JOB_ROWS = 200
+
+
+def filemaker_df(rows=range(JOB_ROWS)):
+    """FileMaker の rows 行目の会社の出力"""
+    rows = list(rows)
+    return pd.DataFrame({
+        '顧客名': [f"株式会社テスト{i}" for i in rows],
+        '電話番号': [f"03{i:08d}" for i in rows],
+        '住所統合': ["東京都千代田区1-1"] * len(rows),
+        'IDの頭にID': [f"ID{i:07d}" for i in rows],
+        '最終トーク判定': ["A"] * len(rows),
+        '最終有効無効': ["有効"] * len(rows),
+        '最終決済担当': ["山田"] * len(rows),
+    })
+
+
+def results_file(rows):
+    """FileMaker の rows 行目に架電した結果CSV"""
+    return BytesIO(pd.DataFrame({
+        '社名': [f"株式会社テスト{i}" for i in rows],
+        '電話番号': [f"03{i:08d}" for i in rows],
+        '架電時刻': [f"2026-10-{1 + i % 3:02d} 10:{i % 60:02d}:00" for i in rows],
+        'ステータス': ["通話完了"] * len(rows),
+        '架電結果': [""] * len(rows),
+        '要約': ["了承しました"] * len(rows),
+        '通話時間': ["1:00"] * len(rows),
+    }).to_csv(index=False).encode('cp932'))
+
+
+def create_job(manager, job_id, rows=range(JOB_ROWS)):
+    manager.process_filemaker_data(filemaker_df(rows), job_id, job_id, robot_count=2, original_bytes=b"")
+
+
+def archived_calls(manager, job_ids=None):
+    return manager.read_archived_calls(['fm_id'], "2026-10-01", "2026-10-31", job_ids)
+
+
+def test_result_files_of_one_job_are_kept_side_by_side(manager):
+    # レーンごとの結果ファイルを別々に分析しても、互いの分を消さない
+    create_job(manager, "JOB1")
+    manager.run_analysis(results_file(range(0, 100)), "JOB1")
+    manager.run_analysis(results_file(range(100, 200)), "JOB1")
+    assert len(archived_calls(manager)) == 200
+
+    # 同じファイルの再分析はそのファイル分だけを置き換える
+    manager.run_analysis(results_file(range(0, 100)), "JOB1")
+    assert len(archived_calls(manager)) == 200
+
+
+def test_same_result_file_in_other_jobs_is_kept(manager):
+    create_job(manager, "JOB1")
+    create_job(manager, "JOB2")
+    manager.run_analysis(results_file(range(0, 150)), "JOB1")
+    manager.run_analysis(results_file(range(0, 150)), "JOB2")
+    manager.run_analysis(results_file(range(0, 150)), None)
+    assert len(archived_calls(manager, ["JOB1"])) == 150
+    assert len(archived_calls(manager, ["JOB2"])) == 150
+
+
+def test_appended_result_file_supersedes_previous_one(manager):
+    # 前回の通話をすべて含む（追記された）結果ファイルは前回のファイル分を置き換える
+    create_job(manager, "JOB1")
+    manager.run_analysis(results_file(range(0, 100)), "JOB1")
+    manager.run_analysis(results_file(range(100, 150)), "JOB1")
+    manager.run_analysis(results_file([*range(0, 100), *range(150, 170)]), "JOB1")
+    assert sorted(archived_calls(manager)['fm_id']) == [f"ID{i:07d}" for i in range(170)]
+    assert manager.query_call_archive(['job_id'], "2026-10-01", "2026-10-31")['total_calls'].sum() == 170
+
+
+def test_routed_reanalysis_after_new_job_replaces_previous_parts(manager):
+    # 振り分け先のなかった通話が、ジョブ作成後の再分析で新しいジョブに移っても前回の分が残らない
+    create_job(manager, "JOB1", range(0, 100))
+    manager.run_analysis(results_file(range(0, 200)), None)
+    assert len(archived_calls(manager, ["unrouted"])) == 100
+    create_job(manager, "JOB2", range(100, 200))
+    manager.run_analysis(results_file(range(0, 200)), None)
+    assert len(archived_calls(manager)) == 200
+    assert len(archived_calls(manager, ["unrouted"])) == 0
+    assert manager.query_call_archive(['job_id'], "2026-10-01", "2026-10-31")['total_calls'].sum() == 200
@@ -0,0 +1,59 @@
+"""分類ルールの版（ルールファイルの内容の変更で分析キャッシュと前回状態が無効になること）の確認"""
+import json
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from teleapo_core import ANALYSIS_FORMAT_VERSION, RULES_PATH, AITeleapoManager
+
+
+@pytest.fixture
+def rules_manager(tmp_path, monkeypatch):
+    """ルールファイルの写しを使う AITeleapoManager"""
+    monkeypatch.chdir(tmp_path)
+    rules_path = tmp_path / "call_rules.json"
+    shutil.copy(RULES_PATH, rules_path)
+    return AITeleapoManager(rules_path=rules_path)
+
+
+def edit_rules_without_version_bump(rules_path):
+    """「転送・了承」ルールに語を足す（version は書き換えない）"""
+    definition = json.loads(rules_path.read_text(encoding='utf-8'))
+    for rule in definition['rules']:
+        if rule['name'] == "転送・了承":
+            rule['summary_contains'].append("検討")
+    rules_path.write_text(json.dumps(definition, ensure_ascii=False), encoding='utf-8')
+    # 同じ時刻の刻みで書き換わっても読み直されるよう更新時刻を進める
+    stat = rules_path.stat()
+    os.utime(rules_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_rules_edit_without_version_bump_changes_version(rules_manager):
+    before = rules_manager.get_call_rules().version
+    cache_key = rules_manager.analysis_cache_key("digest", "job")
+    edit_rules_without_version_bump(rules_manager.rules_path)
+
+    after = rules_manager.get_call_rules().version
+    assert after != before
+    assert after.split("+")[0] == before.split("+")[0]
+    assert rules_manager.analysis_cache_key("digest", "job") != cache_key
+    calls = pd.DataFrame({
+        '社名': ["株式会社テスト"], '電話番号': ["0312345678"], '架電時刻': ["2026-10-01 10:00:00"],
+        'ステータス': ["通話完了"], '架電結果': [""], '要約': ["検討します"], '通話時間': ["1:00"]
+    })
+    assert rules_manager.analyze_call_results(calls)['架電結果'].iloc[0] == "AI電話APO"
+
+
+def test_rules_edit_without_version_bump_discards_analysis_state(rules_manager):
+    job_dir = rules_manager.base_dir / "job"
+    job_dir.mkdir(parents=True, exist_ok=True)
+    rules_manager.save_analysis_state("job", {
+        'rules_version': rules_manager.get_call_rules().version,
+        'format_version': ANALYSIS_FORMAT_VERSION,
+    })
+    assert rules_manager.load_analysis_state("job") is not None
+
+    edit_rules_without_version_bump(rules_manager.rules_path)
+    assert rules_manager.load_analysis_state("job") is None
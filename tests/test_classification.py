@@ -0,0 +1,139 @@
+"""架電結果の分類・通話時間の変換が、列単位化する前の行ごとのループと同じ結果になることの確認"""
+import numpy as np
+import pandas as pd
+import pytest
+
+# 列単位化する前の分類（iterrows のループ）をそのまま残した参照実装
+LEGACY_NG_WORDS = [
+    "断り", "不要", "必要ない", "結構です", "結構",
+    "電話が終了", "電話を切った", "切断", "応答なし", "応答無し",
+    "切られ", "切られる", "切った", "通話が終了", "会話が終了",
+    "進展しない", "通話を終了", "進まなかった", "切りました", "断念",
+    "終了", "成立しなかった", "切", "進展はありま"
+]
+
+
+def legacy_parse_duration_to_seconds(val):
+    if pd.isna(val):
+        return 0
+    val = str(val).strip()
+    if val in ["", "-", "nan"]:
+        return 0
+    parts = val.split(":")
+    try:
+        if len(parts) == 3:  # hh:mm:ss
+            h, m, s = map(int, parts)
+            return h*3600 + m*60 + s
+        elif len(parts) == 2:  # mm:ss
+            m, s = map(int, parts)
+            return m*60 + s
+        else:
+            return int(val)  # 秒数
+    except:
+        return 0
+
+
+def legacy_analyze_call_results(df):
+    df["通話時間_num"] = df["通話時間"].apply(legacy_parse_duration_to_seconds)
+    for idx, row in df.iterrows():
+        status = str(row["ステータス"])
+        result = str(row["架電結果"]) if pd.notna(row["架電結果"]) else ""
+        summary = str(row["要約"]) if pd.notna(row["要約"]) else ""
+        duration = row["通話時間_num"]
+
+        if result.strip() != "" and result.strip() != "nan":
+            continue
+        if status.strip() == "留守番電話":
+            df.at[idx, "架電結果"] = "留守電"
+            continue
+        if status.strip() in ["応答なし", "応答無し"]:
+            df.at[idx, "架電結果"] = "留守"
+            continue
+        if status.strip() == "獲得":
+            df.at[idx, "架電結果"] = "AI電話APO"
+            continue
+        if any(word in summary for word in LEGACY_NG_WORDS):
+            df.at[idx, "架電結果"] = "NG"
+            continue
+        if pd.isna(duration) or duration == 0:
+            df.at[idx, "架電結果"] = "留守"
+            continue
+        if status.strip() == "自動音声":
+            df.at[idx, "架電結果"] = "留守電"
+            continue
+        if any(x in summary for x in ["応答なし", "応答無し"]):
+            df.at[idx, "架電結果"] = "留守"
+            continue
+        if any(x in summary for x in ["転送された", "了承しました", "転送されました"]):
+            df.at[idx, "架電結果"] = "AI電話APO"
+            continue
+        if pd.notna(duration) and duration > 0 and not any(x in summary for x in ["転送"]):
+            df.at[idx, "架電結果"] = "NG"
+    return df
+
+
+STATUSES = ["留守番電話", "応答なし", "応答無し", "獲得", "自動音声", "通話完了", "エラー", " 獲得 ", "留守番電話　", "", " ", "nan", None, np.nan]
+SUMMARY_PARTS = ["担当者に転送された", "了承しました", "転送されました", "転送の件", "不要とのこと", "応答なし", "応答無し",
+                 "切", "結構", "進展はありま", "折り返し希望", "資料送付", "", " ", "nan"]
+DURATIONS = ["0", "00:00", "0:00:00", "1:05", "12:34", "1:02:03", "45", " 30 ", "+5", "-3", "１２", "٣", "1_0", "１:０２",
+             "1:", ":30", "1:2:3:4", "12.5", "abc", "-", "", " ", "nan", None, np.nan]
+RESULTS = [None, np.nan, "", " ", "nan", " nan ", "NG", " AI電話APO ", "留守"]
+
+
+def random_call_results(rows, seed):
+    """ステータス・要約・通話時間・架電結果を欠損や表記ゆれを含めてランダムに組み合わせた結果CSV相当"""
+    rng = np.random.default_rng(seed)
+    pick = lambda values, p=None: [values[i] for i in rng.choice(len(values), rows, p=p)]
+    summaries = [
+        "".join(pick_parts) if rng.random() > 0.1 else np.nan
+        for pick_parts in (rng.choice(SUMMARY_PARTS, rng.integers(0, 3)) for _ in range(rows))
+    ]
+    result_weights = np.array([8, 8, 4, 2, 2, 1, 2, 1, 1], dtype=float)
+    return pd.DataFrame({
+        '社名': [f"株式会社テスト{i}" for i in range(rows)],
+        '電話番号': pick(["03-1234-5678", "+81 90 1234 5678", None]),
+        'ステータス': pick(STATUSES),
+        '要約': summaries,
+        '通話時間': pick(DURATIONS),
+        '架電結果': pick(RESULTS, result_weights / result_weights.sum()),
+    })
+
+
+def as_comparable(values):
+    """欠損を None に揃えた Python の値のリスト"""
+    values = values.astype(object)
+    return values.where(values.notna(), None).tolist()
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_classification_matches_legacy_loop(manager, seed):
+    df = random_call_results(3000, seed)
+    expected = legacy_analyze_call_results(df.copy())
+    actual = manager.analyze_call_results(df.copy())
+
+    assert actual["通話時間_num"].tolist() == expected["通話時間_num"].tolist()
+    assert as_comparable(actual["架電結果"]) == as_comparable(expected["架電結果"])
+
+
+def test_prefilled_results_are_kept(manager):
+    df = pd.DataFrame({
+        '社名': ["a", "b", "c", "d"], '電話番号': ["0312345678"] * 4,
+        'ステータス': ["獲得"] * 4, '要約': [np.nan] * 4, '通話時間': ["1:00"] * 4,
+        '架電結果': ["NG", " 留守 ", "nan", np.nan],
+    })
+    actual = manager.analyze_call_results(df)
+    assert as_comparable(actual["架電結果"]) == ["NG", " 留守 ", "AI電話APO", "AI電話APO"]
+
+
+def test_all_missing_results_column(manager):
+    df = pd.DataFrame({
+        '社名': ["a", "b"], '電話番号': ["0312345678", "0312345679"], 'ステータス': ["応答なし", np.nan],
+        '要約': ["", "断りの連絡"], '通話時間': [np.nan, "0:30"], '架電結果': [np.nan, np.nan],
+    })
+    actual = manager.analyze_call_results(df)
+    assert as_comparable(actual["架電結果"]) == ["留守", "NG"]
+
+
+@pytest.mark.parametrize("value", DURATIONS)
+def test_duration_parsing_matches_int(manager, value):
+    assert manager.parse_durations(pd.Series([value], dtype=object)).tolist() == [legacy_parse_duration_to_seconds(value)]
@@ -0,0 +1,39 @@
+"""ダウンロードキャッシュ（mmap の開閉と読み込み）の確認"""
+import pytest
+
+from teleapo_core import DownloadCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DownloadCache(tmp_path / "download_cache")
+
+
+def test_open_entry_closes_mapping_on_exit(cache):
+    cache.put("a:csv", b"abc" * 1000, "result.csv")
+    with cache.open_entry("a:csv") as cached:
+        view = cached['data']
+        assert cached['filename'] == "result.csv"
+        assert view[:3] == b"abc"
+        assert len(view) == 3000
+    # with を抜けると memoryview は解放され、中身は参照できない
+    with pytest.raises(ValueError):
+        view.tobytes()
+
+
+def test_open_entry_missing_and_empty(cache):
+    with cache.open_entry("missing") as cached:
+        assert cached is None
+    cache.put("empty:csv", b"", "empty.csv")
+    with cache.open_entry("empty:csv") as cached:
+        assert cached['data'].tobytes() == b""
+    assert cache.usage()['hits'] == 1
+    assert cache.usage()['misses'] == 1
+
+
+def test_read_download_file_returns_bytes(manager):
+    from teleapo_core import JobHistoryManager
+    history_manager = JobHistoryManager()
+    assert history_manager.read_download_file("a:csv") is None
+    history_manager.save_download_file("a:csv", b"data", "result.csv")
+    assert history_manager.read_download_file("a:csv") == b"data"
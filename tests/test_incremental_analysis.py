@@ -0,0 +1,94 @@
+"""ジョブ指定の差分分析（分析済みの行の再利用と、全件の分析との一致）の確認"""
+from io import BytesIO
+
+import pandas as pd
+import pandas.testing as tm
+
+JOB_ROWS = 200
+
+
+def filemaker_df():
+    return pd.DataFrame({
+        '顧客名': [f"株式会社テスト{i}" for i in range(JOB_ROWS)],
+        '電話番号': [f"03{i:08d}" for i in range(JOB_ROWS)],
+        '住所統合': ["東京都千代田区1-1"] * JOB_ROWS,
+        'IDの頭にID': [f"ID{i:07d}" for i in range(JOB_ROWS)],
+        '最終トーク判定': ["A", "B"] * (JOB_ROWS // 2),
+        '最終有効無効': ["有効"] * JOB_ROWS,
+        '最終決済担当': ["山田", "佐藤"] * (JOB_ROWS // 2),
+    })
+
+
+def results_df(rows):
+    """FileMaker の rows 行目に架電した結果"""
+    summaries = ["了承しました", "不要とのことです", "担当者不在", ""]
+    return pd.DataFrame({
+        '社名': [f"株式会社テスト{i}" for i in rows],
+        '電話番号': [f"03{i:08d}" for i in rows],
+        '架電時刻': [f"2026-10-{1 + i % 3:02d} {9 + i % 8:02d}:{i % 60:02d}:00" for i in rows],
+        'ステータス': ["通話完了" if i % 5 else "留守番電話" for i in rows],
+        '架電結果': [""] * len(rows),
+        '要約': [summaries[i % 4] for i in rows],
+        '通話時間': [f"{i % 3}:{i % 60:02d}" for i in rows],
+    })
+
+
+def to_file(df):
+    return BytesIO(df.to_csv(index=False).encode('cp932'))
+
+
+def create_jobs(manager, *job_ids):
+    for job_id in job_ids:
+        manager.process_filemaker_data(filemaker_df(), job_id, job_id, robot_count=2, original_bytes=b"")
+
+
+def assert_same_as_full_analysis(manager, df, incremental):
+    # 分析状態のない別のジョブ（同じ元データ）で全件を分析した結果と同じ
+    full = manager.run_analysis(to_file(df), "FULL")
+    manager.base_dir.joinpath("FULL", "analysis_state.pkl").unlink()
+    assert full['analyzed_rows'] == len(df)
+    tm.assert_frame_equal(
+        incremental['merged_df'].drop(columns=['fm_id', 'row_key']).astype(str),
+        full['merged_df'].drop(columns=['fm_id', 'row_key']).astype(str)
+    )
+    tm.assert_frame_equal(incremental['stats']['rollup'], full['stats']['rollup'])
+    assert {k: v for k, v in incremental['stats'].items() if k != 'rollup'} == {k: v for k, v in full['stats'].items() if k != 'rollup'}
+
+
+def test_lane_files_reuse_rows_analyzed_for_the_job(manager):
+    # レーンごとの結果ファイルを交互に分析しても、他のレーンの分析済みの行は消えない
+    create_jobs(manager, "JOB1", "FULL")
+    lane1, lane2 = list(range(0, 100, 2)), list(range(1, 100, 2))
+    assert manager.run_analysis(to_file(results_df(lane1[:45])), "JOB1")['analyzed_rows'] == 45
+    assert manager.run_analysis(to_file(results_df(lane2[:45])), "JOB1")['analyzed_rows'] == 45
+
+    df = results_df(lane1)
+    analysis = manager.run_analysis(to_file(df), "JOB1")
+    assert analysis['analyzed_rows'] == 5
+    assert_same_as_full_analysis(manager, df, analysis)
+
+    df = results_df(lane2)
+    analysis = manager.run_analysis(to_file(df), "JOB1")
+    assert analysis['analyzed_rows'] == 5
+    assert_same_as_full_analysis(manager, df, analysis)
+
+
+def test_edited_removed_and_duplicate_rows_match_full_analysis(manager):
+    create_jobs(manager, "JOB1", "FULL")
+    manager.run_analysis(to_file(results_df(range(100))), "JOB1")
+
+    df = results_df(range(100))
+    df.loc[3, '要約'] = "結構ですと断られました"
+    df.loc[4, 'ステータス'] = "獲得"
+    df = df.drop(index=[10, 11])
+    df = pd.concat([df, df.loc[[20, 20]], results_df([150])], ignore_index=True)
+    analysis = manager.run_analysis(to_file(df), "JOB1")
+    # 変更 2 件・重複 2 件・新規 1 件
+    assert analysis['analyzed_rows'] == 5
+    assert len(analysis['merged_df']) == len(df)
+    assert_same_as_full_analysis(manager, df, analysis)
+
+    # 同じファイルの再分析は何も分析し直さない
+    again = manager.run_analysis(to_file(df), "JOB1")
+    assert again['analyzed_rows'] == 0
+    tm.assert_frame_equal(again['merged_df'], analysis['merged_df'])
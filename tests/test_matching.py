@@ -0,0 +1,56 @@
+"""社名の表記ゆれ・あいまい一致の確認"""
+import numpy as np
+import pandas as pd
+
+LOOKUP_COMPANIES = [
+    ("株式会社サンプル商事12", "0312345678"),
+    ("日本メディカルシステム東京", "0311112222"),
+    ("株式会社ミライ総合サービスセンター", "0655556666"),
+]
+
+
+def lookup_df(manager):
+    companies = pd.Series([company for company, _ in LOOKUP_COMPANIES])
+    return pd.DataFrame({
+        'company': companies,
+        'company_normalized': manager.normalize_text_series(companies),
+        'phone_normalized': [phone for _, phone in LOOKUP_COMPANIES],
+    })
+
+
+def match(manager, name, phone):
+    result = manager.match_companies_fuzzy(np.array([name], dtype=object), np.array([phone], dtype=object), lookup_df(manager))
+    return result.iloc[0]
+
+
+def test_typo_matches_fuzzily(manager):
+    result = match(manager, "ミライ総合サーピスセンター", "")
+    assert result['key'] == "株式会社ミライ総合サービスセンター"
+    assert result['method'] == 'あいまい一致'
+
+
+def test_typo_with_same_phone_matches(manager):
+    result = match(manager, "ミライ総合サーピスセンター", "0655556666")
+    assert result['key'] == "株式会社ミライ総合サービスセンター"
+
+
+def test_different_phone_is_rejected(manager):
+    assert pd.isna(match(manager, "ミライ総合サーピスセンター", "0699990000")['key'])
+
+
+def test_trailing_number_difference_is_rejected(manager):
+    # 番号だけが違う社名は別の会社（電話番号も違う）
+    assert pd.isna(match(manager, "サンプル商事13", "0398765432")['key'])
+    # 電話番号が分からなくても番号だけの違いでは照合しない
+    assert pd.isna(match(manager, "サンプル商事13", "")['key'])
+
+
+def test_trailing_place_difference_is_rejected(manager):
+    assert pd.isna(match(manager, "日本メディカルシステム大阪", "")['key'])
+    assert pd.isna(match(manager, "日本メディカルシステム大阪支店", "")['key'])
+
+
+def test_form_words_still_match_as_canonical(manager):
+    result = match(manager, "(株)サンプル商事12", "0398765432")
+    assert result['key'] == "株式会社サンプル商事12"
+    assert result['method'] == '表記ゆれ'
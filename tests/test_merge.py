@@ -0,0 +1,89 @@
+"""通話結果と元データの結合（1通話に高々1行・候補が複数の通話の報告）の確認"""
+import logging
+from io import BytesIO
+
+import pandas as pd
+
+
+def filemaker_df(rows, id_prefix):
+    """(顧客名, 電話番号) の行からなる FileMaker 出力"""
+    return pd.DataFrame({
+        '顧客名': [company for company, _ in rows],
+        '電話番号': [phone for _, phone in rows],
+        '住所統合': ["東京都千代田区1-1"] * len(rows),
+        'IDの頭にID': [f"{id_prefix}{i:04d}" for i in range(len(rows))],
+        '最終トーク判定': ["A"] * len(rows),
+        '最終有効無効': ["有効"] * len(rows),
+        '最終決済担当': ["山田"] * len(rows),
+    })
+
+
+def results_file(calls):
+    """(社名, 電話番号) の通話からなる結果CSV"""
+    return BytesIO(pd.DataFrame({
+        '社名': [company for company, _ in calls],
+        '電話番号': [phone for _, phone in calls],
+        '架電時刻': [f"2026-10-01 10:{i:02d}:00" for i in range(len(calls))],
+        'ステータス': ["通話完了"] * len(calls),
+        '架電結果': [""] * len(calls),
+        '要約': ["了承しました"] * len(calls),
+        '通話時間': ["1:00"] * len(calls),
+    }).to_csv(index=False).encode('cp932'))
+
+
+def create_job(manager, job_id, rows, id_prefix):
+    manager.process_filemaker_data(filemaker_df(rows, id_prefix), job_id, job_id, robot_count=1, original_bytes=b"")
+
+
+JOB_ROWS = [
+    ("株式会社重複商事", "03-1111-0001"),
+    ("株式会社重複商事", "03-1111-0002"),
+    ("株式会社単独工業", "03-2222-0001"),
+]
+
+
+def test_same_company_on_two_rows_is_resolved_by_phone(manager):
+    create_job(manager, "JOB1", JOB_ROWS, "A")
+    merged_df = manager.run_analysis(results_file([
+        ("株式会社重複商事", "03-1111-0002"),
+        ("株式会社重複商事", "03-1111-0001"),
+        ("株式会社単独工業", "03-9999-9999"),
+    ]), "JOB1")['merged_df']
+    assert merged_df['fm_id'].tolist() == ["A0001", "A0000", "A0002"]
+    assert merged_df['マッチ方法'].tolist() == ["完全一致"] * 3
+
+
+def test_ambiguous_call_stays_unlinked_and_is_reported(manager, caplog):
+    create_job(manager, "JOB1", JOB_ROWS, "A")
+    with caplog.at_level(logging.WARNING, logger="teleapo_core"):
+        merged_df = manager.run_analysis(results_file([
+            ("株式会社重複商事", "03-1111-0009"),
+            ("株式会社重複商事", ""),
+            ("株式会社単独工業", "03-2222-0001"),
+        ]), "JOB1")['merged_df']
+    # 行は増えず、候補が複数の通話は結合しない
+    assert len(merged_df) == 3
+    assert merged_df['fm_id'].isna().tolist() == [True, True, False]
+    assert merged_df['マッチ方法'].tolist() == ["候補複数", "候補複数", "完全一致"]
+    assert merged_df['マッチ信頼度'].isna().tolist() == [True, True, False]
+    assert "結合先が複数あり決められない通話が 2 件あります（社名 1 種類）" in caplog.text
+
+
+def test_routed_call_for_company_in_two_jobs(manager, caplog):
+    create_job(manager, "JOB1", [("株式会社共通商事", "03-3333-0001"), ("株式会社一号物産", "03-3333-0002")], "A")
+    create_job(manager, "JOB2", [("株式会社共通商事", "03-4444-0001"), ("株式会社二号物産", "03-4444-0002")], "B")
+    with caplog.at_level(logging.WARNING, logger="teleapo_core"):
+        merged_df = manager.run_analysis(results_file([
+            ("株式会社共通商事", "03-4444-0001"),
+            ("株式会社共通商事", "03-3333-0001"),
+            ("株式会社共通商事", "03-5555-0001"),
+            ("株式会社二号物産", "03-4444-0002"),
+        ]), None)['merged_df']
+    assert len(merged_df) == 4
+    assert merged_df['job_id'].tolist()[:2] == ["JOB2", "JOB1"]
+    assert merged_df['fm_id'].tolist()[:2] == ["B0000", "A0000"]
+    # 電話番号でも決まらない通話はどちらのジョブにも結合しない
+    assert pd.isna(merged_df['job_id'].iloc[2])
+    assert merged_df['マッチ方法'].iloc[2] == "候補複数"
+    assert merged_df['fm_id'].iloc[3] == "B0001"
+    assert "結合先が複数あり決められない通話が 1 件あります" in caplog.text
@@ -0,0 +1,36 @@
+"""計測ログ（末尾からの読み込みと上限での切り替え）の確認"""
+import json
+
+import pytest
+
+import teleapo_core
+from teleapo_core import METRICS_LOG_NAME, read_tail_lines
+
+
+@pytest.mark.parametrize('block_size', [1, 7, 64 * 1024])
+@pytest.mark.parametrize('limit', [0, 1, 3, 10, 50])
+def test_read_tail_lines_matches_readlines(tmp_path, block_size, limit):
+    path = tmp_path / "log.jsonl"
+    path.write_text("".join(f"行{i}\n" for i in range(20)), encoding='utf-8')
+    expected = path.read_text(encoding='utf-8').splitlines()[-limit:] if limit else []
+    assert read_tail_lines(path, limit, block_size=block_size) == expected
+
+
+def test_read_metrics_newest_first(manager):
+    for i in range(30):
+        manager.write_metrics(None, 'export', {'seconds': i})
+    assert [m['seconds'] for m in manager.read_metrics(None, limit=3)] == [29, 28, 27]
+
+
+def test_write_metrics_rotates_and_reads_across_files(manager, monkeypatch):
+    monkeypatch.setattr(teleapo_core, 'METRICS_LOG_MAX_BYTES', 200)
+    for i in range(40):
+        manager.write_metrics(None, 'export', {'seconds': i})
+    log_path = manager.base_dir / METRICS_LOG_NAME
+    assert log_path.stat().st_size < 200 + len(json.dumps({'run': 'export', 'job_id': None, 'seconds': 39})) + 1
+    assert log_path.with_name(METRICS_LOG_NAME + ".1").exists()
+    
+    # 現在のログの件数より多く求めると1世代前のログから補う
+    current_count = len(log_path.read_text(encoding='utf-8').splitlines())
+    metrics = manager.read_metrics(None, limit=current_count + 2)
+    assert [m['seconds'] for m in metrics] == list(range(39, 39 - current_count - 2, -1))
@@ -0,0 +1,26 @@
+"""結果CSVの読み込み（文字コード判定）の確認"""
+from io import BytesIO
+
+import pytest
+
+HEADER = "社名,電話番号,架電時刻,ステータス,架電結果,要約,通話時間\n"
+PLAIN_ROWS = "".join(f"株式会社テスト{i},0312345678,2026-10-01 10:00:00,通話完了,,了承しました,1:00\n" for i in range(3000))
+CP932_ONLY_ROW = "㈱サンプル①,0312345678,2026-10-01 10:05:00,通話完了,,髙橋様,1:00\n"
+
+
+@pytest.mark.parametrize("encoding", ["cp932", "utf-8"])
+def test_characters_beyond_shift_jis_late_in_file(manager, encoding):
+    # 先頭の数百KBは JIS の範囲の文字だけで、cp932 にしかない文字が後ろにある
+    results_file = BytesIO((HEADER + PLAIN_ROWS + CP932_ONLY_ROW).encode(encoding))
+    assert manager.detect_encoding(results_file) == encoding
+
+    analyzed_df = manager.analyze_results_file(results_file, chunksize=1000)
+    assert len(analyzed_df) == 3001
+    assert analyzed_df['社名'].iloc[-1] == "㈱サンプル①"
+    assert manager.calculate_statistics(analyzed_df)['total_calls'] == 3001
+
+
+def test_multibyte_character_split_across_blocks(manager):
+    results_file = BytesIO(("あ" * 10000).encode('utf-8'))
+    assert manager.detect_encoding(results_file, block_size=1001) == 'utf-8'
+    assert results_file.tell() == 0
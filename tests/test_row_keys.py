@@ -0,0 +1,34 @@
+"""行指紋の列単位の作成（create_row_keys）が1行ずつの create_row_key と同じ値になることの確認"""
+import numpy as np
+import pandas as pd
+import pytest
+
+COMPANIES = [
+    "株式会社テスト", "  株式会社テスト  ", "株式会社テスト　", "ＡＢＣ商事", "ABC商事", "㈱サンプル①",
+    "", " ", np.nan, None, "nan", 12345, 3.5,
+]
+PHONES = [
+    "03-1234-5678", "0312345678", "+81 3-1234-5678", "+81-90-1234-5678", "+8190 1234 5678",
+    "０３－１２３４－５６７８", "＋８１３１２３４５６７８", "(03) 1234-5678", "内線 123", "",
+    " ", np.nan, None, 312345678, 312345678.0,
+]
+
+
+@pytest.mark.parametrize("company", COMPANIES)
+@pytest.mark.parametrize("phone", PHONES)
+def test_row_keys_match_scalar_key(manager, company, phone):
+    companies = pd.Series([company], dtype=object)
+    phones = pd.Series([phone], dtype=object)
+    assert manager.create_row_keys(companies, phones).tolist() == [manager.create_row_key(company, phone)]
+
+
+@pytest.mark.parametrize("dtype", [object, "str"])
+def test_row_keys_match_scalar_keys_for_whole_column(manager, dtype):
+    rng = np.random.default_rng(0)
+    text_values = [value for value in COMPANIES if value is None or isinstance(value, (str, float))]
+    phone_values = [value for value in PHONES if value is None or isinstance(value, (str, float))]
+    companies = pd.Series(rng.choice(np.array(text_values, dtype=object), 500), index=np.arange(500) * 3).astype(dtype)
+    phones = pd.Series(rng.choice(np.array(phone_values, dtype=object), 500), index=companies.index).astype(dtype)
+    keys = manager.create_row_keys(companies, phones)
+    assert keys.index.equals(companies.index)
+    assert keys.tolist() == [manager.create_row_key(company, phone) for company, phone in zip(companies, phones)]
@@ -0,0 +1,47 @@
+"""起動時の読み込みの確認（コア部分の読み込みで重いモジュールを読み込まない・時間が予算内・アプリの各ページが例外なく表示される）"""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# 予算（秒）。遅い CI でも誤って落ちないよう benchmarks/check_startup.py より緩くする
+CORE_IMPORT_BUDGET_SEC = 5.0
+APP_FIRST_RUN_BUDGET_SEC = 20.0
+# コア部分の読み込み時には読み込まれてはいけないモジュール（使う時に読み込む）
+LAZY_MODULES = ['streamlit', 'openpyxl', 'xlsxwriter']
+PAGES = ["📤 新規ジョブ作成", "📥 結果分析", "📊 ジョブ履歴", "📈 横断分析", "⚙️ 設定"]
+
+CORE_IMPORT_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import teleapo_core
+elapsed = time.perf_counter() - start
+print(json.dumps({{'seconds': elapsed, 'loaded': [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def run_python(script, work_dir):
+    """新しいプロセスでスクリプトを実行し、最終行のJSONを返す（読み込み済みのモジュールの影響を受けない）"""
+    completed = subprocess.run([sys.executable, '-c', script], cwd=work_dir, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def test_core_import_is_light(tmp_path):
+    core = run_python(CORE_IMPORT_SCRIPT.format(root=str(ROOT), lazy=LAZY_MODULES), tmp_path)
+    assert core['loaded'] == []
+    assert core['seconds'] < CORE_IMPORT_BUDGET_SEC
+
+
+def test_app_pages_render(tmp_path, monkeypatch):
+    testing = pytest.importorskip('streamlit.testing.v1')
+    monkeypatch.chdir(tmp_path)
+    app = testing.AppTest.from_file(str(ROOT / "ai_teleapo_app.py"), default_timeout=APP_FIRST_RUN_BUDGET_SEC).run()
+    assert not app.exception
+    for page in PAGES:
+        app.sidebar.selectbox[0].select(page).run()
+        assert not app.exception, page
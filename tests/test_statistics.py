@@ -0,0 +1,81 @@
+"""統計（calculate_statistics）が以前の1指標ずつの集計と同じ結果になることの確認"""
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+RESULTS = ["NG", "留守", "留守電", "留守番電話", "AI電話APO", "APO", "再架電", "", np.nan]
+STATUSES = ["通話完了", "留守番電話", "応答なし", "獲得", "エラー", "システムエラー", "", np.nan]
+SUMMARIES = ["了承しました", "通信エラーで切断", "不要", "", np.nan]
+PHONES = [
+    "03-1234-5678", "090-1234-5678", "+81 3-1234-5678", "0312345678", "031234567", "0120-12-345",
+    "03123456789012", "１２３", "０３１２３４５６７８", "", np.nan,
+]
+DURATIONS = ["1:05", "0:00", "1:02:03", "45", "", np.nan, "abc"]
+CALL_TIMES = ["2026-10-01 09:15:00", "2026-10-01 13:59:59", "2026-10-02 18:00:00", "不明", np.nan]
+
+
+def legacy_calculate_statistics(manager, df):
+    """以前の calculate_statistics（比較用の基準）"""
+    duration_sec = manager.parse_durations(df["通話時間"])
+    total_calls = len(df)
+    result_counts = df["架電結果"].value_counts()
+    result_counts = result_counts[result_counts > 0]
+    valid_calls = df[~df["架電結果"].isin(["留守", "留守番電話"])].shape[0]
+    total_time_sec = int(duration_sec.sum())
+    transfer_calls = df[df["架電結果"].str.contains("APO", na=False)].shape[0]
+    phone_digits = df["電話番号"].astype(str).str.replace(r"\D", "", regex=True)
+    invalid_numbers = df[~phone_digits.str.match(r"^0\d{9,10}$", na=False)].shape[0]
+    error_calls = df[df[["ステータス", "要約"]].astype(str).fillna("").apply(
+        lambda x: any("エラー" in v for v in x), axis=1
+    )].shape[0]
+    return {
+        'total_calls': total_calls,
+        'valid_calls': valid_calls,
+        'total_time': str(timedelta(seconds=total_time_sec)),
+        'total_time_sec': total_time_sec,
+        'transfer_calls': transfer_calls,
+        'invalid_numbers': invalid_numbers,
+        'error_calls': error_calls,
+        'result_counts': result_counts.to_dict()
+    }
+
+
+def random_analyzed_calls(rows, seed):
+    rng = np.random.default_rng(seed)
+    choice = lambda values: pd.Series(rng.choice(np.array(values, dtype=object), rows), dtype=object)
+    return pd.DataFrame({
+        '社名': [f"株式会社テスト{i}" for i in range(rows)],
+        '電話番号': choice(PHONES),
+        '架電時刻': choice(CALL_TIMES),
+        'ステータス': choice(STATUSES),
+        '架電結果': choice(RESULTS),
+        '要約': choice(SUMMARIES),
+        '通話時間': choice(DURATIONS),
+        'lane': pd.Series(rng.choice([1, 2, 3, np.nan], rows)),
+    })
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("categorical", [False, True])
+def test_statistics_match_legacy(manager, seed, categorical):
+    df = random_analyzed_calls(3000, seed)
+    if categorical:
+        # マージ結果と同じく値の種類が少ない列はカテゴリ型
+        df = manager.categorize_columns(df)
+    stats = manager.calculate_statistics(df)
+    expected = legacy_calculate_statistics(manager, df)
+
+    assert {key: stats[key] for key in expected if key != 'result_counts'} == {key: value for key, value in expected.items() if key != 'result_counts'}
+    assert stats['result_counts'] == expected['result_counts']
+    # 軸別集計の軸ごとの合計も全体と一致
+    rollup = stats['rollup']
+    assert rollup['total_calls'].sum() == len(df)
+    assert rollup.groupby('レーン', dropna=False)['total_calls'].sum().to_dict() == df['lane'].astype('Int64').value_counts(dropna=False).to_dict()
+
+
+def test_statistics_of_empty_frame(manager):
+    stats = manager.calculate_statistics(pd.DataFrame(columns=['call_key']))
+    assert stats['total_calls'] == 0
+    assert stats['result_counts'] == {}
@@ -0,0 +1,38 @@
+"""アップロード用CSVの置き換え表の確認"""
+import pandas as pd
+
+from teleapo_core import load_upload_charmap
+
+
+def shift_jis_only_characters():
+    """shift_jis では表せて cp932 では表せない文字"""
+    chars = []
+    for code in range(0x10000):
+        if 0xD800 <= code <= 0xDFFF:
+            continue
+        char = chr(code)
+        try:
+            char.encode('shift_jis')
+        except UnicodeEncodeError:
+            continue
+        try:
+            char.encode('cp932')
+        except UnicodeEncodeError:
+            chars.append(char)
+    return chars
+
+
+def test_shift_jis_only_characters_keep_their_bytes():
+    # 以前の shift_jis での書き出しと同じバイト列になること（¥ → 0x5C、‾ → 0x7E）
+    charmap = load_upload_charmap()
+    chars = shift_jis_only_characters()
+    assert chars
+    for char in chars:
+        assert charmap.substitute(char).encode('cp932') == char.encode('shift_jis')
+
+
+def test_translate_yen_and_overline():
+    charmap = load_upload_charmap()
+    translated, changed = charmap.translate(pd.Series(["価格¥1,000", "A‾B", "通常"]))
+    assert translated.tolist() == ["価格\\1,000", "A~B", "通常"]
+    assert changed.tolist() == [True, True, False]